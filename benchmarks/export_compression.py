@@ -0,0 +1,176 @@
+#!/usr/bin/python3
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Benchmark compression programs for exported backup archives.
+
+Compress a tar stream of app data with each compression program the backups
+action can use, as borg export-tar does, and compare throughput and size.
+gzip uses a single core while pigz and zstd use all cores.
+
+By default, the tar stream is built from synthetic data resembling what apps
+back up: configuration files, logs, JSON, an SQLite database and already
+compressed media. Real data can be used instead by giving a directory.
+
+Run from the source directory:
+
+    $ python3 -m benchmarks.export_compression --size 64
+    $ sudo python3 -m benchmarks.export_compression --path /var/lib/plinth
+
+"""
+
+import argparse
+import io
+import os
+import random
+import shutil
+import sqlite3
+import subprocess
+import tarfile
+import tempfile
+import time
+
+COMPRESSIONS = [
+    ('gzip', 6),
+    ('pigz', 6),
+    ('pigz', 9),
+    ('zstd', 3),
+    ('zstd', 9),
+]
+
+WORDS = ('server', 'user', 'enabled', 'port', 'listen', 'true', 'false',
+         'request', 'GET', 'POST', 'status', 'error', 'info', 'debug',
+         'connection', 'freedombox', 'address', 'timeout', 'path', 'name')
+
+
+def _get_text(randomizer, size):
+    """Return text made of log or configuration like lines."""
+    lines = []
+    length = 0
+    while length < size:
+        line = '{:05d} {} = {}\n'.format(
+            randomizer.randrange(100000),
+            ' '.join(randomizer.choices(WORDS, k=randomizer.randint(2, 8))),
+            randomizer.randrange(1 << 32))
+        lines.append(line)
+        length += len(line)
+
+    return ''.join(lines).encode()[:size]
+
+
+def _get_database(randomizer, size):
+    """Return contents of an SQLite database of given size."""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'app.sqlite3')
+        connection = sqlite3.connect(path)
+        connection.execute(
+            'CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT, data TEXT)'
+        )
+        while os.path.getsize(path) < size:
+            rows = [(randomizer.choice(WORDS),
+                     _get_text(randomizer, 200).decode())
+                    for _ in range(1000)]
+            connection.executemany(
+                'INSERT INTO items (name, data) VALUES (?, ?)', rows)
+            connection.commit()
+
+        connection.close()
+        with open(path, 'rb') as file_handle:
+            return file_handle.read()
+
+
+def _get_synthetic_files(size):
+    """Return list of (name, contents) resembling backed up app data."""
+    randomizer = random.Random(0)
+    files = []
+    # Share of each kind of data in total size
+    for kind, share in (('text', 0.35), ('database', 0.35), ('media', 0.3)):
+        kind_size = int(size * share)
+        if kind == 'database':
+            files.append(('var/lib/app/app.sqlite3',
+                          _get_database(randomizer, kind_size)))
+            continue
+
+        file_size = 1024 * 1024 if kind == 'media' else 64 * 1024
+        for index in range(max(kind_size // file_size, 1)):
+            if kind == 'media':
+                name = 'var/lib/app/media/{}.jpg'.format(index)
+                contents = randomizer.getrandbits(file_size * 8).to_bytes(
+                    file_size, 'little')
+            else:
+                name = 'etc/app/{}.conf'.format(index)
+                contents = _get_text(randomizer, file_size)
+
+            files.append((name, contents))
+
+    return files
+
+
+def _get_tar(files=None, path=None):
+    """Return uncompressed tar stream of files or a directory."""
+    output = io.BytesIO()
+    with tarfile.open(fileobj=output, mode='w') as tar_handle:
+        if path:
+            tar_handle.add(path, arcname=path.lstrip('/'))
+        else:
+            for name, contents in files:
+                info = tarfile.TarInfo(name)
+                info.size = len(contents)
+                tar_handle.addfile(info, io.BytesIO(contents))
+
+    return output.getvalue()
+
+
+def _get_command(compression, level):
+    """Return command compressing the way the backups action does."""
+    command = [compression]
+    if compression == 'zstd':
+        command += ['-q', '-c', '-T0']
+
+    return command + ['-{}'.format(level)]
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--size', type=int, default=64,
+                        help='Size of synthetic data in MiB')
+    parser.add_argument('--path', help='Directory with app data to use')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Number of times to compress with each program')
+    arguments = parser.parse_args()
+
+    if arguments.path:
+        data = _get_tar(path=arguments.path)
+    else:
+        data = _get_tar(_get_synthetic_files(arguments.size * 1024 * 1024))
+
+    print('Data: {:.1f} MiB, CPU cores: {}'.format(
+        len(data) / 1024 / 1024, os.cpu_count()))
+    print('{:>8} {:>5} {:>10} {:>8} {:>8}'.format('program', 'level',
+                                                  'MiB/s', 'ratio',
+                                                  'speedup'))
+    baseline = None
+    for compression, level in COMPRESSIONS:
+        if not shutil.which(compression):
+            print('{:>8} {:>5} {:>10}'.format(compression, level,
+                                              'not found'))
+            continue
+
+        command = _get_command(compression, level)
+        durations = []
+        for _ in range(arguments.repeat):
+            start = time.perf_counter()
+            process = subprocess.run(command, input=data,
+                                     stdout=subprocess.PIPE, check=True)
+            durations.append(time.perf_counter() - start)
+
+        duration = min(durations)
+        baseline = baseline or duration
+        print('{:>8} {:>5} {:>10.1f} {:>8.3f} {:>7.1f}x'.format(
+            compression, level,
+            len(data) / 1024 / 1024 / duration,
+            len(process.stdout) / len(data), baseline / duration))
+
+
+if __name__ == '__main__':
+    main()
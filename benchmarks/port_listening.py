@@ -0,0 +1,166 @@
+#!/usr/bin/python3
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Benchmark port listening checks used by diagnostics.
+
+Compare checking each port with a fresh scan of the socket table (the old
+behavior) with building a single SocketSnapshot index and looking up all the
+ports in it.
+
+A synthetic socket table in the format of /proc/net/{tcp,tcp6,udp,udp6} is
+generated and parsed on every read, similar to what psutil does while walking
+/proc.
+
+Run from the source directory:
+
+    $ python3 -m benchmarks.port_listening --sockets 2000 --checks 100
+
+"""
+
+import argparse
+import collections
+import random
+import socket
+import timeit
+
+import psutil
+
+from plinth.daemon import SocketSnapshot
+
+Connection = collections.namedtuple(
+    'Connection', ['fd', 'family', 'type', 'laddr', 'raddr', 'status', 'pid'])
+
+_TABLES = {
+    'tcp': (socket.SOCK_STREAM, socket.AF_INET),
+    'tcp6': (socket.SOCK_STREAM, socket.AF_INET6),
+    'udp': (socket.SOCK_DGRAM, socket.AF_INET),
+    'udp6': (socket.SOCK_DGRAM, socket.AF_INET6),
+}
+
+_KINDS = {
+    'inet': ('tcp', 'tcp6', 'udp', 'udp6'),
+    'tcp': ('tcp', 'tcp6'),
+    'tcp6': ('tcp6', ),
+    'udp': ('udp', 'udp6'),
+    'udp6': ('udp6', ),
+}
+
+_TCP_STATES = {'0A': psutil.CONN_LISTEN, '01': psutil.CONN_ESTABLISHED}
+
+
+def _generate_tables(sockets):
+    """Return synthetic /proc/net/ tables with given number of sockets."""
+    tables = {}
+    for name in _TABLES:
+        lines = ['  sl  local_address rem_address   st']
+        for index in range(sockets // len(_TABLES)):
+            width = 8 if name in ('tcp', 'udp') else 32
+            local = '{:0{}X}:{:04X}'.format(random.getrandbits(width * 4),
+                                            width, random.randrange(65536))
+            listening = random.random() < 0.2
+            remote = '0' * width + ':0000' if listening else \
+                '{:0{}X}:{:04X}'.format(random.getrandbits(width * 4), width,
+                                        random.randrange(65536))
+            state = '0A' if listening else '01'
+            lines.append(f'{index:4}: {local} {remote} {state}')
+
+        tables[name] = '\n'.join(lines)
+
+    return tables
+
+
+def _parse_address(address, family):
+    """Parse an address in /proc/net/ format."""
+    address, port = address.split(':')
+    if family == socket.AF_INET:
+        address = socket.inet_ntop(family, bytes.fromhex(address)[::-1])
+    else:
+        address = socket.inet_ntop(family, bytes.fromhex(address))
+
+    return address, int(port, 16)
+
+
+def _make_net_connections(tables):
+    """Return a replacement for psutil.net_connections() reading tables."""
+    def net_connections(kind='inet'):
+        connections = []
+        for name in _KINDS[kind]:
+            type_, family = _TABLES[name]
+            for line in tables[name].splitlines()[1:]:
+                _, local, remote, state = line.split()
+                laddr = _parse_address(local, family)
+                raddr = _parse_address(remote, family)
+                if raddr[1] == 0:
+                    raddr = ()
+
+                status = _TCP_STATES[state] if type_ == socket.SOCK_STREAM \
+                    else psutil.CONN_NONE
+                connections.append(
+                    Connection(-1, family, type_, laddr, raddr, status, None))
+
+        return connections
+
+    return net_connections
+
+
+def _check_port_by_scan(net_connections, port, kind):
+    """Check a port by scanning the full socket table (old behavior)."""
+    run_kind = {'tcp4': 'tcp', 'udp4': 'udp'}.get(kind, kind)
+    for connection in net_connections(run_kind):
+        if kind.startswith('tcp') and connection.status != psutil.CONN_LISTEN:
+            continue
+
+        if kind.startswith('udp') and connection.raddr != ():
+            continue
+
+        if connection.laddr[1] != port:
+            continue
+
+        if kind not in ('tcp4', 'udp4') or \
+           connection.family == socket.AF_INET or \
+           connection.laddr[0] == '::':
+            return True
+
+    return False
+
+
+def main():
+    """Run the benchmark and print the results."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sockets', type=int, default=2000,
+                        help='number of sockets in synthetic table')
+    parser.add_argument('--checks', type=int, default=100,
+                        help='number of port checks in one diagnostics run')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='number of times to repeat measurement')
+    arguments = parser.parse_args()
+
+    random.seed(0)
+    net_connections = _make_net_connections(_generate_tables(
+        arguments.sockets))
+    kinds = ['tcp4', 'tcp6', 'udp4', 'udp6', 'tcp', 'udp']
+    checks = [(random.randrange(65536), random.choice(kinds))
+              for _ in range(arguments.checks)]
+
+    def old_path():
+        return [
+            _check_port_by_scan(net_connections, port, kind)
+            for port, kind in checks
+        ]
+
+    def new_path():
+        snapshot = SocketSnapshot(net_connections('inet'))
+        return [snapshot.is_listening(port, kind) for port, kind in checks]
+
+    assert old_path() == new_path(), 'Results of old and new paths differ'
+
+    old_time = min(timeit.repeat(old_path, number=1, repeat=arguments.repeat))
+    new_time = min(timeit.repeat(new_path, number=1, repeat=arguments.repeat))
+    print(f'{arguments.sockets} sockets, {arguments.checks} checks')
+    print(f'Scan per check:  {old_time * 1000:10.2f} ms')
+    print(f'Single snapshot: {new_time * 1000:10.2f} ms')
+    print(f'Speedup:         {old_time / new_time:10.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/python3
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Benchmark finding the app that handles a URL in the setup middleware.
+
+Compare resolving the path again with Django's resolver (the old behavior)
+with looking it up in the URL prefix map built by the module loader. In a
+real request, the middleware reads the app from request.resolver_match and
+does neither.
+
+URLs of all the apps are included the same way the module loader does. When
+the apps can't be imported, for example because their dependencies are not
+installed, a synthetic set of apps with similar URLs is used instead.
+
+Run from the source directory:
+
+    $ python3 -m benchmarks.url_dispatch --number 2000
+
+"""
+
+import argparse
+import os
+import pathlib
+import timeit
+import types
+
+import django
+from django.conf.urls import include, url
+
+from plinth import module_loader
+
+
+def _get_real_urlpatterns():
+    """Return URL patterns of the main project with all the apps included."""
+    from plinth import urls
+
+    modules_dir = pathlib.Path(module_loader.__file__).parent / 'modules'
+    module_paths = [
+        'plinth.modules.' + path.parent.name
+        for path in sorted(modules_dir.glob('*/urls.py'))
+    ]
+    for module_path in module_paths:
+        module_loader._include_module_urls(module_path,
+                                           module_path.split('.')[-1])
+
+    return urls.urlpatterns
+
+
+def _get_synthetic_urlpatterns(apps):
+    """Return URL patterns for a number of apps resembling real apps."""
+    def view(request):
+        pass
+
+    urlpatterns = [
+        url(r'^$', view, name='index'),
+        url(r'^apps/$', view, name='apps'),
+        url(r'^sys/$', view, name='system'),
+        url(r'^captcha/image/(?P<key>\w+)/$', view, name='captcha-image'),
+    ]
+    for index in range(apps):
+        name = 'app{}'.format(index)
+        section = 'sys' if index % 3 == 0 else 'apps'
+        patterns = [
+            url(r'^{}/{}/$'.format(section, name), view, name='index'),
+            url(r'^{}/{}/add/$'.format(section, name), view, name='add'),
+            url(r'^{}/{}/(?P<id>[\w.@+-]+)/edit/$'.format(section, name),
+                view, name='edit'),
+            url(r'^{}/{}/(?P<id>[\w.@+-]+)/delete/$'.format(section, name),
+                view, name='delete'),
+        ]
+        urlpatterns.append(url(r'', include((patterns, name))))
+
+    return urlpatterns
+
+
+def _get_paths(urlpatterns):
+    """Return a sample of paths handled by the app URL patterns."""
+    paths = ['/', '/apps/', '/nonexistent/path/']
+    for pattern in urlpatterns:
+        if getattr(pattern, 'namespace', None):
+            for sub_pattern in pattern.url_patterns:
+                regex = sub_pattern.pattern.regex.pattern
+                if regex.startswith('^') and regex.endswith('/$') and \
+                   '(' not in regex:
+                    paths.append('/' + regex[1:-1])
+
+    return paths
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--number', type=int, default=1000,
+                        help='Number of times to look up each path')
+    parser.add_argument('--synthetic', type=int, metavar='APPS',
+                        help='Use a synthetic set of apps of given size')
+    arguments = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE',
+                          'plinth.tests.data.django_test_settings')
+    django.setup()
+
+    urlpatterns = None
+    if not arguments.synthetic:
+        try:
+            urlpatterns = _get_real_urlpatterns()
+        except Exception as exception:
+            print('Unable to load app URLs ({}), using 60 synthetic '
+                  'apps'.format(exception))
+
+    if urlpatterns is None:
+        urlpatterns = _get_synthetic_urlpatterns(arguments.synthetic or 60)
+
+    urlconf = types.ModuleType('benchmark_urls')
+    urlconf.urlpatterns = urlpatterns
+    module_loader._build_url_prefix_map(urlpatterns)
+    paths = _get_paths(urlpatterns)
+
+    def resolve():
+        for path in paths:
+            try:
+                django.urls.resolve(path, urlconf)
+            except django.urls.Resolver404:
+                pass
+
+    def lookup():
+        for path in paths:
+            module_loader.get_module_name_for_path(path)
+
+    # Check that both give the same results
+    for path in paths:
+        try:
+            match = django.urls.resolve(path, urlconf)
+            expected = (match.namespaces or [None])[0]
+        except django.urls.Resolver404:
+            expected = None
+
+        assert module_loader.get_module_name_for_path(path) == expected, path
+
+    print('URL patterns: {}, paths: {}'.format(len(urlpatterns), len(paths)))
+    results = {}
+    for name, function in (('resolve', resolve), ('prefix map', lookup)):
+        results[name] = min(
+            timeit.repeat(function, number=arguments.number, repeat=3))
+        print('{:>12}: {:8.2f} µs per path'.format(
+            name, results[name] * 1e6 / arguments.number / len(paths)))
+
+    print('Speedup: {:.1f}x'.format(results['resolve'] /
+                                    results['prefix map']))
+
+
+if __name__ == '__main__':
+    main()
@@ -4,10 +4,11 @@
 import argparse
 import importlib
 import logging
+import os
 import sys
 
 from . import (__version__, cfg, frontpage, glib, log, menu, module_loader,
-               setup, utils, web_framework, web_server)
+               profiling, setup, utils, web_framework, web_server)
 
 if utils.is_axes_old():
     import axes
@@ -42,6 +43,12 @@ def parse_arguments():
                         help='list package dependencies for essential modules')
     parser.add_argument('--list-modules', default=False, nargs='*',
                         help='list modules')
+    parser.add_argument(
+        '--profile-startup', default=None, nargs='?', const='',
+        metavar='FILE',
+        help=('measure time and memory taken by each phase of startup and '
+              'each module; write a JSON report to FILE, default '
+              'startup-profile.json in data directory'))
 
     return parser.parse_args()
 
@@ -85,11 +92,15 @@ def list_modules(modules_type):
 
 
 def run_diagnostics_and_exit():
-    """Run diagostics on all modules and exit."""
+    """Run diagostics on all modules and exit.
+
+    Use the same concurrent engine as the diagnostics app.
+
+    """
     module = importlib.import_module('plinth.modules.diagnostics.diagnostics')
     error_code = 0
     try:
-        module.run_on_all_modules()
+        module.run_on_all_enabled_modules()
     except Exception as exception:
         logger.exception('Error running diagnostics - %s', exception)
         error_code = 2
@@ -121,6 +132,8 @@ def on_web_server_stop():
 def main():
     """Initialize and start the application"""
     arguments = parse_arguments()
+    if arguments.profile_startup is not None:
+        profiling.enable()
 
     if arguments.develop:
         # use the root and plinth.config of the current working directory
@@ -133,18 +146,24 @@ def main():
 
     log.init()
 
-    web_framework.init()
+    with profiling.measure('phase', 'web_framework.init'):
+        web_framework.init()
 
     logger.info('FreedomBox Service (Plinth) version - %s', __version__)
     logger.info('Configuration loaded from file - %s', cfg.config_file)
     logger.info('Script prefix - %s', cfg.server_dir)
 
-    module_loader.include_urls()
+    with profiling.measure('phase', 'include_urls'):
+        module_loader.include_urls()
 
-    menu.init()
+    with profiling.measure('phase', 'menu.init'):
+        menu.init()
 
-    module_loader.load_modules()
-    frontpage.add_custom_shortcuts()
+    with profiling.measure('phase', 'load_modules'):
+        module_loader.load_modules()
+
+    with profiling.measure('phase', 'add_custom_shortcuts'):
+        frontpage.add_custom_shortcuts()
 
     if arguments.setup is not False:
         run_setup_and_exit(arguments.setup, allow_install=True)
@@ -165,7 +184,14 @@ def main():
 
     glib.run()
 
-    web_server.init()
+    with profiling.measure('phase', 'web_server.init'):
+        web_server.init()
+
+    if arguments.profile_startup is not None:
+        profiling.write_report(
+            arguments.profile_startup
+            or os.path.join(cfg.data_dir, 'startup-profile.json'))
+
     web_server.run(on_web_server_stop)
 
 
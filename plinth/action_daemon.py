@@ -0,0 +1,302 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Long running privileged helper to run actions without sudo.
+
+Running an action through sudo forks and execs sudo, which then execs a fresh
+Python interpreter that has to import Plinth's libraries again before the
+action does any work. This daemon runs as root, keeps an interpreter with the
+common libraries already imported and listens on a local Unix socket. For each
+request it forks a child which runs the action script in-process.
+
+The daemon upholds the same contract as plinth.actions:
+
+- Only actions from the actions directory can be run. The action name is
+  validated again by the daemon as it is the privilege boundary.
+
+- Options are passed as a list of arguments. No shell is involved.
+
+- Output, error and exit status are returned to the caller which raises
+  ActionError just as it does for sudo invocations.
+
+- Only connections from root and the configured service user are accepted.
+  Other peers get a rejection response.
+
+Requests and responses are JSON documents prefixed with their length as a 4
+byte big-endian integer. Binary data (input, output and error) is base64
+encoded.
+
+When the daemon is not running or rejects a request, plinth.actions falls back
+to sudo. Once a request has been sent, the action may have run and a failure
+of the daemon is reported as ActionError instead.
+"""
+
+import argparse
+import base64
+import json
+import logging
+import os
+import pwd
+import runpy
+import socket
+import socketserver
+import struct
+import sys
+import tempfile
+import traceback
+
+from plinth import cfg
+from plinth.errors import ActionError
+
+logger = logging.getLogger(__name__)
+
+SOCKET_PATH = '/run/plinth-actions/socket'
+
+_HEADER = struct.Struct('>I')
+
+_MAX_MESSAGE_SIZE = 256 * 1024 * 1024
+
+# Libraries that most actions import, loaded once in the daemon instead of
+# once per action.
+_PRELOAD_MODULES = [
+    'argparse', 'configparser', 'json', 'shutil', 'subprocess', 'tempfile',
+    'plinth.action_utils', 'plinth.utils'
+]
+
+
+class DaemonUnavailable(Exception):
+    """Daemon is not running, caller should fall back to sudo."""
+
+
+def _send_message(sock, message):
+    """Send a length prefixed JSON message over the socket."""
+    data = json.dumps(message).encode()
+    sock.sendall(_HEADER.pack(len(data)) + data)
+
+
+def _receive_exactly(sock, size):
+    """Receive exactly given number of bytes from a socket."""
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1024 * 1024))
+        if not chunk:
+            raise EOFError('Connection closed while reading message')
+
+        chunks.append(chunk)
+        size -= len(chunk)
+
+    return b''.join(chunks)
+
+
+def _receive_message(sock):
+    """Receive a length prefixed JSON message from the socket."""
+    size, = _HEADER.unpack(_receive_exactly(sock, _HEADER.size))
+    if size > _MAX_MESSAGE_SIZE:
+        raise ValueError('Message too large')
+
+    return json.loads(_receive_exactly(sock, size).decode())
+
+
+def _encode(data):
+    """Encode bytes for transport in JSON."""
+    return base64.b64encode(data or b'').decode()
+
+
+def _decode(data):
+    """Decode bytes received in JSON."""
+    return base64.b64decode(data or '')
+
+
+def run(action, options, input=None, socket_path=None):
+    """Run an action as root using the daemon.
+
+    Return a tuple of (return code, output bytes, error bytes). Raise
+    DaemonUnavailable if the daemon can't be reached or rejects the request so
+    that caller may fall back to running the action with sudo. Raise
+    ActionError if the connection fails after the request was sent.
+
+    """
+    socket_path = socket_path or SOCKET_PATH
+    request = {
+        'action': action,
+        'options': list(options),
+        'input': _encode(input)
+    }
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            sock.connect(socket_path)
+            _send_message(sock, request)
+        except OSError as exception:
+            # Daemon does not run incomplete requests
+            raise DaemonUnavailable(str(exception))
+
+        try:
+            response = _receive_message(sock)
+        except (OSError, EOFError, ValueError) as exception:
+            raise ActionError(action, '',
+                              'Action daemon failed: {}'.format(exception))
+    finally:
+        sock.close()
+
+    if response.get('rejected'):
+        raise DaemonUnavailable('Request rejected by action daemon')
+
+    return (response['returncode'], _decode(response['output']),
+            _decode(response['error']))
+
+
+def _is_python_script(path):
+    """Return whether the action is a Python script."""
+    with open(path, 'rb') as file_handle:
+        first_line = file_handle.readline(256)
+
+    return first_line.startswith(b'#!') and b'python' in first_line
+
+
+def _run_action(path, options, input_data):
+    """Run action in the current (forked) process with redirected streams.
+
+    Return a tuple of (return code, output bytes, error bytes).
+
+    """
+    stdin = tempfile.TemporaryFile()
+    stdout = tempfile.TemporaryFile()
+    stderr = tempfile.TemporaryFile()
+    stdin.write(input_data)
+    stdin.seek(0)
+
+    pid = os.fork()
+    if pid == 0:
+        # Redirect at file descriptor level so that sub-processes spawned by
+        # the action also write into the captured streams.
+        os.dup2(stdin.fileno(), 0)
+        os.dup2(stdout.fileno(), 1)
+        os.dup2(stderr.fileno(), 2)
+        sys.stdin = open(0, 'r', closefd=False)
+        sys.stdout = open(1, 'w', closefd=False)
+        sys.stderr = open(2, 'w', closefd=False)
+        returncode = 0
+        try:
+            if not _is_python_script(path):
+                os.execv(path, [path] + options)
+
+            sys.argv = [path] + options
+            runpy.run_path(path, run_name='__main__')
+        except SystemExit as exception:
+            if exception.code is None:
+                returncode = 0
+            elif isinstance(exception.code, int):
+                returncode = exception.code
+            else:
+                print(exception.code, file=sys.stderr)
+                returncode = 1
+        except BaseException:
+            traceback.print_exc()
+            returncode = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(returncode)
+
+    _, status = os.waitpid(pid, 0)
+    returncode = os.waitstatus_to_exitcode(status)
+
+    stdout.seek(0)
+    stderr.seek(0)
+    return returncode, stdout.read(), stderr.read()
+
+
+class _RequestHandler(socketserver.BaseRequestHandler):
+    """Handle a single action request in a forked child."""
+
+    def handle(self):
+        """Validate the peer and the request, run action, send result."""
+        if not self.server.is_peer_allowed(self.request):
+            logger.warning('Rejecting connection from unauthorized peer')
+            _send_message(self.request, {'rejected': True})
+            return
+
+        from plinth import actions
+
+        try:
+            request = _receive_message(self.request)
+            options = request['options']
+            if not all(isinstance(option, str) for option in options):
+                raise ValueError('Options must be strings.')
+
+            path = actions.get_action_path(request['action'], options)
+            returncode, output, error = _run_action(path, options,
+                                                    _decode(request['input']))
+        except (ValueError, KeyError, TypeError, EOFError) as exception:
+            returncode, output, error = 1, b'', str(exception).encode()
+
+        _send_message(
+            self.request, {
+                'returncode': returncode,
+                'output': _encode(output),
+                'error': _encode(error)
+            })
+
+
+class Server(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+    """Unix socket server that forks for each action request."""
+
+    def __init__(self, socket_path, allowed_uids):
+        """Bind to the socket path and remember the allowed peers."""
+        self.allowed_uids = set(allowed_uids)
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+        super().__init__(socket_path, _RequestHandler)
+        os.chmod(socket_path, 0o666)
+
+    def is_peer_allowed(self, sock):
+        """Return whether the peer process may run privileged actions."""
+        credentials = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED,
+                                      struct.calcsize('3i'))
+        _, uid, _ = struct.unpack('3i', credentials)
+        return uid in self.allowed_uids
+
+
+def _preload_modules():
+    """Import modules commonly used by actions to speed up requests."""
+    for module_name in _PRELOAD_MODULES:
+        try:
+            __import__(module_name)
+        except ImportError:
+            logger.warning('Unable to preload module %s', module_name)
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        description='Privileged helper to run FreedomBox actions',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--socket', default=SOCKET_PATH,
+                        help='path of the Unix socket to listen on')
+    parser.add_argument('--user', default='plinth',
+                        help='user allowed to run actions, besides root')
+    return parser.parse_args()
+
+
+def main():
+    """Start the daemon and serve requests until terminated."""
+    arguments = parse_arguments()
+    logging.basicConfig(level=logging.INFO)
+
+    cfg.read()
+    allowed_uids = [0, pwd.getpwnam(arguments.user).pw_uid]
+
+    _preload_modules()
+    server = Server(arguments.socket, allowed_uids)
+    logger.info('Serving actions from %s on %s', cfg.actions_dir,
+                arguments.socket)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.unlink(arguments.socket)
+
+
+if __name__ == '__main__':
+    main()
@@ -3,6 +3,8 @@
 Python action utility functions.
 """
 
+import contextlib
+import fcntl
 import logging
 import os
 import shutil
@@ -14,6 +16,10 @@ logger = logging.getLogger(__name__)
 UWSGI_ENABLED_PATH = '/etc/uwsgi/apps-enabled/{config_name}.ini'
 UWSGI_AVAILABLE_PATH = '/etc/uwsgi/apps-available/{config_name}.ini'
 
+PACKAGE_MANAGER_LOCK_FILE = '/run/lock/freedombox-package-manager.lock'
+WEBSERVER_LOCK_FILE = '/run/lock/freedombox-webserver.lock'
+UWSGI_LOCK_FILE = '/run/lock/freedombox-uwsgi.lock'
+
 
 def is_systemd_running():
     """Return if we are running under systemd."""
@@ -139,23 +145,24 @@ def webserver_enable(name, kind='config', apply_changes=True):
     is required.  If changes have been applied, then performed action
     is returned.
     """
-    if webserver_is_enabled(name, kind) and kind == 'module':
-        return
-
-    command_map = {
-        'config': 'a2enconf',
-        'site': 'a2ensite',
-        'module': 'a2enmod'
-    }
-    subprocess.check_output([command_map[kind], name])
+    with _file_lock(WEBSERVER_LOCK_FILE):
+        if webserver_is_enabled(name, kind) and kind == 'module':
+            return
+
+        command_map = {
+            'config': 'a2enconf',
+            'site': 'a2ensite',
+            'module': 'a2enmod'
+        }
+        subprocess.check_output([command_map[kind], name])
 
-    action_required = 'restart' if kind == 'module' else 'reload'
+        action_required = 'restart' if kind == 'module' else 'reload'
 
-    if apply_changes:
-        if action_required == 'restart':
-            service_restart('apache2')
-        else:
-            service_reload('apache2')
+        if apply_changes:
+            if action_required == 'restart':
+                service_restart('apache2')
+            else:
+                service_reload('apache2')
 
     return action_required
 
@@ -168,23 +175,24 @@ def webserver_disable(name, kind='config', apply_changes=True):
     is required.  If changes have been applied, then performed action
     is returned.
     """
-    if not webserver_is_enabled(name, kind):
-        return
-
-    command_map = {
-        'config': 'a2disconf',
-        'site': 'a2dissite',
-        'module': 'a2dismod'
-    }
-    subprocess.check_output([command_map[kind], name])
+    with _file_lock(WEBSERVER_LOCK_FILE):
+        if not webserver_is_enabled(name, kind):
+            return
+
+        command_map = {
+            'config': 'a2disconf',
+            'site': 'a2dissite',
+            'module': 'a2dismod'
+        }
+        subprocess.check_output([command_map[kind], name])
 
-    action_required = 'restart' if kind == 'module' else 'reload'
+        action_required = 'restart' if kind == 'module' else 'reload'
 
-    if apply_changes:
-        if action_required == 'restart':
-            service_restart('apache2')
-        else:
-            service_reload('apache2')
+        if apply_changes:
+            if action_required == 'restart':
+                service_restart('apache2')
+            else:
+                service_reload('apache2')
 
     return action_required
 
@@ -206,10 +214,11 @@ class WebserverChange(object):
         restart/reload the webserver based on enable/disable
         operations done so far.
         """
-        if 'restart' in self.actions_required:
-            service_restart('apache2')
-        elif 'reload' in self.actions_required:
-            service_reload('apache2')
+        with _file_lock(WEBSERVER_LOCK_FILE):
+            if 'restart' in self.actions_required:
+                service_restart('apache2')
+            elif 'reload' in self.actions_required:
+                service_reload('apache2')
 
     def enable(self, name, kind='config'):
         """Enable a config/module/site in Apache.
@@ -236,33 +245,35 @@ def uwsgi_is_enabled(config_name):
 
 def uwsgi_enable(config_name):
     """Enable a uwsgi configuration that runs under uwsgi."""
-    if uwsgi_is_enabled(config_name):
-        return
+    with _file_lock(UWSGI_LOCK_FILE):
+        if uwsgi_is_enabled(config_name):
+            return
 
-    # uwsgi is started/stopped using init script. We don't know if it can
-    # handle some configuration already running against newly enabled
-    # configuration. So, stop first before enabling new configuration.
-    service_stop('uwsgi')
+        # uwsgi is started/stopped using init script. We don't know if it can
+        # handle some configuration already running against newly enabled
+        # configuration. So, stop first before enabling new configuration.
+        service_stop('uwsgi')
 
-    enabled_path = UWSGI_ENABLED_PATH.format(config_name=config_name)
-    available_path = UWSGI_AVAILABLE_PATH.format(config_name=config_name)
-    os.symlink(available_path, enabled_path)
+        enabled_path = UWSGI_ENABLED_PATH.format(config_name=config_name)
+        available_path = UWSGI_AVAILABLE_PATH.format(config_name=config_name)
+        os.symlink(available_path, enabled_path)
 
-    service_enable('uwsgi')
-    service_start('uwsgi')
+        service_enable('uwsgi')
+        service_start('uwsgi')
 
 
 def uwsgi_disable(config_name):
     """Disable a uwsgi configuration that runs under uwsgi."""
-    if not uwsgi_is_enabled(config_name):
-        return
+    with _file_lock(UWSGI_LOCK_FILE):
+        if not uwsgi_is_enabled(config_name):
+            return
 
-    # If uwsgi is restarted later, it won't stop the just disabled
-    # configuration due to how init scripts are written for uwsgi.
-    service_stop('uwsgi')
-    enabled_path = UWSGI_ENABLED_PATH.format(config_name=config_name)
-    os.unlink(enabled_path)
-    service_start('uwsgi')
+        # If uwsgi is restarted later, it won't stop the just disabled
+        # configuration due to how init scripts are written for uwsgi.
+        service_stop('uwsgi')
+        enabled_path = UWSGI_ENABLED_PATH.format(config_name=config_name)
+        os.unlink(enabled_path)
+        service_start('uwsgi')
 
 
 def get_addresses():
@@ -332,6 +343,33 @@ def get_hostname():
     return subprocess.check_output(['hostname']).decode().strip()
 
 
+@contextlib.contextmanager
+def _file_lock(path):
+    """Wait for other actions holding a lock file, then hold it."""
+    try:
+        lock_file = open(path, 'w')
+    except OSError as exception:
+        logger.warning('Unable to open lock file %s: %s', path, exception)
+        yield
+        return
+
+    with lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        yield
+
+
+@contextlib.contextmanager
+def package_manager_lock():
+    """Wait for other actions using apt, dpkg or debconf to finish.
+
+    Apps are setup in parallel. Only one of them may run the package manager
+    or write to the debconf database at a time. Changes to Apache and uwsgi
+    configuration are serialized with separate locks.
+    """
+    with _file_lock(PACKAGE_MANAGER_LOCK_FILE):
+        yield
+
+
 def dpkg_reconfigure(package, config):
     """Reconfigure package using debconf database override."""
     override_template = '''
@@ -352,7 +390,8 @@ Owners: {package}
     env['DEBCONF_DB_OVERRIDE'] = 'File{' + override_file.name + \
                                  ' readonly:true}'
     env['DEBIAN_FRONTEND'] = 'noninteractive'
-    subprocess.run(['dpkg-reconfigure', package], env=env)
+    with package_manager_lock():
+        subprocess.run(['dpkg-reconfigure', package], env=env)
 
     try:
         os.remove(override_file.name)
@@ -362,16 +401,18 @@ Owners: {package}
 
 def debconf_set_selections(presets):
     """Answer debconf questions before installing a package."""
-    try:
-        # Workaround Debian Bug #487300. In some situations, debconf complains
-        # it can't find the question being answered even though it is supposed
-        # to create a dummy question for it.
-        subprocess.run(['/usr/share/debconf/fix_db.pl'], check=True)
-    except (FileNotFoundError, PermissionError):
-        pass
-
-    presets = '\n'.join(presets)
-    subprocess.check_output(['debconf-set-selections'], input=presets.encode())
+    with package_manager_lock():
+        try:
+            # Workaround Debian Bug #487300. In some situations, debconf
+            # complains it can't find the question being answered even though
+            # it is supposed to create a dummy question for it.
+            subprocess.run(['/usr/share/debconf/fix_db.pl'], check=True)
+        except (FileNotFoundError, PermissionError):
+            pass
+
+        presets = '\n'.join(presets)
+        subprocess.check_output(['debconf-set-selections'],
+                                input=presets.encode())
 
 
 def is_disk_image():
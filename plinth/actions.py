@@ -5,6 +5,9 @@ Actions run commands with this contract (version 1.1):
 
 1. (promise) Super-user actions run as root.  Normal actions do not.
 
+   Super-user actions are sent to the privileged action daemon (see
+   plinth.action_daemon) when it is running and are run using sudo otherwise.
+
 2. (promise) The actions directory can't be changed at run time.
 
    This guarantees that we can only select from the correct set of actions.
@@ -81,7 +84,7 @@ import re
 import shlex
 import subprocess
 
-from plinth import cfg
+from plinth import action_daemon, cfg
 from plinth.errors import ActionError
 
 logger = logging.getLogger(__name__)
@@ -114,25 +117,12 @@ def run_as_user(action, options=None, input=None, run_in_background=False,
     return _run(action, options, input, run_in_background, False, become_user)
 
 
-def _run(action, options=None, input=None, run_in_background=False,
-         run_as_root=False, become_user=None, log_error=True):
-    """Safely run a specific action as a normal user or root.
-
-    Actions are pulled from the actions directory.
-
-    - options are added to the action command.
-
-    - input: data (as bytes) that will be sent to the action command's stdin.
-
-    - run_in_background: run asynchronously or wait for the command to
-      complete.
+def get_action_path(action, options=None):
+    """Validate an action and its options and return path to the action.
 
-    - run_as_root: execute the command through sudo.
+    Raise ValueError if the action or options violate the contract.
 
     """
-    if options is None:
-        options = []
-
     # Contract 3A and 3B: don't call anything outside of the actions directory.
     if os.sep in action:
         raise ValueError('Action cannot contain: ' + os.sep)
@@ -146,18 +136,63 @@ def _run(action, options=None, input=None, run_in_background=False,
     if not os.access(cmd, os.F_OK):
         raise ValueError('Action must exist in action directory.')
 
-    cmd = [cmd]
-
     # Contract: 3C, 3D: don't allow shell special characters in
     # options be interpreted by the shell.  When using
     # subprocess.Popen with list invocation and not shell invocation,
     # escaping is unnecessary as each argument is passed directly to
     # the command and not parsed by a shell.
-    if options:
-        if not isinstance(options, (list, tuple)):
-            raise ValueError('Options must be list or tuple.')
+    if options and not isinstance(options, (list, tuple)):
+        raise ValueError('Options must be list or tuple.')
+
+    return cmd
+
+
+def _run_with_daemon(action, cmd, input, log_error):
+    """Run an action as root through the privileged action daemon.
+
+    Raise action_daemon.DaemonUnavailable if the daemon is not running or
+    did not accept the request.
+
+    """
+    returncode, output, error = action_daemon.run(action, cmd[1:], input)
+    _log_command(cmd, as_root=True)
+    output, error = output.decode(), error.decode()
+    if returncode != 0:
+        if log_error:
+            logger.error('Error executing command - %s, %s, %s', cmd, output,
+                         error)
+        raise ActionError(action, output, error)
+
+    return output
 
-        cmd += list(options)  # No escaping necessary
+
+def _run(action, options=None, input=None, run_in_background=False,
+         run_as_root=False, become_user=None, log_error=True):
+    """Safely run a specific action as a normal user or root.
+
+    Actions are pulled from the actions directory.
+
+    - options are added to the action command.
+
+    - input: data (as bytes) that will be sent to the action command's stdin.
+
+    - run_in_background: run asynchronously or wait for the command to
+      complete.
+
+    - run_as_root: execute the command through the privileged action daemon
+      or, if it is not running, through sudo.
+
+    """
+    if options is None:
+        options = []
+
+    cmd = [get_action_path(action, options)] + list(options)
+
+    if run_as_root and not run_in_background and not cfg.develop:
+        try:
+            return _run_with_daemon(action, cmd, input, log_error)
+        except action_daemon.DaemonUnavailable:
+            pass
 
     # Contract 1: commands can run via sudo.
     sudo_call = []
@@ -204,11 +239,15 @@ def _run(action, options=None, input=None, run_in_background=False,
     return proc
 
 
-def _log_command(cmd):
-    """Log a command with special pretty formatting to catch the eye."""
+def _log_command(cmd, as_root=False):
+    """Log a command with special pretty formatting to catch the eye.
+
+    as_root is given for commands run as root without sudo.
+
+    """
     cmd = list(cmd)  # Make a copy of the command not to affect the original
 
-    prompt = '$'
+    prompt = '#' if as_root else '$'
     user = ''
     if cmd and cmd[0] == 'sudo':
         cmd = cmd[1:]
@@ -0,0 +1,142 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Cache values that are expensive to compute, such as status read by actions.
+
+Values are stored in Django's default cache with a timeout. Each cached value
+is associated with one or more tags. Invalidating a tag discards all the values
+associated with it. This is implemented by keeping a version for each tag in
+the cache and making the version part of the keys of the cached values.
+
+In addition to the shared cache, values are memoized for the duration of a
+single web request so that calling a cached function repeatedly while serving
+a request does not even hit the cache backend.
+
+Typical usage in an app::
+
+    @cache.cached('tor-status', tags=['tor'])
+    def get_status():
+        return json.loads(actions.superuser_run('tor', ['get-status']))
+
+    def set_something():
+        actions.superuser_run('tor', ['configure', ...])
+        cache.invalidate('tor')
+
+"""
+
+import copy
+import functools
+import hashlib
+import threading
+import uuid
+
+from django.core.cache import cache as _cache
+from django.core.signals import request_finished, request_started
+
+DEFAULT_TIMEOUT = 60
+
+_KEY_PREFIX = 'plinth-cache'
+
+_TAG_PREFIX = 'plinth-cache-tag'
+
+# Marker for a value not found in the cache
+_MISSING = object()
+
+_request_cache = threading.local()
+
+
+def cached(key, timeout=DEFAULT_TIMEOUT, tags=None):
+    """Return a decorator to cache the return value of a function.
+
+    'key' must be a string unique across all cached functions. Arguments of the
+    function are added to the key so the function may take arguments that can
+    be represented with repr().
+
+    'timeout' is the number of seconds after which the value expires.
+
+    'tags' is a list of strings. Invalidating any of the tags with
+    :func:`invalidate` discards the cached value. If not provided, the key is
+    used as the only tag.
+
+    Exceptions raised by the function are not cached.
+
+    """
+    tags = list(tags or [key])
+
+    def decorator(func):
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            call_key = _get_call_key(key, args, kwargs)
+            memo = _get_request_memo()
+            if memo is not None and call_key in memo:
+                return copy.deepcopy(memo[call_key])
+
+            versions = ':'.join(
+                str(version) for version in _get_tag_versions(tags))
+            full_key = '{}:{}'.format(call_key, versions)
+            value = _cache.get(full_key, _MISSING)
+            if value is _MISSING:
+                value = func(*args, **kwargs)
+                _cache.set(full_key, value, timeout)
+
+            if memo is not None:
+                memo[call_key] = copy.deepcopy(value)
+
+            return value
+
+        return wrapper
+
+    return decorator
+
+
+def invalidate(*tags):
+    """Discard all the cached values associated with any of the given tags."""
+    _cache.set_many(
+        {_get_tag_key(tag): uuid.uuid4().hex
+         for tag in tags}, None)
+    memo = _get_request_memo()
+    if memo is not None:
+        memo.clear()
+
+
+def _get_tag_key(tag):
+    """Return the key under which version of a tag is stored."""
+    return '{}:{}'.format(_TAG_PREFIX, tag)
+
+
+def _get_tag_versions(tags):
+    """Return the current versions of the given tags."""
+    tag_keys = [_get_tag_key(tag) for tag in tags]
+    versions = _cache.get_many(tag_keys)
+    for tag_key in tag_keys:
+        if tag_key not in versions:
+            _cache.add(tag_key, uuid.uuid4().hex, None)
+            versions[tag_key] = _cache.get(tag_key)
+
+    return [versions[tag_key] for tag_key in tag_keys]
+
+
+def _get_call_key(key, args, kwargs):
+    """Return the cache key for a function call without tag versions."""
+    arguments = repr((args, sorted(kwargs.items())))
+    arguments = hashlib.sha1(arguments.encode()).hexdigest()
+    return '{}:{}:{}'.format(_KEY_PREFIX, key, arguments)
+
+
+def _get_request_memo():
+    """Return the memoization dictionary of current request, if any."""
+    return getattr(_request_cache, 'memo', None)
+
+
+def _on_request_started(**kwargs):
+    """Start a fresh memoization dictionary for the request."""
+    _request_cache.memo = {}
+
+
+def _on_request_finished(**kwargs):
+    """Discard the memoization dictionary at the end of the request."""
+    _request_cache.memo = None
+
+
+request_started.connect(_on_request_started)
+request_finished.connect(_on_request_finished)
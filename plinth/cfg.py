@@ -22,12 +22,17 @@ use_x_forwarded_host = False
 secure_proxy_ssl_header = None
 develop = False
 server_dir = '/'
+export_compression = 'pigz'
+export_compression_level = None
 
 config_file = None
 
 DEFAULT_CONFIG_FILE = '/etc/plinth/plinth.config'
 DEFAULT_ROOT = '/'
 
+# Highest level of each compression program for exported backup archives
+EXPORT_COMPRESSION_MAX_LEVELS = {'gzip': 9, 'pigz': 9, 'zstd': 19}
+
 
 def get_fallback_config_paths():
     """Get config paths of the current source code folder"""
@@ -88,17 +93,54 @@ def read(config_path=None, root_directory=None):
         ('Misc', 'box_name', 'string'),
     )
 
-    for section, name, datatype in config_items:
+    # Options that keep their default value when not configured
+    optional_config_items = (
+        ('Backups', 'export_compression', 'string'),
+        ('Backups', 'export_compression_level', 'int'),
+    )
+
+    for section, name, datatype in config_items + optional_config_items:
         try:
             value = parser.get(section, name)
         except (configparser.NoSectionError, configparser.NoOptionError):
+            if (section, name, datatype) in optional_config_items:
+                continue
+
             logger.error('Configuration does not contain option: %s.%s',
                          section, name)
             raise
         else:
             if datatype == 'int':
-                value = int(value)
+                try:
+                    value = int(value)
+                except ValueError:
+                    if (section, name, datatype) not in optional_config_items:
+                        raise
+
+                    logger.error('Invalid value for option %s.%s: %s',
+                                 section, name, value)
+                    continue
             elif datatype == 'bool':
                 value = (value.lower() == 'true')
 
             globals()[name] = value
+
+    _validate_export_compression()
+
+
+def _validate_export_compression():
+    """Use defaults instead of invalid compression of exported archives."""
+    global export_compression  # pylint: disable=global-statement
+    global export_compression_level  # pylint: disable=global-statement
+    if export_compression not in EXPORT_COMPRESSION_MAX_LEVELS:
+        logger.error('Invalid export compression, using pigz: %s',
+                     export_compression)
+        export_compression = 'pigz'
+
+    max_level = EXPORT_COMPRESSION_MAX_LEVELS[export_compression]
+    if export_compression_level is not None and \
+       not 1 <= export_compression_level <= max_level:
+        logger.error(
+            'Invalid export compression level, using default of %s: %s',
+            export_compression, export_compression_level)
+        export_compression_level = None
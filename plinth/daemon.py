@@ -3,13 +3,22 @@
 Component for managing a background daemon or any systemd unit.
 """
 
+import collections
 import socket
 import subprocess
+import threading
+import time
 
 import psutil
 from django.utils.translation import ugettext as _
 
-from plinth import action_utils, actions, app
+from plinth import action_utils, actions, app, unit_state
+
+# Maximum time in seconds a single network check may take
+CHECK_TIMEOUT = 30
+
+# Maximum age in seconds of the socket table snapshot used for port checks
+SOCKET_SNAPSHOT_LIFETIME = 5
 
 
 class Daemon(app.LeaderComponent):
@@ -36,21 +45,40 @@ class Daemon(app.LeaderComponent):
         self.listen_ports = listen_ports or []
 
     def is_enabled(self):
-        """Return if the daemon/unit is enabled."""
-        return action_utils.service_is_enabled(self.unit,
-                                               strict_check=self.strict_check)
+        """Return if the daemon/unit is enabled.
+
+        State is read from the snapshot of unit states kept over D-Bus and
+        systemctl is used only when the snapshot is not available.
+
+        """
+        state = unit_state.get_state(self.unit)
+        if state is None:
+            return action_utils.service_is_enabled(
+                self.unit, strict_check=self.strict_check)
+
+        file_state = state[1]
+        if self.strict_check:
+            return file_state == 'enabled'
+
+        return file_state in unit_state.ENABLED_STATES
 
     def enable(self):
         """Run operations to enable the daemon/unit."""
         actions.superuser_run('service', ['enable', self.unit])
+        unit_state.invalidate()
 
     def disable(self):
         """Run operations to disable the daemon/unit."""
         actions.superuser_run('service', ['disable', self.unit])
+        unit_state.invalidate()
 
     def is_running(self):
         """Return whether the daemon/unit is running."""
-        return action_utils.service_is_running(self.unit)
+        state = unit_state.get_state(self.unit)
+        if state is None:
+            return action_utils.service_is_running(self.unit)
+
+        return state[0] in unit_state.RUNNING_STATES
 
     def diagnose(self):
         """Check if the daemon is running and listening on expected ports.
@@ -85,12 +113,12 @@ def app_is_running(app_):
 def diagnose_port_listening(port, kind='tcp', listen_address=None):
     """Run a diagnostic on whether a port is being listened on.
 
-    Kind must be one of inet, inet4, inet6, tcp, tcp4, tcp6, udp,
-    udp4, udp6, unix, all.  See psutil.net_connection() for more
-    information.
+    Kind must be one of tcp, tcp4, tcp6, udp, udp4, udp6. The answer is looked
+    up in a recent snapshot of the socket table shared by all checks. See
+    :func:`get_socket_snapshot`.
 
     """
-    result = _check_port(port, kind, listen_address)
+    result = get_socket_snapshot().is_listening(port, kind, listen_address)
 
     if listen_address:
         test = _('Listening on {kind} port {listen_address}:{port}') \
@@ -102,48 +130,81 @@ def diagnose_port_listening(port, kind='tcp', listen_address=None):
     return [test, 'passed' if result else 'failed']
 
 
-def _check_port(port, kind='tcp', listen_address=None):
-    """Return whether a port is being listened on."""
-    run_kind = kind
+class SocketSnapshot:
+    """Index of listening sockets built from a single read of socket table.
 
-    if kind == 'tcp4':
-        run_kind = 'tcp'
+    Listening TCP sockets and UDP sockets without a remote address are
+    indexed by (protocol, family, port) with the set of local addresses as
+    value.
+
+    """
+    def __init__(self, connections):
+        """Build the index from a list of psutil connections."""
+        self.index = collections.defaultdict(set)
+        for connection in connections:
+            if connection.type == socket.SOCK_STREAM:
+                if connection.status != psutil.CONN_LISTEN:
+                    continue
 
-    if kind == 'udp4':
-        run_kind = 'udp'
+                protocol = 'tcp'
+            elif connection.type == socket.SOCK_DGRAM:
+                if connection.raddr:
+                    continue
 
-    for connection in psutil.net_connections(run_kind):
-        # TCP connections must have status='listen'
-        if kind in ('tcp', 'tcp4', 'tcp6') and \
-           connection.status != psutil.CONN_LISTEN:
-            continue
+                protocol = 'udp'
+            else:
+                continue
 
-        # UDP connections must have empty remote address
-        if kind in ('udp', 'udp4', 'udp6') and \
-           connection.raddr != ():
-            continue
+            address, port = connection.laddr[:2]
+            self.index[(protocol, connection.family, port)].add(address)
 
-        # Port should match
-        if connection.laddr[1] != port:
-            continue
+        self.time = time.monotonic()
 
-        # Listen address if requested should match
-        if listen_address and connection.laddr[0] != listen_address:
-            continue
+    @classmethod
+    def take(cls):
+        """Read the socket table of the system and return a new snapshot."""
+        return cls(psutil.net_connections('inet'))
 
-        # Special additional checks only for IPv4
-        if kind not in ('tcp4', 'udp4'):
-            return True
+    def is_listening(self, port, kind='tcp', listen_address=None):
+        """Return whether a port is being listened on."""
+        protocol = kind[:3]
+        if protocol not in ('tcp', 'udp') or kind[3:] not in ('', '4', '6'):
+            raise ValueError('Unknown kind of port: {}'.format(kind))
 
-        # Found socket is IPv4
-        if connection.family == socket.AF_INET:
-            return True
+        ipv4_addresses = self.index.get((protocol, socket.AF_INET, port),
+                                        set())
+        ipv6_addresses = self.index.get((protocol, socket.AF_INET6, port),
+                                        set())
+        if kind.endswith('4'):
+            # Full IPv6 address range includes mapped IPv4 address also
+            ipv6_addresses = ipv6_addresses & {'::'}
+        elif kind.endswith('6'):
+            ipv4_addresses = set()
 
-        # Full IPv6 address range includes mapped IPv4 address also
-        if connection.laddr[0] == '::':
-            return True
+        addresses = ipv4_addresses | ipv6_addresses
+        if listen_address:
+            return listen_address in addresses
 
-    return False
+        return bool(addresses)
+
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def get_socket_snapshot(max_age=SOCKET_SNAPSHOT_LIFETIME):
+    """Return a snapshot of socket table not older than max_age seconds.
+
+    All the port checks during a diagnostics run share the snapshot instead of
+    each reading the full socket table.
+
+    """
+    global _snapshot
+    with _snapshot_lock:
+        if not _snapshot or time.monotonic() - _snapshot.time > max_age:
+            _snapshot = SocketSnapshot.take()
+
+        return _snapshot
 
 
 def diagnose_netcat(host, port, input='', negate=False):
@@ -153,7 +214,13 @@ def diagnose_netcat(host, port, input='', negate=False):
                                    stdin=subprocess.PIPE,
                                    stdout=subprocess.PIPE,
                                    stderr=subprocess.PIPE)
-        process.communicate(input=input.encode())
+        try:
+            process.communicate(input=input.encode(), timeout=CHECK_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+            raise
+
         if process.returncode != 0:
             result = 'failed'
         else:
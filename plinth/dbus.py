@@ -8,7 +8,7 @@ import threading
 
 from plinth.utils import import_from_gi
 
-from . import setup
+from . import package, setup
 
 gio = import_from_gi('Gio', '2.0')
 
@@ -57,6 +57,7 @@ class PackageHandler():
     def on_cache_updated():
         """Called when system package cache is updated."""
         logger.info('Apt package cache updated.')
+        package.invalidate_cache()
 
         # Run in a new thread because we don't want to block the thread running
         # Glib main loop.
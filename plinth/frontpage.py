@@ -9,8 +9,6 @@ import os
 
 from plinth import app, cfg
 
-from . import actions
-
 logger = logging.getLogger(__name__)
 
 
@@ -109,9 +107,8 @@ class Shortcut(app.FollowerComponent):
         if not username:
             return cls._all_shortcuts
 
-        # XXX: Turn this into an API call in users module and cache
-        output = actions.superuser_run('users', ['get-user-groups', username])
-        user_groups = set(output.strip().split('\n'))
+        from plinth.modules import users
+        user_groups = set(users.get_user_groups(username))
 
         if 'admin' in user_groups:  # Admin has access to all services
             return cls._all_shortcuts
@@ -6,7 +6,7 @@ Module to handle glib main loop and provide asynchronous utilities.
 import logging
 import threading
 
-from plinth import dbus, network
+from plinth import dbus, network, unit_state
 from plinth.utils import import_from_gi
 
 glib = import_from_gi('GLib', '2.0')
@@ -38,6 +38,7 @@ def _run():
     # Initialize all modules that use glib main loop
     dbus.init()
     network.init()
+    unit_state.init()
 
     global _main_loop
     _main_loop = glib.MainLoop()
@@ -35,18 +35,19 @@ class SetupMiddleware(MiddlewareMixin):
         if user_requests_login:
             return
 
-        # Perform a URL resolution. This is slightly inefficient as
-        # Django will do this resolution again.
-        try:
-            resolver_match = urls.resolve(request.path_info)
-        except urls.Resolver404:
-            return
-
-        if not resolver_match.namespaces or not len(resolver_match.namespaces):
+        # Django has already resolved the URL before calling the view
+        # middleware. Avoid resolving it again when possible.
+        resolver_match = getattr(request, 'resolver_match', None)
+        if resolver_match:
+            module_name = (resolver_match.namespaces or [None])[0]
+        else:
+            module_name = plinth.module_loader.get_module_name_for_path(
+                request.path_info)
+
+        if not module_name:
             # Requested URL does not belong to any application
             return
 
-        module_name = resolver_match.namespaces[0]
         module = plinth.module_loader.loaded_modules[module_name]
 
         # Collect errors from any previous operations and show them
@@ -8,10 +8,11 @@ import importlib
 import logging
 import pathlib
 import re
+from concurrent.futures import ThreadPoolExecutor
 
 import django
 
-from plinth import cfg, setup
+from plinth import cfg, profiling, setup
 from plinth.signals import post_module_loading, pre_module_loading
 
 logger = logging.getLogger(__name__)
@@ -19,13 +20,81 @@ logger = logging.getLogger(__name__)
 loaded_modules = collections.OrderedDict()
 _modules_to_load = None
 
+# Maximum number of modules imported at the same time
+MAX_WORKERS = 8
+
+# URL patterns grouped by the literal path prefix of their regular expression
+_url_prefix_map = {}
+
+# Characters that end the literal prefix of a URL regular expression
+_REGEX_SPECIAL_CHARACTERS = re.compile(r'[.^$*+?{}\[\]\\|()]')
+
 
 def include_urls():
     """Include the URLs of the modules into main Django project."""
+    _import_concurrently(
+        [path + '.urls' for path in get_modules_to_load()])
     for module_import_path in get_modules_to_load():
         module_name = module_import_path.split('.')[-1]
         _include_module_urls(module_import_path, module_name)
 
+    from plinth import urls
+    _build_url_prefix_map(urls.urlpatterns)
+
+
+def get_module_name_for_path(path):
+    """Return the name of the module whose URLs handle a path, if any.
+
+    Only the URL patterns that may match the path, based on their literal
+    prefix, are tried. They are tried in the same order as Django does.
+    """
+    path = path.lstrip('/')
+    prefixes = [''] + [
+        path[:index + 1] for index, char in enumerate(path) if char == '/'
+    ]
+    candidates = []
+    for prefix in prefixes:
+        candidates += _url_prefix_map.get(prefix, [])
+
+    for _, pattern, namespace in sorted(candidates, key=lambda item: item[0]):
+        try:
+            match = pattern.resolve(path)
+        except django.urls.Resolver404:
+            continue
+
+        if match:
+            return namespace or (match.namespaces or [None])[0]
+
+    return None
+
+
+def _build_url_prefix_map(urlpatterns):
+    """Group all URL patterns by the literal prefix of their path."""
+    _url_prefix_map.clear()
+    for index, pattern in enumerate(urlpatterns):
+        namespace = getattr(pattern, 'namespace', None)
+        if namespace and _get_url_prefix(pattern) == '':
+            # Module URLs are included without a prefix, look inside
+            for sub_index, sub_pattern in enumerate(pattern.url_patterns):
+                prefix = _get_url_prefix(sub_pattern)
+                _url_prefix_map.setdefault(prefix, []).append(
+                    ((index, sub_index), sub_pattern, namespace))
+        else:
+            prefix = _get_url_prefix(pattern)
+            _url_prefix_map.setdefault(prefix, []).append(
+                ((index, 0), pattern, None))
+
+
+def _get_url_prefix(pattern):
+    """Return the literal path prefix, up to a '/', of a URL pattern."""
+    regex = pattern.pattern.regex.pattern
+    if not regex.startswith('^'):
+        return ''
+
+    match = _REGEX_SPECIAL_CHARACTERS.search(regex, 1)
+    literal = regex[1:match.start() if match else len(regex)]
+    return literal[:literal.rfind('/') + 1]
+
 
 def load_modules():
     """
@@ -33,6 +102,7 @@ def load_modules():
     import them from modules directory.
     """
     pre_module_loading.send_robust(sender="module_loader")
+    _import_concurrently(get_modules_to_load())
     modules = {}
     for module_import_path in get_modules_to_load():
         module_name = module_import_path.split('.')[-1]
@@ -59,6 +129,8 @@ def load_modules():
 
     logger.info('Module load order - %s', ordered_modules)
 
+    # Initialize one at a time, modules connect to signals in init() that
+    # others may send during their init()
     for module_name in ordered_modules:
         _initialize_module(module_name, modules[module_name])
         loaded_modules[module_name] = modules[module_name]
@@ -66,6 +138,24 @@ def load_modules():
     post_module_loading.send_robust(sender="module_loader")
 
 
+def _import_concurrently(import_paths):
+    """Import modules in threads to overlap reading them from disk.
+
+    Errors are ignored. Modules that failed are imported again, one at a time,
+    by the caller which reports any errors. Python's import locks make
+    concurrent imports of different modules safe.
+    """
+    def _import(import_path):
+        try:
+            with profiling.measure('import', import_path):
+                importlib.import_module(import_path)
+        except Exception:
+            pass
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        list(executor.map(_import, import_paths))
+
+
 def _insert_modules(module_name, module, remaining_modules, ordered_modules):
     """Insert modules into a list based on dependency order"""
     if module_name in ordered_modules:
@@ -110,6 +200,12 @@ def _include_module_urls(module_import_path, module_name):
 
 def _initialize_module(module_name, module):
     """Call initialization method in the module if it exists"""
+    with profiling.measure('init', module_name):
+        _do_initialize_module(module_name, module)
+
+
+def _do_initialize_module(module_name, module):
+    """Perform setup related initialization and call init()."""
     # Perform setup related initialization on the module
     setup.init(module_name, module)
 
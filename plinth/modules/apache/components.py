@@ -5,11 +5,20 @@ App component for other apps to use Apache configuration functionality.
 
 import re
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 
 from django.utils.translation import ugettext as _
 
 from plinth import action_utils, actions, app
 
+from .url_checker import SUPPORTED_WRAPPERS, URLChecker
+
+# Maximum time in seconds a single URL check may take
+CHECK_TIMEOUT = 30
+
+# Maximum number of URLs checked at the same time
+MAX_WORKERS = 8
+
 
 class Webserver(app.LeaderComponent):
     """Component to enable/disable Apache configuration."""
@@ -107,13 +116,14 @@ class Uwsgi(app.LeaderComponent):
 
 
 def diagnose_url(url, kind=None, env=None, check_certificate=True,
-                 extra_options=None, wrapper=None, expected_output=None):
+                 extra_options=None, wrapper=None, expected_output=None,
+                 checker=None):
     """Run a diagnostic on whether a URL is accessible.
 
     Kind can be '4' for IPv4 or '6' for IPv6.
     """
     result = check_url(url, kind, env, check_certificate, extra_options,
-                       wrapper, expected_output)
+                       wrapper, expected_output, checker=checker)
 
     if kind:
         return [
@@ -125,19 +135,49 @@ def diagnose_url(url, kind=None, env=None, check_certificate=True,
 
 
 def diagnose_url_on_all(url, **kwargs):
-    """Run a diagnostic on whether a URL is accessible."""
-    results = []
-    for address in action_utils.get_addresses():
-        current_url = url.format(host=address['url_address'])
-        results.append(
-            diagnose_url(current_url, kind=address['kind'], **kwargs))
+    """Run a diagnostic on whether a URL is accessible on all addresses.
 
-    return results
+    URLs are checked concurrently sharing connections. Results are in the
+    order of addresses.
+    """
+    addresses = action_utils.get_addresses()
+    with URLChecker(timeout=CHECK_TIMEOUT) as checker, \
+            ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        futures = [
+            executor.submit(diagnose_url,
+                            url.format(host=address['url_address']),
+                            kind=address['kind'], checker=checker, **kwargs)
+            for address in addresses
+        ]
+        return [future.result() for future in futures]
 
 
 def check_url(url, kind=None, env=None, check_certificate=True,
-              extra_options=None, wrapper=None, expected_output=None):
-    """Check whether a URL is accessible."""
+              extra_options=None, wrapper=None, expected_output=None,
+              checker=None):
+    """Check whether a URL is accessible.
+
+    The check is performed in-process. curl is used only when extra options
+    for it are provided or when wrapped with an unsupported command. A checker
+    may be provided to reuse connections across checks.
+    """
+    if extra_options or wrapper not in SUPPORTED_WRAPPERS:
+        return _check_url_with_curl(url, kind, env, check_certificate,
+                                    extra_options, wrapper, expected_output)
+
+    if checker:
+        return checker.check(url, kind, env, check_certificate, wrapper,
+                             expected_output)
+
+    with URLChecker(timeout=CHECK_TIMEOUT) as checker:
+        return checker.check(url, kind, env, check_certificate, wrapper,
+                             expected_output)
+
+
+def _check_url_with_curl(url, kind=None, env=None, check_certificate=True,
+                         extra_options=None, wrapper=None,
+                         expected_output=None):
+    """Check whether a URL is accessible using curl."""
     command = ['curl', '--location', '-f', '-w', '%{response_code}']
 
     if kind == '6':
@@ -164,7 +204,8 @@ def check_url(url, kind=None, env=None, check_certificate=True,
     try:
         process = subprocess.run(command, env=env, check=True,
                                  stdout=subprocess.PIPE,
-                                 stderr=subprocess.PIPE)
+                                 stderr=subprocess.PIPE,
+                                 timeout=CHECK_TIMEOUT)
         result = 'passed'
         if expected_output and expected_output not in process.stdout.decode():
             result = 'failed'
@@ -173,6 +214,8 @@ def check_url(url, kind=None, env=None, check_certificate=True,
         # Authorization failed is a success
         if exception.stdout.decode().strip() in ('401', '405'):
             result = 'passed'
+    except subprocess.TimeoutExpired:
+        result = 'failed'
     except FileNotFoundError:
         result = 'error'
 
@@ -8,7 +8,8 @@ from unittest.mock import call, patch
 
 import pytest
 
-from plinth.modules.apache.components import (Uwsgi, Webserver, check_url,
+from plinth.modules.apache.components import (Uwsgi, Webserver,
+                                              _check_url_with_curl, check_url,
                                               diagnose_url,
                                               diagnose_url_on_all)
 
@@ -214,38 +215,44 @@ def test_diagnose_url(get_addresses, check):
 
 
 @patch('subprocess.run')
-def test_check_url(run):
-    """Test checking whether a URL is accessible."""
+def test_check_url_with_curl(run):
+    """Test checking whether a URL is accessible using curl."""
     url = 'http://localhost/test'
     basic_command = ['curl', '--location', '-f', '-w', '%{response_code}']
-    extra_args = {'env': None, 'check': True, 'stdout': -1, 'stderr': -1}
+    extra_args = {
+        'env': None,
+        'check': True,
+        'stdout': -1,
+        'stderr': -1,
+        'timeout': 30
+    }
 
     # Basic
-    assert check_url(url) == 'passed'
+    assert _check_url_with_curl(url) == 'passed'
     run.assert_called_with(basic_command + [url], **extra_args)
 
     # Wrapper
-    check_url(url, wrapper='test-wrapper')
+    _check_url_with_curl(url, wrapper='test-wrapper')
     run.assert_called_with(['test-wrapper'] + basic_command + [url],
                            **extra_args)
 
     # No certificate check
-    check_url(url, check_certificate=False)
+    _check_url_with_curl(url, check_certificate=False)
     run.assert_called_with(basic_command + [url, '-k'], **extra_args)
 
     # Extra options
-    check_url(url, extra_options=['test-opt1', 'test-opt2'])
+    _check_url_with_curl(url, extra_options=['test-opt1', 'test-opt2'])
     run.assert_called_with(basic_command + [url, 'test-opt1', 'test-opt2'],
                            **extra_args)
 
     # TCP4/TCP6
-    check_url(url, kind='4')
+    _check_url_with_curl(url, kind='4')
     run.assert_called_with(basic_command + [url, '-4'], **extra_args)
-    check_url(url, kind='6')
+    _check_url_with_curl(url, kind='6')
     run.assert_called_with(basic_command + [url, '-6'], **extra_args)
 
     # IPv6 Link Local URLs
-    check_url('https://[::2%eth0]/test', kind='6')
+    _check_url_with_curl('https://[::2%eth0]/test', kind='6')
     run.assert_called_with(
         basic_command + ['--interface', 'eth0', 'https://[::2]/test', '-6'],
         **extra_args)
@@ -254,15 +261,41 @@ def test_check_url(run):
     exception = subprocess.CalledProcessError(returncode=1, cmd=['curl'])
     run.side_effect = exception
     run.side_effect.stdout = b'500'
-    assert check_url(url) == 'failed'
+    assert _check_url_with_curl(url) == 'failed'
 
     # Return code 401, 405
     run.side_effect = exception
     run.side_effect.stdout = b' 401 '
-    assert check_url(url) == 'passed'
+    assert _check_url_with_curl(url) == 'passed'
     run.side_effect.stdout = b'405\n'
-    assert check_url(url) == 'passed'
+    assert _check_url_with_curl(url) == 'passed'
+
+    # Timeout
+    run.side_effect = subprocess.TimeoutExpired(cmd=['curl'], timeout=30)
+    assert _check_url_with_curl(url) == 'failed'
 
     # Error
     run.side_effect = FileNotFoundError()
-    assert check_url(url) == 'error'
+    assert _check_url_with_curl(url) == 'error'
+
+
+@patch('plinth.modules.apache.components._check_url_with_curl')
+@patch('plinth.modules.apache.url_checker.URLChecker.check')
+def test_check_url(check, check_with_curl):
+    """Test that curl is used only for options not supported natively."""
+    check.return_value = 'passed'
+    assert check_url('http://localhost/test', kind='4') == 'passed'
+    check.assert_called_with('http://localhost/test', '4', None, True, None,
+                             None)
+    check_with_curl.assert_not_called()
+
+    check_url('http://localhost/test', wrapper='torsocks')
+    check_with_curl.assert_not_called()
+
+    check_url('http://localhost/test', extra_options=['test-opt'])
+    check_with_curl.assert_called_with('http://localhost/test', None, None,
+                                       True, ['test-opt'], None, None)
+
+    check_url('http://localhost/test', wrapper='test-wrapper')
+    check_with_curl.assert_called_with('http://localhost/test', None, None,
+                                       True, None, 'test-wrapper', None)
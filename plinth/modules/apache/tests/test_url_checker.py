@@ -0,0 +1,149 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Test module for checking URLs in-process.
+"""
+
+import http.server
+import socket
+import threading
+import time
+
+import pytest
+
+from plinth.modules.apache.url_checker import URLChecker, _get_proxy
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    """Respond based on the requested path."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        """Handle a GET request."""
+        self.server.connections.add(self.client_address)
+        status = 200
+        headers = {}
+        body = b'test-body'
+        if self.path.startswith('/status/'):
+            status = int(self.path.split('/')[-1])
+        elif self.path == '/redirect':
+            status = 302
+            headers['Location'] = '/status/200'
+        elif self.path == '/loop':
+            status = 302
+            headers['Location'] = '/loop'
+        elif self.path == '/slow':
+            time.sleep(2)
+        elif self.path == '/close':
+            # Close without telling the client, like an idle timeout
+            self.close_connection = True
+
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        if self.close_connection:
+            self.wfile.flush()
+            self.connection.shutdown(socket.SHUT_RDWR)
+
+    def log_message(self, *args):
+        """Don't log requests."""
+
+
+@pytest.fixture(name='server')
+def fixture_server():
+    """Run an HTTP server on localhost in a thread."""
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    server.daemon_threads = True
+    server.connections = set()
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield 'http://127.0.0.1:{}'.format(server.server_address[1]), server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+@pytest.fixture(name='checker')
+def fixture_checker():
+    """Return a URL checker with a short timeout."""
+    with URLChecker(timeout=1) as checker:
+        yield checker
+
+
+def test_status(server, checker):
+    """Test that result depends on the HTTP status."""
+    url, _ = server
+    assert checker.check(url + '/') == 'passed'
+    assert checker.check(url + '/status/500') == 'failed'
+    assert checker.check(url + '/status/404') == 'failed'
+    assert checker.check(url + '/status/401') == 'passed'
+    assert checker.check(url + '/status/405') == 'passed'
+
+
+def test_redirect(server, checker):
+    """Test that redirects are followed."""
+    url, _ = server
+    assert checker.check(url + '/redirect') == 'passed'
+    assert checker.check(url + '/loop') == 'failed'
+
+
+def test_expected_output(server, checker):
+    """Test checking the response body."""
+    url, _ = server
+    assert checker.check(url + '/', expected_output='test-body') == 'passed'
+    assert checker.check(url + '/', expected_output='other') == 'failed'
+
+
+def test_kind(server, checker):
+    """Test restricting the address family."""
+    url, _ = server
+    assert checker.check(url + '/', kind='4') == 'passed'
+    assert checker.check(url + '/', kind='6') == 'failed'
+
+
+def test_connection_reuse(server, checker):
+    """Test that connections are reused across checks."""
+    url, server = server
+    for _ in range(3):
+        assert checker.check(url + '/') == 'passed'
+
+    assert len(server.connections) == 1
+
+
+def test_closed_idle_connection(server, checker):
+    """Test that an idle connection closed by the server is not a failure."""
+    url, server = server
+    assert checker.check(url + '/close') == 'passed'
+    time.sleep(0.1)
+    assert checker.check(url + '/') == 'passed'
+    assert len(server.connections) == 2
+
+
+def test_no_proxy():
+    """Test that hosts in no_proxy are accessed without proxy."""
+    env = {
+        'http_proxy': 'http://proxy:3128',
+        'no_proxy': 'localhost, .example.com'
+    }
+    assert _get_proxy('http', 'localhost', env) is None
+    assert _get_proxy('http', 'example.com', env) is None
+    assert _get_proxy('http', 'www.Example.com', env) is None
+    assert _get_proxy('http', 'example.org', env).hostname == 'proxy'
+    assert _get_proxy('http', 'example.org', {
+        'http_proxy': 'http://proxy:3128',
+        'NO_PROXY': '*'
+    }) is None
+
+
+def test_failures(server, checker):
+    """Test timeouts, refused connections and invalid URLs."""
+    url, _ = server
+    assert checker.check(url + '/slow') == 'failed'
+    assert checker.check('http://127.0.0.1:1/') == 'failed'
+    assert checker.check('ftp://127.0.0.1/') == 'failed'
+    with pytest.raises(ValueError):
+        checker.check(url + '/', wrapper='test-wrapper')
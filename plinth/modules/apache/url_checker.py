@@ -0,0 +1,377 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Check whether URLs are accessible without spawning curl.
+
+URLChecker performs HTTP(S) requests in-process using http.client. It keeps
+idle connections in a pool so that checking many URLs on the same host reuses
+connections. It supports the options used by diagnostics with curl:
+
+- Restricting connections to IPv4 or IPv6.
+- Disabling certificate verification.
+- Following redirects.
+- Using an HTTP proxy given in environment as https_proxy/http_proxy, except
+  for hosts listed in no_proxy.
+- Connecting through Tor (the 'torsocks' wrapper) using Tor's SOCKS port.
+- Checking that the response contains an expected string.
+
+Result strings are the same as with curl: 'passed', 'failed' or 'error'.
+"""
+
+import http.client
+import ipaddress
+import logging
+import os
+import socket
+import ssl
+import struct
+import threading
+import urllib.parse
+
+logger = logging.getLogger(__name__)
+
+# Maximum time in seconds to wait for a connection or a response
+DEFAULT_TIMEOUT = 30
+
+# Maximum number of redirects followed, same as curl's default
+MAX_REDIRECTS = 50
+
+# Maximum size of response body read to look for expected output
+MAX_BODY_SIZE = 1024 * 1024
+
+# Tor's SOCKS port used instead of running through torsocks
+TOR_SOCKS_ADDRESS = ('127.0.0.1', 9050)
+
+# HTTP status codes other than success that count as the URL being accessible
+# (authorization required, method not allowed)
+ACCEPTED_ERROR_CODES = (401, 405)
+
+SUPPORTED_WRAPPERS = (None, 'torsocks')
+
+
+class SocksError(OSError):
+    """SOCKS proxy refused to establish a connection."""
+
+
+def _socks5_connect(proxy_address, host, port, timeout):
+    """Connect to host:port through a SOCKS5 proxy and return the socket.
+
+    Host names are resolved by the proxy (like torsocks does).
+
+    """
+    sock = socket.create_connection(proxy_address, timeout=timeout)
+    try:
+        sock.sendall(b'\x05\x01\x00')
+        if _receive(sock, 2) != b'\x05\x00':
+            raise SocksError('SOCKS proxy requires authentication')
+
+        host = host.encode('idna')
+        sock.sendall(b'\x05\x01\x00\x03' + bytes([len(host)]) + host +
+                     struct.pack('>H', port))
+        version, reply, _, address_type = _receive(sock, 4)
+        if version != 5 or reply != 0:
+            raise SocksError('SOCKS connect failed with code {}'.format(reply))
+
+        address_length = {1: 4, 4: 16}.get(address_type)
+        if address_length is None:
+            address_length = _receive(sock, 1)[0]
+
+        _receive(sock, address_length + 2)
+    except Exception:
+        sock.close()
+        raise
+
+    return sock
+
+
+def _receive(sock, size):
+    """Receive exactly size bytes from a socket."""
+    data = b''
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise SocksError('SOCKS proxy closed connection')
+
+        data += chunk
+
+    return data
+
+
+def _create_connection(host, port, family, timeout, socks_proxy):
+    """Create a socket connected to host using only the given family."""
+    if socks_proxy:
+        return _socks5_connect(socks_proxy, host, port, timeout)
+
+    error = None
+    for info in socket.getaddrinfo(host, port, family, socket.SOCK_STREAM):
+        address_family, socket_type, protocol, _, address = info
+        sock = socket.socket(address_family, socket_type, protocol)
+        try:
+            sock.settimeout(timeout)
+            sock.connect(address)
+            return sock
+        except OSError as exception:
+            error = exception
+            sock.close()
+
+    raise error or OSError('No address found for {}'.format(host))
+
+
+class _HTTPConnection(http.client.HTTPConnection):
+    """HTTP connection restricted to an address family or via SOCKS."""
+
+    def __init__(self, *args, family=socket.AF_UNSPEC, socks_proxy=None,
+                 **kwargs):
+        super().__init__(*args, **kwargs)
+        self.family = family
+        self.socks_proxy = socks_proxy
+
+    def connect(self):
+        """Connect to the host or the proxy."""
+        self.sock = _create_connection(self.host, self.port, self.family,
+                                       self.timeout, self.socks_proxy)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if self._tunnel_host:
+            self._tunnel()
+
+
+class _HTTPSConnection(_HTTPConnection):
+    """HTTPS connection restricted to an address family or via SOCKS."""
+
+    default_port = http.client.HTTPS_PORT
+
+    def __init__(self, *args, context=None, server_hostname=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.context = context
+        self.server_hostname = server_hostname
+
+    def connect(self):
+        """Connect and perform TLS handshake."""
+        super().connect()
+        self.sock = self.context.wrap_socket(
+            self.sock, server_hostname=self.server_hostname)
+
+
+def _get_proxy(scheme, hostname, env):
+    """Return proxy URL for a scheme and host from environment like curl."""
+    env = os.environ if env is None else env
+    if _is_proxy_skipped(hostname, env):
+        return None
+
+    names = ['{}_proxy'.format(scheme), 'all_proxy', 'ALL_PROXY']
+    if scheme != 'http':
+        names.insert(1, '{}_PROXY'.format(scheme.upper()))
+
+    for name in names:
+        if env.get(name):
+            return urllib.parse.urlsplit(env[name])
+
+    return None
+
+
+def _is_proxy_skipped(hostname, env):
+    """Return whether host is excluded from using proxy by no_proxy.
+
+    Like curl, '*' matches all hosts and other entries match the host name
+    and its sub-domains.
+
+    """
+    no_proxy = env.get('no_proxy') or env.get('NO_PROXY') or ''
+    hostname = hostname.lower().rstrip('.')
+    for entry in no_proxy.split(','):
+        entry = entry.strip().lower().lstrip('.')
+        if entry == '*':
+            return True
+
+        if entry and (hostname == entry or hostname.endswith('.' + entry)):
+            return True
+
+    return False
+
+
+def _split_host(hostname):
+    """Return host for connecting and for Host header from URL's hostname."""
+    host = hostname
+    header_host = hostname
+    try:
+        if ipaddress.ip_address(hostname.split('%')[0]).version == 6:
+            header_host = '[{}]'.format(hostname.split('%')[0])
+    except ValueError:
+        pass
+
+    return host, header_host
+
+
+class URLChecker:
+    """Check accessibility of URLs reusing connections."""
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT):
+        """Initialize the checker with an empty connection pool."""
+        self.timeout = timeout
+        self._pool = {}
+        self._lock = threading.Lock()
+
+    def close(self):
+        """Close all the idle connections."""
+        with self._lock:
+            for connections in self._pool.values():
+                for connection in connections:
+                    connection.close()
+
+            self._pool = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def check(self, url, kind=None, env=None, check_certificate=True,
+              wrapper=None, expected_output=None):
+        """Check whether a URL is accessible.
+
+        Return 'passed' if the URL (after following redirects) responds with
+        success or with authorization required/method not allowed errors,
+        'failed' otherwise.
+
+        """
+        if wrapper not in SUPPORTED_WRAPPERS:
+            raise ValueError('Unsupported wrapper: {}'.format(wrapper))
+
+        family = {
+            '4': socket.AF_INET,
+            '6': socket.AF_INET6
+        }.get(kind, socket.AF_UNSPEC)
+        try:
+            for _ in range(MAX_REDIRECTS + 1):
+                status, headers, body = self._request(
+                    url, family, env, check_certificate, wrapper,
+                    expected_output is not None)
+                location = headers.get('Location')
+                if status in (301, 302, 303, 307, 308) and location:
+                    url = urllib.parse.urljoin(url, location)
+                    continue
+
+                break
+            else:
+                return 'failed'
+        except (OSError, http.client.HTTPException, ValueError) as exception:
+            logger.debug('Error accessing URL %s: %s', url, exception)
+            return 'failed'
+        except Exception:
+            logger.exception('Error checking URL %s', url)
+            return 'error'
+
+        if status >= 400:
+            return 'passed' if status in ACCEPTED_ERROR_CODES else 'failed'
+
+        if expected_output and expected_output not in body:
+            return 'failed'
+
+        return 'passed'
+
+    def _request(self, url, family, env, check_certificate, wrapper,
+                 read_body):
+        """Perform a GET request and return status, headers and body."""
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            raise ValueError('Unsupported URL scheme: {}'.format(url))
+
+        proxy = _get_proxy(parts.scheme, parts.hostname, env)
+        key = (parts.scheme, parts.hostname, parts.port, family,
+               check_certificate, wrapper, repr(proxy))
+        _, header_host = _split_host(parts.hostname)
+        if parts.port:
+            header_host += ':{}'.format(parts.port)
+
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+
+        connection = self._get_idle_connection(key)
+        if connection:
+            try:
+                return self._send(key, connection, path, url, header_host,
+                                  read_body)
+            except (http.client.RemoteDisconnected, BrokenPipeError,
+                    ConnectionResetError):
+                # Server has closed the idle connection, use a new one
+                logger.debug('Idle connection for %s closed, reconnecting',
+                             url)
+
+        connection = self._new_connection(parts, family, proxy,
+                                          check_certificate, wrapper)
+        return self._send(key, connection, path, url, header_host, read_body)
+
+    def _send(self, key, connection, path, url, header_host, read_body):
+        """Send request on the connection, return status, headers, body."""
+        if connection.is_forward_proxy:
+            path = url
+
+        try:
+            connection.request('GET', path, headers={
+                'Host': header_host,
+                'User-Agent': 'FreedomBox-diagnostics',
+                'Accept': '*/*'
+            })
+            response = connection.getresponse()
+            body = response.read(MAX_BODY_SIZE)
+            reusable = not response.will_close and response.isclosed()
+        except Exception:
+            connection.close()
+            raise
+
+        if reusable:
+            self._put_connection(key, connection)
+        else:
+            connection.close()
+
+        body = body.decode(errors='replace') if read_body else ''
+        return response.status, response.headers, body
+
+    def _get_idle_connection(self, key):
+        """Return an idle connection from pool or None."""
+        with self._lock:
+            connections = self._pool.get(key)
+            if connections:
+                return connections.pop()
+
+        return None
+
+    def _new_connection(self, parts, family, proxy, check_certificate,
+                        wrapper):
+        """Return a new connection to the host of the URL or the proxy."""
+        host, _ = _split_host(parts.hostname)
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        socks_proxy = TOR_SOCKS_ADDRESS if wrapper == 'torsocks' else None
+        kwargs = {
+            'timeout': self.timeout,
+            'family': family,
+            'socks_proxy': socks_proxy
+        }
+
+        connect_host, connect_port = host, port
+        if proxy:
+            connect_host, connect_port = proxy.hostname, proxy.port or 1080
+
+        if parts.scheme == 'https':
+            context = ssl.create_default_context()
+            if not check_certificate:
+                context.check_hostname = False
+                context.verify_mode = ssl.CERT_NONE
+
+            connection = _HTTPSConnection(connect_host, connect_port,
+                                          context=context,
+                                          server_hostname=host.split('%')[0],
+                                          **kwargs)
+            if proxy:
+                connection.set_tunnel(host, port)
+        else:
+            connection = _HTTPConnection(connect_host, connect_port, **kwargs)
+
+        connection.is_forward_proxy = bool(proxy) and parts.scheme == 'http'
+        return connection
+
+    def _put_connection(self, key, connection):
+        """Return a connection to the pool for reuse."""
+        with self._lock:
+            self._pool.setdefault(key, []).append(connection)
@@ -3,6 +3,7 @@
 FreedomBox app to manage backup archives.
 """
 
+import hashlib
 import json
 import os
 import pathlib
@@ -15,12 +16,13 @@ from django.utils.translation import ugettext_lazy as _
 from plinth import actions
 from plinth import app as app_module
 from plinth import cfg, menu
+from plinth.errors import ActionError
 
 from . import api
 
-version = 2
+version = 3
 
-managed_packages = ['borgbackup', 'sshfs']
+managed_packages = ['borgbackup', 'pigz', 'sshfs', 'zstd']
 
 depends = ['storage']
 
@@ -31,6 +33,14 @@ _description = [
 MANIFESTS_FOLDER = '/var/lib/plinth/backups-manifests/'
 # session variable name that stores when a backup file should be deleted
 SESSION_PATH_VARIABLE = 'fbx-backups-upload-path'
+# File extension and media type of exported archives for each compression
+EXPORT_FORMATS = {
+    'gzip': ('.tar.gz', 'application/gzip'),
+    'pigz': ('.tar.gz', 'application/gzip'),
+    'zstd': ('.tar.zst', 'application/zstd'),
+}
+# Directory with control sockets of SSH connections shared by borg
+SSH_CONTROL_FOLDER = '/run/plinth-backups-ssh'
 
 app = None
 
@@ -73,7 +83,7 @@ def setup(helper, old_version=None):
     helper.call('post', app.enable)
 
 
-def _backup_handler(packet, encryption_passphrase=None):
+def _backup_handler(packet, encryption_passphrase=None, ssh_options=None):
     """Performs backup operation on packet."""
     if not os.path.exists(MANIFESTS_FOLDER):
         os.makedirs(MANIFESTS_FOLDER)
@@ -91,14 +101,47 @@ def _backup_handler(packet, encryption_passphrase=None):
         json.dump(manifests, manifest_file)
 
     paths = packet.directories + packet.files
+    arguments = ['create-archive', '--path', packet.path]
+    if packet.root != '/':
+        # Paths are relative to the snapshot, manifest is on the live system
+        paths = [os.path.relpath(path, '/') for path in paths]
+        arguments += ['--root', packet.root]
+
     paths.append(manifest_path)
-    arguments = ['create-archive', '--path', packet.path, '--paths'] + paths
-    input_data = ''
+    arguments += ['--paths'] + paths
+    input_data = dict(ssh_options or {})
     if encryption_passphrase:
-        input_data = json.dumps(
-            {'encryption_passphrase': encryption_passphrase})
+        input_data['encryption_passphrase'] = encryption_passphrase
+
+    input_data = json.dumps(input_data) if input_data else ''
+    return _run_with_progress(arguments, input_data.encode(), packet.job)
+
+
+def _run_with_progress(arguments, input_data, job):
+    """Run backups action reporting progress of borg to the job."""
+    if not job:
+        return actions.superuser_run('backups', arguments, input=input_data)
+
+    process = actions.superuser_run('backups', arguments + ['--progress'],
+                                    run_in_background=True)
+    process.stdin.write(input_data)
+    process.stdin.close()
+
+    errors = []
+    for line in process.stderr:
+        try:
+            message = json.loads(line.decode())
+            job.update_progress(message, source=process.pid)
+            if message.get('type') == 'log_message':
+                errors.append(message.get('message', ''))
+        except (ValueError, AttributeError):
+            errors.append(line.decode())
+
+    output = process.stdout.read().decode()
+    if process.wait() != 0:
+        raise ActionError('backups', output, '\n'.join(errors))
 
-    actions.superuser_run('backups', arguments, input=input_data.encode())
+    return output
 
 
 def get_exported_archive_apps(path):
@@ -117,24 +160,28 @@ def _restore_exported_archive_handler(packet, encryption_passphrase=None):
                           input=locations_data.encode())
 
 
-def restore_archive_handler(packet, encryption_passphrase=None):
+def restore_archive_handler(packet, encryption_passphrase=None,
+                            ssh_options=None):
     """Perform restore operation on packet."""
-    locations = {
+    locations = dict(ssh_options or {})
+    locations.update({
         'directories': packet.directories,
         'files': packet.files,
         'encryption_passphrase': encryption_passphrase
-    }
+    })
     locations_data = json.dumps(locations)
     arguments = [
         'restore-archive', '--path', packet.path, '--destination', '/'
     ]
-    actions.superuser_run('backups', arguments, input=locations_data.encode())
+    _run_with_progress(arguments, locations_data.encode(), packet.job)
 
 
-def restore_from_upload(path, apps=None):
+def restore_from_upload(path, apps=None, job=None):
     """Restore files from an uploaded .tar.gz backup file"""
+    # Each extraction reads through the entire compressed file
     api.restore_apps(_restore_exported_archive_handler, app_names=apps,
-                     create_subvolume=False, backup_file=path)
+                     create_subvolume=False, backup_file=path, max_workers=1,
+                     job=job)
 
 
 def get_known_hosts_path():
@@ -165,3 +212,59 @@ def split_path(path):
 
     """
     return re.findall(r'^(.*)@([^/]*):(.*)$', path)[0]
+
+
+def get_ssh_url(path):
+    """Return the ssh:// URL for borg to reach a remote path directly."""
+    username, hostname, dir_path = split_path(path)
+    if ':' in hostname:
+        hostname = '[' + hostname + ']'
+
+    if not dir_path.startswith('/'):
+        if dir_path.startswith('~'):
+            dir_path = dir_path[1:]
+
+        dir_path = '/~/' + dir_path.lstrip('/')
+
+    return f'ssh://{username}@{hostname}{dir_path}'
+
+
+def get_ssh_destination(url):
+    """Return user@host from an ssh:// URL or None for other paths."""
+    match = re.match(r'^ssh://([^/]*)/', url)
+    if not match:
+        return None
+
+    return match.group(1).replace('[', '').replace(']', '')
+
+
+def get_ssh_control_path(destination):
+    """Return the control socket of shared connection to user@host."""
+    digest = hashlib.sha256(destination.encode()).hexdigest()[:16]
+    return os.path.join(SSH_CONTROL_FOLDER, digest)
+
+
+def get_ssh_command(destination, user_known_hosts_file=None,
+                    ssh_keyfile=None):
+    """Return SSH command using the shared connection to user@host.
+
+    When no shared connection is open, the command connects by itself using
+    the known hosts file and the key file, if given. It fails instead of
+    asking for a password.
+
+    """
+    command = [
+        'ssh', '-o', 'ControlMaster=no', '-o',
+        'ControlPath=' + get_ssh_control_path(destination), '-o',
+        'BatchMode=yes'
+    ]
+    if user_known_hosts_file:
+        command += [
+            '-o', 'UserKnownHostsFile=' + user_known_hosts_file, '-o',
+            'StrictHostKeyChecking=yes'
+        ]
+
+    if ssh_keyfile:
+        command += ['-o', 'IdentityFile=' + ssh_keyfile]
+
+    return command
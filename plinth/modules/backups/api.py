@@ -3,19 +3,31 @@
 API for performing backup and restore.
 
 Backups can be full disk backups or backup of individual applications.
+Applications are restored concurrently when they don't depend on each other.
+
+On filesystems supporting snapshots, services of apps are only stopped while
+a read-only snapshot is taken. The backup is then made from the snapshot while
+the apps are running again. Only the root subvolume is snapshotted, so apps
+with data on other subvolumes or filesystems are backed up with services
+stopped.
 
 TODO:
-- Implement snapshots by calling to snapshots module.
+- Implement restoring to subvolumes.
 - Handles errors during backup and service start/stop.
 - Implement unit tests.
 """
 
+import concurrent.futures
+import json
 import logging
 
 from plinth import actions, action_utils, module_loader, setup
 
 logger = logging.getLogger(__name__)
 
+# Number of groups of independent apps restored at the same time
+MAX_RESTORE_WORKERS = 4
+
 
 def validate(backup):
     """Validate the backup' information schema."""
@@ -97,12 +109,15 @@ class Packet:
         path is the full path of an (possibly exported) archive.
         TODO: create two variables out of it as it's distinct information.
 
+        job, if set, is the background job that handlers report progress to.
+
         """
         self.operation = operation
         self.scope = scope
         self.root = root
         self.apps = apps
         self.path = path
+        self.job = None
         self.errors = []
 
         self.directories = []
@@ -135,7 +150,7 @@ def backup_full(backup_handler, path=None):
 
 def restore_full(restore_handler):
     """Restore the entire system."""
-    if not _is_snapshot_available():
+    if not _is_subvolume_available():
         raise Exception('Full restore is not supported without snapshots.')
 
     subvolume = _create_subvolume(empty=True)
@@ -147,37 +162,65 @@ def restore_full(restore_handler):
 
 
 def backup_apps(backup_handler, path, app_names=None,
-                encryption_passphrase=None):
-    """Backup data belonging to a set of applications."""
+                encryption_passphrase=None, job=None):
+    """Backup data belonging to a set of applications.
+
+    If possible, take a snapshot while services are stopped and backup from
+    the snapshot after restarting the services. Otherwise, keep services
+    stopped during the entire backup.
+
+    """
     if not app_names:
         apps = get_all_apps_for_backup()
     else:
         apps = get_apps_in_order(app_names)
 
-    if _is_snapshot_available():
-        snapshot = _take_snapshot()
-        backup_root = snapshot['mount_path']
-        snapshotted = True
-    else:
-        _lockdown_apps(apps, lockdown=True)
-        original_state = _shutdown_services(apps)
-        backup_root = '/'
-        snapshotted = False
+    packet = Packet('backup', 'apps', '/', apps, path)
+    packet.job = job
+    _lockdown_apps(apps, lockdown=True)
+    original_state = _shutdown_services(apps)
+    snapshot = None
+    try:
+        _run_hooks('backup_pre', packet)
+        if _is_snapshot_available():
+            try:
+                snapshot = _take_snapshot(packet.directories + packet.files)
+            except Exception as exception:
+                logger.warning(
+                    'Unable to take snapshot, backing up with services '
+                    'stopped: %s', exception)
+
+        if snapshot:
+            packet.root = snapshot['mount_path']
+            _restore_services(original_state)
+            _lockdown_apps(apps, lockdown=False)
+            original_state = None
+
+        result = backup_handler(packet,
+                                encryption_passphrase=encryption_passphrase)
+        _run_hooks('backup_post', packet)
+    finally:
+        if original_state is not None:
+            _restore_services(original_state)
+            _lockdown_apps(apps, lockdown=False)
+
+        if snapshot:
+            _delete_snapshot(snapshot)
+
+    return result
 
-    packet = Packet('backup', 'apps', backup_root, apps, path)
-    _run_operation(backup_handler, packet,
-                   encryption_passphrase=encryption_passphrase)
 
-    if snapshotted:
-        _delete_snapshot(snapshot)
-    else:
-        _restore_services(original_state)
-        _lockdown_apps(apps, lockdown=False)
+def restore_apps(restore_handler, app_names=None, create_subvolume=True,
+                 backup_file=None, encryption_passphrase=None,
+                 max_workers=MAX_RESTORE_WORKERS, job=None):
+    """Restore data belonging to a set of applications.
 
+    Apps are restored in groups that don't depend on each other. Groups are
+    restored concurrently and the services of a group are restarted as soon
+    as its data is restored. If a job is given, the state of each app is set
+    to one of 'waiting', 'restoring', 'done' or 'failed'.
 
-def restore_apps(restore_handler, app_names=None, create_subvolume=True,
-                 backup_file=None, encryption_passphrase=None):
-    """Restore data belonging to a set of applications."""
+    """
     if not app_names:
         apps = get_all_apps_for_backup()
     else:
@@ -185,25 +228,117 @@ def restore_apps(restore_handler, app_names=None, create_subvolume=True,
 
     _install_apps_before_restore(apps)
 
-    if _is_snapshot_available() and create_subvolume:
+    if _is_subvolume_available() and create_subvolume:
         subvolume = _create_subvolume(empty=False)
-        restore_root = subvolume['mount_path']
-    else:
-        _lockdown_apps(apps, lockdown=True)
-        original_state = _shutdown_services(apps)
-        restore_root = '/'
-        subvolume = False
+        packet = Packet('restore', 'apps', subvolume['mount_path'], apps,
+                        backup_file)
+        packet.job = job
+        _run_operation(restore_handler, packet,
+                       encryption_passphrase=encryption_passphrase)
+        _switch_to_subvolume(subvolume)
+        return
 
-    packet = Packet('restore', 'apps', restore_root, apps, backup_file)
-    _run_operation(restore_handler, packet,
-                   encryption_passphrase=encryption_passphrase)
+    units = _get_independent_units(apps)
+    _report_progress(job, apps, 'waiting')
+    with concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(_restore_unit, restore_handler, unit, backup_file,
+                            encryption_passphrase, job) for unit in units
+        ]
 
-    if subvolume:
-        _switch_to_subvolume(subvolume)
-    else:
+    for future in futures:
+        if future.exception():
+            raise future.exception()
+
+
+def _get_independent_units(apps):
+    """Split apps into groups that can be restored independently.
+
+    Apps depending on each other, sharing files or sharing services are put
+    into the same group. Order of apps is kept within and across groups.
+
+    """
+    groups = list(range(len(apps)))
+
+    def find(index):
+        while groups[index] != index:
+            index = groups[index]
+
+        return index
+
+    names = [app.name for app in apps]
+    depends = [set(getattr(app.app, 'depends', None) or []) for app in apps]
+    paths = [_get_paths(app) for app in apps]
+    services = [_get_service_names(app) for app in apps]
+    for first in range(len(apps)):
+        for second in range(first):
+            if names[second] in depends[first] or \
+               names[first] in depends[second] or \
+               services[first] & services[second] or \
+               _paths_overlap(paths[first], paths[second]):
+                groups[find(first)] = find(second)
+
+    units = {}
+    for index, app in enumerate(apps):
+        units.setdefault(find(index), []).append(app)
+
+    return list(units.values())
+
+
+def _get_paths(app):
+    """Return all the directories and files of an app's manifest."""
+    paths = []
+    for section in ['config', 'data', 'secrets']:
+        for key in ['directories', 'files']:
+            paths += app.manifest.get(section, {}).get(key, [])
+
+    return [path.rstrip('/') + '/' for path in paths]
+
+
+def _get_service_names(app):
+    """Return names of services of an app."""
+    return {
+        service['name'] if isinstance(service, dict) else service
+        for service in app.manifest.get('services', [])
+    }
+
+
+def _paths_overlap(first_paths, second_paths):
+    """Return whether any path contains or is contained in another."""
+    return any(
+        first.startswith(second) or second.startswith(first)
+        for first in first_paths for second in second_paths)
+
+
+def _restore_unit(restore_handler, apps, backup_file, encryption_passphrase,
+                  job):
+    """Restore a group of apps and then start their services again."""
+    _report_progress(job, apps, 'restoring')
+    _lockdown_apps(apps, lockdown=True)
+    original_state = _shutdown_services(apps)
+    try:
+        packet = Packet('restore', 'apps', '/', apps, backup_file)
+        packet.job = job
+        _run_operation(restore_handler, packet,
+                       encryption_passphrase=encryption_passphrase)
+    except Exception:
+        _report_progress(job, apps, 'failed')
+        raise
+    finally:
         _restore_services(original_state)
         _lockdown_apps(apps, lockdown=False)
 
+    _report_progress(job, apps, 'done')
+
+
+def _report_progress(job, apps, state):
+    """Log and report the restore state of apps."""
+    for app in apps:
+        logger.info('Restore of app %s: %s', app.name, state)
+        if job:
+            job.set_app_state(app.name, state)
+
 
 def _install_apps_before_restore(apps):
     """Install/upgrade apps needed before restoring a backup.
@@ -303,21 +438,35 @@ def _lockdown_apps(apps, lockdown):
 
 def _is_snapshot_available():
     """Return whether it is possible to take filesystem snapshots."""
-    pass
+    from plinth.modules import storage
+    try:
+        return storage.get_filesystem_type() == 'btrfs'
+    except ValueError:
+        return False
+
 
+def _is_subvolume_available():
+    """Return whether it is possible to restore into a new subvolume."""
+    # XXX: Implement _create_subvolume() and _switch_to_subvolume()
+    return False
 
-def _take_snapshot():
+
+def _take_snapshot(paths=None):
     """Take a snapshot of the entire filesystem.
 
     - Snapshot must be read-only.
     - Mount the snapshot and make it available for backup.
+    - Fail if any of the paths is not part of the snapshot, such as when it is
+      on a nested subvolume or on another mounted filesystem.
 
     Return information dictionary about snapshot including 'mount_path', the
     mount point of the snapshot and any other information necessary to delete
     the snapshot later.
 
     """
-    raise NotImplementedError
+    arguments = ['take-snapshot', '--paths'] + (paths or [])
+    output = actions.superuser_run('backups', arguments)
+    return json.loads(output)
 
 
 def _create_subvolume(empty=True):
@@ -337,7 +486,8 @@ def _create_subvolume(empty=True):
 
 def _delete_snapshot(snapshot):
     """Delete a snapshot given information captured when snapshot was taken."""
-    raise NotImplementedError
+    actions.superuser_run(
+        'backups', ['delete-snapshot', '--path', snapshot['mount_path']])
 
 
 def _switch_to_subvolume(subvolume):
@@ -487,5 +637,6 @@ def _run_hooks(hook, packet):
 def _run_operation(handler, packet, encryption_passphrase=None):
     """Run handler and pre/post hooks for backup/restore operations."""
     _run_hooks(packet.operation + '_pre', packet)
-    handler(packet, encryption_passphrase=encryption_passphrase)
+    result = handler(packet, encryption_passphrase=encryption_passphrase)
     _run_hooks(packet.operation + '_post', packet)
+    return result
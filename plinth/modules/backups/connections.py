@@ -0,0 +1,77 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Shared SSH connections to hosts of remote backup repositories.
+
+Setting up an SSH connection takes several round trips and authentication. One
+connection to each remote host is kept open by an SSH control master that borg
+and other commands reuse. SSH closes it when it has not been used for a while.
+"""
+
+import json
+import threading
+import time
+
+from plinth import actions
+
+from . import get_known_hosts_path, split_path
+
+# Seconds after last use when SSH closes a connection
+IDLE_TIMEOUT = 10 * 60
+
+_last_used = {}
+_lock = threading.Lock()
+
+
+def _get_destination(path):
+    """Return user@host of a remote path."""
+    username, hostname, _ = split_path(path)
+    return f'{username}@{hostname}'
+
+
+def connect(path, credentials, check_borg=False):
+    """Make sure a connection to the host of a remote path is open.
+
+    A connection used recently is known to be still open and is not checked.
+    With check_borg, return whether borg is available on the remote host.
+
+    """
+    destination = _get_destination(path)
+    with _lock:
+        last_used = _last_used.get(destination)
+        if not check_borg and last_used and \
+           time.monotonic() - last_used < IDLE_TIMEOUT / 2:
+            _last_used[destination] = time.monotonic()
+            return None
+
+    arguments = [
+        'connect', '--path', path, '--user-known-hosts-file',
+        str(get_known_hosts_path()), '--idle-timeout',
+        str(IDLE_TIMEOUT)
+    ]
+    if check_borg:
+        arguments.append('--check-borg')
+
+    kwargs = {}
+    if credentials.get('ssh_password'):
+        kwargs['input'] = credentials['ssh_password'].encode()
+
+    if credentials.get('ssh_keyfile'):
+        arguments += ['--ssh-keyfile', credentials['ssh_keyfile']]
+
+    output = actions.superuser_run('sshfs', arguments, **kwargs)
+    with _lock:
+        _last_used[destination] = time.monotonic()
+
+    return json.loads(output) if check_borg else None
+
+
+def forget(path):
+    """Check the connection on next use as it may have been closed."""
+    with _lock:
+        _last_used.pop(_get_destination(path), None)
+
+
+def disconnect(path):
+    """Close the connection to the host of a remote path."""
+    forget(path)
+    actions.superuser_run('sshfs', ['disconnect', '--path', path])
@@ -6,19 +6,21 @@ Decorators for the backup views.
 import functools
 import os
 
-from . import SESSION_PATH_VARIABLE
+from . import SESSION_PATH_VARIABLE, jobs
 
 
 def delete_tmp_backup_file(function):
     """Decorator to delete uploaded backup files.
 
+    The file is kept while a restore from it may be running.
+
     XXX: Implement a better way to delete uploaded files.
 
     """
     @functools.wraps(function)
     def wrapper(request, *args, **kwargs):
         path = request.session.get(SESSION_PATH_VARIABLE, None)
-        if path:
+        if path and not jobs.get_running():
             if os.path.isfile(path):
                 os.remove(path)
             del request.session[SESSION_PATH_VARIABLE]
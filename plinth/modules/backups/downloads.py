@@ -0,0 +1,323 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Serve exported backup archives from spool files with support for resuming.
+
+An archive being downloaded is exported to a spool file in the background.
+The download is streamed from the spool file while it is being written, in
+full even if a range was requested. Once the export is complete, the file is
+served with range requests so that an interrupted download can be resumed. An
+export is identified by the borg ID of the archive and the compression used,
+which is also used as the ETag, so that a resumed download never mixes data of
+different exports.
+
+Spool files are removed when they are not used for a while. Only the spool
+file of the latest export is kept, and an export stops when the disk is about
+to become full.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+
+from django.http import (FileResponse, HttpResponse, HttpResponseNotModified,
+                         StreamingHttpResponse)
+
+from plinth import cfg
+
+from .errors import NotEnoughSpaceError
+
+logger = logging.getLogger(__name__)
+
+# Size of chunks read from export process and sent to client
+CHUNK_SIZE = 1024 * 1024
+
+# Seconds after last use when a spool file is removed
+MAX_AGE = 24 * 60 * 60
+
+# Bytes of disk space to leave free when writing spool files
+MIN_FREE_SPACE = 1024 * 1024 * 1024
+
+_spools = {}
+_spools_lock = threading.Lock()
+
+_RANGE_REGEX = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class Spool:
+    """An exported archive in a file that may still be being written."""
+    def __init__(self, path, etag):
+        """Initialize the spool."""
+        self.path = path
+        self.part_path = path + '.part'
+        self.etag = etag
+        self.size = 0
+        self.is_complete = False
+        self.error = None
+        self._condition = threading.Condition()
+
+    def export(self, process):
+        """Write output of the export process into the spool file."""
+        try:
+            with open(self.part_path, 'wb') as file_handle:
+                while True:
+                    chunk = process.stdout.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+
+                    _check_free_space(os.path.dirname(self.path))
+                    file_handle.write(chunk)
+                    file_handle.flush()
+                    with self._condition:
+                        self.size += len(chunk)
+                        self._condition.notify_all()
+
+            process.stdout.close()
+            if process.wait() != 0:
+                raise RuntimeError('Exporting archive failed: {}'.format(
+                    process.stderr.read().decode()))
+
+            with self._condition:
+                os.replace(self.part_path, self.path)
+                self.is_complete = True
+        except Exception as exception:
+            logger.exception('Error exporting archive: %s', exception)
+            _remove(self.part_path)
+            error = exception
+        else:
+            error = None
+        finally:
+            with _spools_lock:
+                _spools.pop(self.path, None)
+
+        with self._condition:
+            self.error = error
+            self._condition.notify_all()
+
+    def wait(self):
+        """Wait until the spool file is completely written."""
+        with self._condition:
+            while not self.is_complete and not self.error:
+                self._condition.wait()
+
+        if self.error:
+            raise self.error
+
+    def iter_content(self):
+        """Return iterator over the contents while it is being written."""
+        with self._condition:
+            path = self.path if self.is_complete else self.part_path
+            file_handle = open(path, 'rb')
+
+        return self._iter_content(file_handle)
+
+    def _iter_content(self, file_handle):
+        """Yield the contents of the file as it becomes available."""
+        with file_handle:
+            position = 0
+            while True:
+                with self._condition:
+                    while position == self.size and not self.is_complete \
+                          and not self.error:
+                        self._condition.wait()
+
+                    if self.error:
+                        raise self.error
+
+                    available = self.size - position
+
+                if not available:
+                    break
+
+                chunk = file_handle.read(min(available, CHUNK_SIZE))
+                position += len(chunk)
+                yield chunk
+
+
+class _RangeReader:
+    """File-like object reading a limited number of bytes from a file."""
+    def __init__(self, file_handle, length):
+        """Initialize the reader."""
+        self._file_handle = file_handle
+        self._remaining = length
+
+    def read(self, size):
+        """Read at most size bytes, within the range."""
+        data = self._file_handle.read(min(size, self._remaining))
+        self._remaining -= len(data)
+        return data
+
+    def close(self):
+        """Close the underlying file."""
+        self._file_handle.close()
+
+
+def get_spool(export_id, start_export):
+    """Return the spool of an export, starting to export it if needed.
+
+    start_export is called to get the process writing the exported archive to
+    its stdout when it is not already exported or being exported. Spool files
+    of other exports that are complete are removed before starting. Raise
+    NotEnoughSpaceError if the disk is nearly full.
+
+    """
+    directory = os.path.join(cfg.data_dir, 'backups-exports')
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    _remove_old_files(directory)
+
+    file_name = hashlib.sha256(export_id.encode()).hexdigest() + '.export'
+    path = os.path.join(directory, file_name)
+    etag = '"{}"'.format(export_id)
+    with _spools_lock:
+        if path in _spools:
+            return _spools[path]
+
+        spool = Spool(path, etag)
+        if os.path.exists(path):
+            os.utime(path)
+            spool.size = os.path.getsize(path)
+            spool.is_complete = True
+            return spool
+
+        _spools[path] = spool
+
+    try:
+        _remove_complete_files(directory)
+        _check_free_space(directory)
+        # Create the file before any reader tries to open it
+        open(spool.part_path, 'wb').close()
+        process = start_export()
+    except Exception:
+        with _spools_lock:
+            _spools.pop(path, None)
+
+        _remove(spool.part_path)
+        raise
+
+    threading.Thread(target=spool.export, args=(process, )).start()
+    return spool
+
+
+def get_response(request, spool, filename, content_type='application/gzip'):
+    """Return response serving a spooled archive honoring range requests."""
+    if spool.etag in request.META.get('HTTP_IF_NONE_MATCH', ''):
+        response = HttpResponseNotModified()
+        response['ETag'] = spool.etag
+        return response
+
+    if not spool.is_complete:
+        # Size is not yet known to answer range requests, send everything
+        response = StreamingHttpResponse(spool.iter_content(),
+                                         content_type=content_type)
+    else:
+        range_ = _parse_range(request, spool)
+        response = _get_file_response(spool, range_, content_type)
+
+    response['ETag'] = spool.etag
+    response['Accept-Ranges'] = 'bytes'
+    response['Content-Disposition'] = \
+        'attachment; filename="{}"'.format(filename)
+    return response
+
+
+def _get_file_response(spool, range_, content_type):
+    """Return response with all or part of complete spool file."""
+    size = spool.size
+    if range_ is None:
+        start, end = 0, size - 1
+    else:
+        start, end = range_
+        if start is None:  # Last bytes of the file
+            start, end = max(size - end, 0), size - 1
+        elif end is None or end >= size:
+            end = size - 1
+
+        if start >= size or start > end:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = 'bytes */{}'.format(size)
+            return response
+
+    file_handle = open(spool.path, 'rb')
+    file_handle.seek(start)
+    length = end - start + 1
+    if end == size - 1:
+        # Let the server send the file directly if it can
+        content = file_handle
+    else:
+        content = _RangeReader(file_handle, length)
+
+    response = FileResponse(content, content_type=content_type)
+    response.block_size = CHUNK_SIZE
+    response['Content-Length'] = length
+    if range_ is not None:
+        response.status_code = 206
+        response['Content-Range'] = 'bytes {}-{}/{}'.format(start, end, size)
+
+    return response
+
+
+def _parse_range(request, spool):
+    """Return (start, end) of requested range or None for whole file.
+
+    Only a single range is supported. Other requests get the whole file, as
+    allowed by RFC 7233. In a range of last bytes, start is None and end is
+    the number of bytes.
+
+    """
+    header = request.META.get('HTTP_RANGE')
+    if not header:
+        return None
+
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range and if_range != spool.etag:
+        return None
+
+    match = _RANGE_REGEX.match(header.strip())
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+
+    start, end = match.groups()
+    if start == '':
+        return None, int(end)
+
+    return int(start), int(end) if end else None
+
+
+def _remove_old_files(directory):
+    """Remove spool files that have not been used for a while."""
+    with _spools_lock:
+        in_use = {spool.part_path for spool in _spools.values()}
+
+    for file_name in os.listdir(directory):
+        path = os.path.join(directory, file_name)
+        try:
+            if path not in in_use and \
+               os.path.getmtime(path) < time.time() - MAX_AGE:
+                _remove(path)
+        except OSError:
+            pass
+
+
+def _remove_complete_files(directory):
+    """Remove spool files of complete exports to keep only one of them."""
+    for file_name in os.listdir(directory):
+        if file_name.endswith('.export'):
+            _remove(os.path.join(directory, file_name))
+
+
+def _check_free_space(directory):
+    """Raise an error if writing more to the directory may fill the disk."""
+    stat = os.statvfs(directory)
+    if stat.f_bavail * stat.f_frsize < MIN_FREE_SPACE:
+        raise NotEnoughSpaceError(
+            'Not enough free space to export archive in {}'.format(directory))
+
+
+def _remove(path):
+    """Remove a file ignoring errors."""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
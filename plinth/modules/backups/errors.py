@@ -21,3 +21,7 @@ class BorgRepositoryExists(BorgError):
 
 class BorgUnencryptedRepository(BorgError):
     """Attempt to provide password on an unencrypted repository."""
+
+
+class NotEnoughSpaceError(PlinthError):
+    """Not enough free disk space to export an archive for download."""
@@ -78,7 +78,8 @@ class UploadForm(forms.Form):
     file = forms.FileField(
         label=_('Upload File'), required=True, validators=[
             FileExtensionValidator(
-                ['gz'], _('Backup files have to be in .tar.gz format'))
+                ['gz', 'zst'],
+                _('Backup files have to be in .tar.gz or .tar.zst format'))
         ], help_text=_('Select the backup file you want to upload'))
 
 
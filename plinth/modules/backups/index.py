@@ -0,0 +1,125 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Local index of the archives in backup repositories.
+
+Listing archives and reading the apps included in an archive need borg to
+access the repository, which takes seconds for remote repositories. The index
+keeps this information for each repository along with a stamp identifying the
+last transaction committed to the repository. Borg rewrites the repository
+manifest in a new transaction whenever archives are created or deleted, so the
+index is used only as long as the stamp of the repository is unchanged.
+"""
+
+import json
+import os
+import tempfile
+import threading
+
+from plinth import cfg
+
+_lock = threading.Lock()
+
+
+def get_index_folder():
+    """Return the directory where archive indexes are stored."""
+    return os.path.join(cfg.data_dir, 'backups-index')
+
+
+class ArchiveIndex:
+    """Archives of a repository with their apps, size and time."""
+    def __init__(self, uuid):
+        """Initialize the index of repository with given UUID."""
+        self.path = os.path.join(get_index_folder(), uuid + '.json')
+
+    def get_archives(self, stamp):
+        """Return list of archives or None if the index is outdated."""
+        data = self._read()
+        if not stamp or data['stamp'] != stamp:
+            return None
+
+        return list(data['archives'].values())
+
+    def set_archives(self, stamp, archives):
+        """Replace the list of archives keeping what is known about them."""
+        with _lock:
+            data = self._read()
+            old_archives = data['archives']
+            data['archives'] = {}
+            for archive in archives:
+                old_archive = old_archives.get(archive['name'], {})
+                if old_archive.get('id') == archive['id']:
+                    archive = dict(old_archive, **archive)
+
+                data['archives'][archive['name']] = archive
+
+            data['stamp'] = stamp
+            self._write(data)
+
+    def get_apps(self, name, stamp):
+        """Return apps included in an archive or None if not known."""
+        data = self._read()
+        if not stamp or data['stamp'] != stamp:
+            return None
+
+        return data['archives'].get(name, {}).get('apps')
+
+    def set_apps(self, name, stamp, apps):
+        """Remember the apps included in an archive."""
+        with _lock:
+            data = self._read()
+            if data['stamp'] == stamp and name in data['archives']:
+                data['archives'][name]['apps'] = apps
+                self._write(data)
+
+    def add_archive(self, old_stamp, new_stamp, archive):
+        """Add a newly created archive if index was current before."""
+        with _lock:
+            data = self._read()
+            if data['stamp'] and data['stamp'] == old_stamp:
+                data['archives'][archive['name']] = archive
+                data['stamp'] = new_stamp
+                self._write(data)
+
+    def remove_archive(self, old_stamp, new_stamp, name):
+        """Remove a deleted archive if index was current before."""
+        with _lock:
+            data = self._read()
+            if data['stamp'] and data['stamp'] == old_stamp:
+                data['archives'].pop(name, None)
+                data['stamp'] = new_stamp
+                self._write(data)
+
+    def delete(self):
+        """Remove the index."""
+        with _lock:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+    def _read(self):
+        """Return contents of the index file."""
+        try:
+            with open(self.path, 'r') as file_handle:
+                data = json.load(file_handle)
+
+            if isinstance(data.get('archives'), dict):
+                return data
+        except (OSError, ValueError, AttributeError):
+            pass
+
+        return {'stamp': None, 'archives': {}}
+
+    def _write(self, data):
+        """Atomically write contents of the index file."""
+        folder = os.path.dirname(self.path)
+        os.makedirs(folder, mode=0o700, exist_ok=True)
+        file_descriptor, temp_path = tempfile.mkstemp(dir=folder)
+        try:
+            with os.fdopen(file_descriptor, 'w') as file_handle:
+                json.dump(data, file_handle)
+
+            os.replace(temp_path, self.path)
+        except Exception:
+            os.remove(temp_path)
+            raise
@@ -0,0 +1,185 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Backup and restore operations running in the background.
+
+Creating and restoring archives can take very long. They are run in a thread
+so that they don't keep a web server thread busy. The state of a job,
+including the progress reported by borg, is polled by the job page.
+"""
+
+import logging
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Seconds after finishing for which the result of a job is kept
+MAX_AGE = 60 * 60
+
+_jobs = {}
+_lock = threading.Lock()
+
+
+class JobRunningError(Exception):
+    """Another backup or restore operation is running."""
+
+
+class Job:
+    """A backup or restore operation and its progress."""
+    def __init__(self, operation):
+        """Initialize the job.
+
+        operation is either 'backup' or 'restore'.
+
+        """
+        self.id = uuid.uuid4().hex
+        self.operation = operation
+        self.state = 'running'
+        self.error = None
+        self.started = time.time()
+        self.finished = None
+        self.app_states = {}
+        self.bytes = None
+        self.files = None
+        self.percentage = None
+        self.eta = None
+        self.dedup_ratio = None
+        self.path = None
+        self._transfers = {}
+        self._progress_started = None
+        self._lock = threading.Lock()
+        self._finished_event = threading.Event()
+
+    def set_app_state(self, app_name, state):
+        """Set the state of an app being restored."""
+        with self._lock:
+            self.app_states[app_name] = state
+
+    def update_progress(self, message, source=None):
+        """Update progress from a JSON progress message of borg.
+
+        Restoring runs several extractions concurrently. Their progress is
+        added up using source to tell them apart.
+
+        """
+        with self._lock:
+            if message.get('type') == 'archive_progress':
+                self.bytes = message.get('original_size')
+                self.files = message.get('nfiles')
+                self.path = message.get('path')
+                if self.bytes:
+                    self.dedup_ratio = \
+                        message.get('deduplicated_size', 0) / self.bytes
+            elif message.get('type') == 'progress_percent':
+                self._update_transfer(message, source)
+
+    def _update_transfer(self, message, source):
+        """Update percentage and ETA from progress of an extraction."""
+        if message.get('finished'):
+            if source in self._transfers:
+                total = self._transfers[source][1]
+                self._transfers[source] = (total, total)
+        elif message.get('total'):
+            self._transfers[source] = (message['current'], message['total'])
+            if message.get('info'):
+                self.path = message['info'][0]
+        else:
+            return
+
+        current = sum(transfer[0] for transfer in self._transfers.values())
+        total = sum(transfer[1] for transfer in self._transfers.values())
+        self.bytes = current
+        self.percentage = int(100 * current / total)
+        if not self._progress_started:
+            self._progress_started = (time.time(), current)
+
+        started_time, started_bytes = self._progress_started
+        elapsed = time.time() - started_time
+        if current > started_bytes and elapsed:
+            rate = (current - started_bytes) / elapsed
+            self.eta = int((total - current) / rate)
+
+    def to_dict(self):
+        """Return the state of the job as a dictionary."""
+        with self._lock:
+            return {
+                'id': self.id,
+                'operation': self.operation,
+                'state': self.state,
+                'error': self.error,
+                'started': self.started,
+                'finished': self.finished,
+                'app_states': dict(self.app_states),
+                'bytes': self.bytes,
+                'files': self.files,
+                'percentage': self.percentage,
+                'eta': self.eta,
+                'dedup_ratio': self.dedup_ratio,
+                'path': self.path,
+            }
+
+    def _run(self, function, args, kwargs):
+        """Run the operation and record its result."""
+        try:
+            function(*args, job=self, **kwargs)
+        except Exception as exception:
+            logger.exception('Error running %s job: %s', self.operation,
+                             exception)
+            state, error = 'failed', str(exception)
+        else:
+            state, error = 'done', None
+
+        with self._lock:
+            self.state = state
+            self.error = error
+            self.finished = time.time()
+            if state == 'done':
+                self.percentage = 100
+                self.eta = 0
+
+        self._finished_event.set()
+
+    def wait(self, timeout=None):
+        """Wait until the job is finished."""
+        return self._finished_event.wait(timeout)
+
+
+def start(operation, function, *args, **kwargs):
+    """Run function in the background as a job and return the job.
+
+    The function is called with the job as keyword argument 'job' so that it
+    can report progress. Only one job may run at a time.
+
+    """
+    with _lock:
+        _remove_old_jobs()
+        if get_running():
+            raise JobRunningError
+
+        job = Job(operation)
+        _jobs[job.id] = job
+
+    threading.Thread(target=job._run, args=(function, args, kwargs)).start()
+    return job
+
+
+def get(job_id):
+    """Return the job with given ID or None."""
+    return _jobs.get(job_id)
+
+
+def get_running():
+    """Return the job currently running or None."""
+    for job in list(_jobs.values()):
+        if job.state == 'running':
+            return job
+
+    return None
+
+
+def _remove_old_jobs():
+    """Forget jobs that have finished a while ago."""
+    for job_id, job in list(_jobs.items()):
+        if job.finished and job.finished < time.time() - MAX_AGE:
+            del _jobs[job_id]
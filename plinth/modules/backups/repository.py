@@ -5,7 +5,7 @@ Remote and local Borg backup repositories
 
 import abc
 import contextlib
-import io
+import functools
 import json
 import logging
 import os
@@ -19,8 +19,10 @@ from plinth import actions, cfg
 from plinth.errors import ActionError
 from plinth.utils import format_lazy
 
-from . import (_backup_handler, api, errors, get_known_hosts_path,
-               restore_archive_handler, split_path, store)
+from . import (_backup_handler, api, connections, errors,
+               get_known_hosts_path, get_ssh_url, restore_archive_handler,
+               split_path, store)
+from .index import ArchiveIndex
 
 logger = logging.getLogger(__name__)
 
@@ -53,7 +55,7 @@ KNOWN_ERRORS = [
         'raise_as': errors.BorgError,
     },
     {
-        'errors': ['Connection reset by peer'],
+        'errors': ['Connection reset by peer', r'Permission denied \('],
         'message': _('SSH access denied'),
         'raise_as': errors.SshfsError,
     },
@@ -89,6 +91,7 @@ class BaseBorgRepository(abc.ABC):
         self.credentials = credentials or {}
         self.uuid = uuid or str(uuid1())
         self.kwargs = kwargs
+        self.index = ArchiveIndex(self.uuid)
 
     @classmethod
     def load(cls, uuid):
@@ -159,24 +162,54 @@ class BaseBorgRepository(abc.ABC):
 
     def remove(self):
         """Remove a borg repository"""
+    def get_stamp(self):
+        """Return identifier of the last change to the repository."""
+        return self.run(['get-stamp', '--path', self.borg_path]).strip()
+
     def list_archives(self):
         """Return list of archives in this repository."""
-        output = self.run(['list-repo', '--path', self.borg_path])
-        archives = json.loads(output)['archives']
+        stamp = self.get_stamp()
+        archives = self.index.get_archives(stamp)
+        if archives is None:
+            output = self.run(['list-repo', '--path', self.borg_path])
+            archives = json.loads(output)['archives']
+            if stamp:
+                self.index.set_archives(stamp, archives)
+
         return sorted(archives, key=lambda archive: archive['start'],
                       reverse=True)
 
-    def create_archive(self, archive_name, app_names):
+    def create_archive(self, archive_name, app_names, job=None):
         """Create a new archive in this repository with given name."""
         archive_path = self._get_archive_path(archive_name)
         passphrase = self.credentials.get('encryption_passphrase', None)
-        api.backup_apps(_backup_handler, path=archive_path,
-                        app_names=app_names, encryption_passphrase=passphrase)
+        old_stamp = self.get_stamp()
+        handler = functools.partial(_backup_handler,
+                                    ssh_options=self._get_ssh_options())
+        output = api.backup_apps(handler, path=archive_path,
+                                 app_names=app_names,
+                                 encryption_passphrase=passphrase, job=job)
+        try:
+            archive = json.loads(output)['archive']
+        except (TypeError, ValueError, KeyError):
+            return
+
+        self.index.add_archive(
+            old_stamp, self.get_stamp(), {
+                'name': archive['name'],
+                'id': archive['id'],
+                'start': archive['start'],
+                'time': archive['start'],
+                'size': archive['stats']['original_size'],
+                'apps': app_names or None,
+            })
 
     def delete_archive(self, archive_name):
         """Delete an archive with given name from this repository."""
         archive_path = self._get_archive_path(archive_name)
+        old_stamp = self.get_stamp()
         self.run(['delete-archive', '--path', archive_path])
+        self.index.remove_archive(old_stamp, self.get_stamp(), archive_name)
 
     def initialize(self):
         """Initialize / create a borg repository."""
@@ -201,6 +234,14 @@ class BaseBorgRepository(abc.ABC):
 
         return {}
 
+    def _get_ssh_options(self):
+        """Return options for reaching the repository over SSH."""
+        return {}
+
+    def _get_input_data(self):
+        """Return data to send to backups action on stdin."""
+        return dict(self._get_encryption_data(), **self._get_ssh_options())
+
     def _run(self, cmd, arguments, superuser=True, **kwargs):
         """Run a backups or sshfs action script command."""
         try:
@@ -217,39 +258,25 @@ class BaseBorgRepository(abc.ABC):
             if key not in self.known_credentials:
                 raise ValueError('Unknown credentials entry: %s' % key)
 
-        input_data = json.dumps(self._get_encryption_data())
+        input_data = json.dumps(self._get_input_data())
         return self._run('backups', arguments, superuser=superuser,
                          input=input_data.encode())
 
-    def get_download_stream(self, archive_name):
-        """Return an stream of .tar.gz binary data for a backup archive."""
-        class BufferedReader(io.BufferedReader):
-            """Improve performance of buffered binary streaming.
-
-            Django simply returns the iterator as a response for the WSGI app.
-            CherryPy then iterates over this iterator and writes to HTTP
-            response. This calls __next__ over the BufferedReader that is
-            process.stdout. However, this seems to call readline() which looks
-            for \n in binary data which leads to short unpredictably sized
-            chunks which in turn lead to severe performance degradation. So,
-            overwrite this and call read() which is better geared for handling
-            binary data.
-
-            """
-            def __next__(self):
-                """Override to call read() instead of readline()."""
-                chunk = self.read(io.DEFAULT_BUFFER_SIZE)
-                if not chunk:
-                    raise StopIteration
-
-                return chunk
-
-        args = ['export-tar', '--path', self._get_archive_path(archive_name)]
-        input_data = json.dumps(self._get_encryption_data())
+    def export_tar(self, archive_name):
+        """Start exporting an archive, return process writing to stdout."""
+        args = [
+            'export-tar', '--path',
+            self._get_archive_path(archive_name), '--compression',
+            cfg.export_compression
+        ]
+        if cfg.export_compression_level is not None:
+            args += ['--compression-level', str(cfg.export_compression_level)]
+
+        input_data = json.dumps(self._get_input_data())
         proc = self._run('backups', args, run_in_background=True)
         proc.stdin.write(input_data.encode())
         proc.stdin.close()
-        return BufferedReader(proc.stdout)
+        return proc
 
     def _get_archive_path(self, archive_name):
         """Return full borg path for an archive."""
@@ -276,17 +303,25 @@ class BaseBorgRepository(abc.ABC):
 
     def get_archive_apps(self, archive_name):
         """Get list of apps included in an archive."""
-        archive_path = self._get_archive_path(archive_name)
-        output = self.run(['get-archive-apps', '--path', archive_path])
-        return output.splitlines()
+        stamp = self.get_stamp()
+        apps = self.index.get_apps(archive_name, stamp)
+        if apps is None:
+            archive_path = self._get_archive_path(archive_name)
+            output = self.run(['get-archive-apps', '--path', archive_path])
+            apps = output.splitlines()
+            self.index.set_apps(archive_name, stamp, apps)
 
-    def restore_archive(self, archive_name, apps=None):
+        return apps
+
+    def restore_archive(self, archive_name, apps=None, job=None):
         """Restore an archive from this repository to the system."""
         archive_path = self._get_archive_path(archive_name)
         passphrase = self.credentials.get('encryption_passphrase', None)
-        api.restore_apps(restore_archive_handler, app_names=apps,
+        handler = functools.partial(restore_archive_handler,
+                                    ssh_options=self._get_ssh_options())
+        api.restore_apps(handler, app_names=apps,
                          create_subvolume=False, backup_file=archive_path,
-                         encryption_passphrase=passphrase)
+                         encryption_passphrase=passphrase, job=job)
 
     def _get_storage_format(self, store_credentials, verified):
         storage = {
@@ -345,29 +380,47 @@ class BorgRepository(BaseBorgRepository):
     def remove(self):
         """Remove a repository from the kvstore."""
         store.delete(self.uuid)
+        self.index.delete()
 
 
 class SshBorgRepository(BaseBorgRepository):
-    """Borg repository that is accessed via SSH"""
+    """Borg repository that is accessed via SSH.
+
+    When borg is available on the remote host, borg accesses the repository
+    over a shared SSH connection. Otherwise, the remote path is mounted
+    locally using sshfs.
+
+    """
     SSHFS_MOUNTPOINT = '/media/'
     known_credentials = [
         'ssh_keyfile', 'ssh_password', 'encryption_passphrase'
     ]
     storage_type = 'ssh'
     sort_order = 30
-    flags = {'removable': True, 'mountable': True}
 
     def is_usable(self):
         """Return whether repository is usable."""
         return self.kwargs.get('verified')
 
+    @property
+    def flags(self):
+        """Return flags of the repository for the view."""
+        if self._uses_ssh:
+            return {'removable': True}
+
+        return {'removable': True, 'mountable': True}
+
     @property
     def borg_path(self):
         """Return the path to use for backups actions.
 
-        This is the mount point for the remote SSH repositories.
+        This is an ssh:// URL when borg is available on the remote host and
+        the mount point otherwise.
 
         """
+        if self._uses_ssh:
+            return get_ssh_url(self._path)
+
         return self._mountpoint
 
     @property
@@ -381,9 +434,63 @@ class SshBorgRepository(BaseBorgRepository):
         """Return the local mount point where repository is to be mounted."""
         return os.path.join(self.SSHFS_MOUNTPOINT, self.uuid)
 
+    @property
+    def _uses_ssh(self):
+        """Return whether borg accesses the repository over SSH.
+
+        This is found out when the repository is added. Repositories added
+        earlier keep being mounted with sshfs.
+
+        """
+        return self.kwargs.get('remote_borg', False)
+
+    def _get_ssh_options(self):
+        """Return known hosts file and key file for borg to use with SSH."""
+        options = {'user_known_hosts_file': str(get_known_hosts_path())}
+        if self.credentials.get('ssh_keyfile'):
+            options['ssh_keyfile'] = self.credentials['ssh_keyfile']
+
+        return options
+
+    def _detect_remote_borg(self):
+        """Find out whether borg is on the remote host."""
+        _, hostname, _ = split_path(self._path)
+        # Borg does not accept network interface in the hostname
+        self.kwargs['remote_borg'] = '%' not in hostname and \
+            self._connect(check_borg=True)
+
+    def _connect(self, check_borg=False):
+        """Open the shared SSH connection to the remote host if needed."""
+        try:
+            return connections.connect(self._path, self.credentials,
+                                       check_borg)
+        except ActionError as err:
+            self.reraise_known_error(err)
+
+    @contextlib.contextmanager
+    def _connection(self):
+        """Keep the shared SSH connection open while running borg."""
+        if not self._uses_ssh:
+            yield
+            return
+
+        self._connect()
+        try:
+            yield
+        except Exception:
+            connections.forget(self._path)
+            raise
+
     @property
     def is_mounted(self):
-        """Return whether remote path is mounted locally."""
+        """Return whether remote path is mounted locally.
+
+        Repositories accessed over SSH need no mounting.
+
+        """
+        if self._uses_ssh:
+            return True
+
         output = self._run('sshfs',
                            ['is-mounted', '--mountpoint', self._mountpoint])
         return json.loads(output)
@@ -391,11 +498,36 @@ class SshBorgRepository(BaseBorgRepository):
     def initialize(self):
         """Initialize the repository after mounting the target directory."""
         self._ensure_remote_directory()
+        self._detect_remote_borg()
         self.mount()
         super().initialize()
 
+    def run(self, arguments, superuser=True):
+        """Run a backups action script command over the SSH connection."""
+        with self._connection():
+            return super().run(arguments, superuser=superuser)
+
+    def export_tar(self, archive_name):
+        """Start exporting an archive, return process writing to stdout."""
+        with self._connection():
+            return super().export_tar(archive_name)
+
+    def create_archive(self, archive_name, app_names, job=None):
+        """Create a new archive in this repository with given name."""
+        with self._connection():
+            return super().create_archive(archive_name, app_names, job=job)
+
+    def restore_archive(self, archive_name, apps=None, job=None):
+        """Restore an archive from this repository to the system."""
+        with self._connection():
+            return super().restore_archive(archive_name, apps, job=job)
+
     def mount(self):
         """Mount the remote path locally using sshfs."""
+        if self._uses_ssh:
+            self._connect()
+            return
+
         if self.is_mounted:
             return
         known_hosts_path = get_known_hosts_path()
@@ -410,6 +542,10 @@ class SshBorgRepository(BaseBorgRepository):
 
     def umount(self):
         """Unmount the remote path that was mounted locally using sshfs."""
+        if self._uses_ssh:
+            connections.disconnect(self._path)
+            return
+
         if not self.is_mounted:
             return
 
@@ -419,6 +555,7 @@ class SshBorgRepository(BaseBorgRepository):
         """Remove a repository from the kvstore and delete its mountpoint"""
         self.umount()
         store.delete(self.uuid)
+        self.index.delete()
         try:
             if os.path.exists(self._mountpoint):
                 try:
@@ -430,6 +567,14 @@ class SshBorgRepository(BaseBorgRepository):
         except Exception as err:
             logger.error(err)
 
+    def _get_storage_format(self, store_credentials, verified):
+        """Also store whether borg is available on the remote host."""
+        storage = super()._get_storage_format(store_credentials, verified)
+        if 'remote_borg' in self.kwargs:
+            storage['remote_borg'] = self.kwargs['remote_borg']
+
+        return storage
+
     @staticmethod
     def _append_sshfs_arguments(arguments, credentials):
         """Add credentials to a run command and kwargs"""
@@ -0,0 +1,186 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Test module for backups actions.
+"""
+
+import argparse
+import imp
+import io
+import json
+import os
+import pathlib
+import shutil
+import subprocess
+import tarfile
+from unittest.mock import patch
+
+import pytest
+
+
+def _action_file():
+    """Return the path to the 'backups' actions file."""
+    current_directory = pathlib.Path(__file__).parent
+    return str(current_directory / '..' / '..' / '..' / '..' / 'actions' /
+               'backups')
+
+
+backups_actions = imp.load_source('backups', _action_file())
+
+
+def test_get_device(tmp_path):
+    """Test getting device of paths that may not exist."""
+    device = os.stat(str(tmp_path)).st_dev
+    assert backups_actions._get_device(str(tmp_path / 'a' / 'b/')) == device
+    assert backups_actions._get_device('/proc/non-existent') != \
+        os.stat('/').st_dev
+
+
+@patch('subprocess.run')
+def test_take_snapshot(run, tmp_path, capsys):
+    """Test that snapshot is not taken for paths it would not contain."""
+    snapshots_folder = str(tmp_path / 'snapshots')
+    arguments = argparse.Namespace(paths=['/etc/non-existent/', '/proc/'])
+    with patch.object(backups_actions, 'SNAPSHOTS_FOLDER', snapshots_folder):
+        with pytest.raises(ValueError):
+            backups_actions.subcommand_take_snapshot(arguments)
+
+        run.assert_not_called()
+
+        arguments.paths = ['/etc/non-existent/', '/']
+        backups_actions.subcommand_take_snapshot(arguments)
+
+    path = json.loads(capsys.readouterr().out)['mount_path']
+    assert os.path.dirname(path) == snapshots_folder
+    run.assert_called_once()
+    assert run.call_args[0][0] == [
+        'btrfs', 'subvolume', 'snapshot', '-r', '/', path
+    ]
+
+
+def test_get_env():
+    """Test that borg reaches remote repositories with the SSH options."""
+    arguments = argparse.Namespace(
+        path='ssh://user@host/~/backups',
+        stdin=json.dumps({
+            'encryption_passphrase': 'secret',
+            'user_known_hosts_file': '/known_hosts',
+            'ssh_keyfile': '/key'
+        }))
+    env = backups_actions.get_env(arguments)
+    assert env['BORG_PASSPHRASE'] == 'secret'
+    assert 'UserKnownHostsFile=/known_hosts' in env['BORG_RSH']
+    assert 'IdentityFile=/key' in env['BORG_RSH']
+
+    arguments = argparse.Namespace(path='/var/lib/freedombox/borgbackup',
+                                   stdin='')
+    env = backups_actions.get_env(arguments)
+    assert env['BORG_PASSPHRASE'] == ''
+    assert 'BORG_RSH' not in env
+
+
+@pytest.mark.parametrize('compression, level, which, command', [
+    ('gzip', None, None, ['gzip']),
+    ('gzip', 9, None, ['gzip', '-9']),
+    ('pigz', 1, '/usr/bin/pigz', ['pigz', '-1']),
+    ('pigz', None, None, ['gzip']),
+    ('zstd', 19, '/usr/bin/zstd', ['zstd', '-q', '-c', '-T0', '-19']),
+])
+def test_get_tar_filter(compression, level, which, command):
+    """Test the command compressing exported archives."""
+    with patch('shutil.which', return_value=which):
+        assert backups_actions._get_tar_filter(compression, level) == command
+
+
+@pytest.mark.parametrize('compression, level', [('gzip', 0), ('gzip', 10),
+                                                ('zstd', 20)])
+def test_get_tar_filter_invalid_level(compression, level):
+    """Test that invalid compression levels are rejected."""
+    with pytest.raises(ValueError):
+        backups_actions._get_tar_filter(compression, level)
+
+
+def _add_file(tar_handle, name, data):
+    """Add a file with given data to a tar archive."""
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    tar_handle.addfile(info, io.BytesIO(data))
+
+
+@pytest.fixture(name='exported_archive', params=['gzip', 'zstd'])
+def fixture_exported_archive(request, tmp_path):
+    """Return path of an exported archive compressed with gzip or zstd."""
+    if not shutil.which(request.param):
+        pytest.skip('{} is not available'.format(request.param))
+
+    tar_path = tmp_path / 'archive.tar'
+    with tarfile.open(str(tar_path), 'w') as tar_handle:
+        _add_file(tar_handle, 'etc/app/config', b'config')
+        _add_file(tar_handle, 'var/lib/app/data/file', b'data')
+        _add_file(tar_handle, 'var/lib/other/file', b'other')
+        manifest = json.dumps({'apps': [{'name': 'app'}]}).encode()
+        _add_file(tar_handle,
+                  'var/lib/plinth/backups-manifests/archive.json', manifest)
+        _add_file(tar_handle, 'var/lib/app/data/large', os.urandom(100000))
+
+    subprocess.run([request.param, '-q', str(tar_path)], check=True)
+    paths = list(tmp_path.glob('archive.tar.*'))
+    assert len(paths) == 1
+    return str(paths[0])
+
+
+def test_get_exported_archive_apps(exported_archive, capsys):
+    """Test listing apps of exported archives."""
+    arguments = argparse.Namespace(path=exported_archive)
+    backups_actions.subcommand_get_exported_archive_apps(arguments)
+    assert capsys.readouterr().out == 'app\n'
+
+
+def test_restore_exported_archive(exported_archive):
+    """Test restoring files of apps from exported archives."""
+    arguments = argparse.Namespace(
+        path=exported_archive, stdin=json.dumps({
+            'files': ['/etc/app/config'],
+            'directories': ['/var/lib/app/']
+        }))
+    with patch('tarfile.TarFile.extract') as extract:
+        backups_actions.subcommand_restore_exported_archive(arguments)
+
+    assert [call[0][0].name for call in extract.call_args_list] == [
+        'etc/app/config', 'var/lib/app/data/file', 'var/lib/app/data/large'
+    ]
+    assert all(call[0][1] == '/' for call in extract.call_args_list)
+
+
+def _truncate(path, size):
+    """Keep only first bytes of a file, or remove the last ones if negative."""
+    with open(path, 'rb') as file_handle:
+        data = file_handle.read()
+
+    with open(path, 'wb') as file_handle:
+        file_handle.write(data[:size])
+
+
+def _read_archive(path):
+    """Read all files of an exported archive."""
+    with backups_actions._open_exported_archive(path) as tar_handle:
+        for member in tar_handle:
+            tar_handle.extractfile(member).read()
+
+
+def test_open_truncated_archive(exported_archive):
+    """Test that reading a truncated archive fails."""
+    _truncate(exported_archive, os.path.getsize(exported_archive) // 2)
+    with pytest.raises((subprocess.CalledProcessError, EOFError,
+                        tarfile.ReadError)):
+        _read_archive(exported_archive)
+
+
+def test_open_truncated_zstd_archive(exported_archive):
+    """Test that failure of zstd is detected after reading all files."""
+    if not exported_archive.endswith('.zst'):
+        pytest.skip('Only for zstd')
+
+    _read_archive(exported_archive)
+    _truncate(exported_archive, -1)
+    with pytest.raises(subprocess.CalledProcessError):
+        _read_archive(exported_archive)
@@ -3,6 +3,7 @@
 Tests for backups module API.
 """
 
+import threading
 from unittest.mock import MagicMock, call, patch
 
 import pytest
@@ -86,16 +87,116 @@ class TestBackupProcesses:
                         path=repository.RootBorgRepository.PATH)
         backup_handler.assert_called_once()
 
+    @staticmethod
+    @patch('plinth.modules.backups.api._delete_snapshot')
+    @patch('plinth.modules.backups.api._take_snapshot')
+    @patch('plinth.modules.backups.api._is_snapshot_available')
+    @patch('plinth.modules.backups.api._restore_services')
+    @patch('plinth.modules.backups.api._shutdown_services')
+    def test_backup_apps_snapshot(shutdown_services, restore_services,
+                                  is_snapshot_available, take_snapshot,
+                                  delete_snapshot):
+        """Test that services are stopped only while taking snapshot."""
+        is_snapshot_available.return_value = True
+        take_snapshot.return_value = {'mount_path': '/snapshot'}
+
+        def backup_handler(packet, encryption_passphrase=None):
+            restore_services.assert_called_once_with(
+                shutdown_services.return_value)
+            delete_snapshot.assert_not_called()
+            assert packet.root == '/snapshot'
+
+        apps = [_get_backup_app('a')]
+        with patch('plinth.modules.backups.api.get_all_apps_for_backup',
+                   return_value=apps):
+            api.backup_apps(backup_handler,
+                            path=repository.RootBorgRepository.PATH)
+
+        take_snapshot.assert_called_once_with([
+            '/etc/a/config.d/', '/var/lib/a/data.d/', '/etc/a/secrets.d/',
+            '/etc/a/config', '/var/lib/a/data', '/etc/a/secrets'
+        ])
+        delete_snapshot.assert_called_once_with({'mount_path': '/snapshot'})
+        restore_services.assert_called_once()
+
+        # Fall back to keeping services stopped during backup
+        restore_services.reset_mock()
+        take_snapshot.side_effect = RuntimeError
+
+        def backup_handler(packet, encryption_passphrase=None):
+            restore_services.assert_not_called()
+            assert packet.root == '/'
+
+        api.backup_apps(backup_handler,
+                        path=repository.RootBorgRepository.PATH)
+        restore_services.assert_called_once_with(
+            shutdown_services.return_value)
+
+    @staticmethod
+    @patch('plinth.actions.superuser_run')
+    def test_take_snapshot(run):
+        """Test that paths to back up are checked when taking snapshot."""
+        run.return_value = '{"mount_path": "/snapshot"}'
+        assert api._take_snapshot(['/etc/a/', '/var/lib/a']) == {
+            'mount_path': '/snapshot'
+        }
+        run.assert_called_once_with(
+            'backups', ['take-snapshot', '--paths', '/etc/a/', '/var/lib/a'])
+
     @staticmethod
     @patch('plinth.modules.backups.api._install_apps_before_restore')
     @patch('plinth.module_loader.loaded_modules.items')
-    def test_restore_apps(mock_install, modules):
+    def test_restore_apps(modules, mock_install):
         """Test that restore_handler is called."""
         modules.return_value = [('a', MagicMock())]
         restore_handler = MagicMock()
         api.restore_apps(restore_handler)
         restore_handler.assert_called_once()
 
+    @staticmethod
+    def test__get_independent_units():
+        """Test that apps depending on each other are restored together."""
+        apps = [_get_backup_app(name) for name in 'abcde']
+        for app in apps:
+            app.manifest = {'data': {'files': ['/var/lib/' + app.name]}}
+            app.app.depends = []
+
+        apps[2].app.depends = ['a']
+        apps[2].manifest['services'] = [{'type': 'apache', 'name': 'c'}]
+        apps[3].manifest = {'data': {'directories': ['/var/lib/b/']}}
+        apps[4].manifest['services'] = ['c']
+        units = api._get_independent_units(apps)
+        assert units == [[apps[0], apps[2], apps[4]], [apps[1], apps[3]]]
+
+    @staticmethod
+    @patch('plinth.modules.backups.api._install_apps_before_restore')
+    @patch('plinth.modules.backups.api._restore_services')
+    @patch('plinth.modules.backups.api._shutdown_services')
+    @patch('plinth.module_loader.loaded_modules.items')
+    def test_restore_apps_concurrently(modules, shutdown_services,
+                                       restore_services, _):
+        """Test that independent apps are restored concurrently."""
+        modules.return_value = [(name, MagicMock(backup={}, depends=[]))
+                                for name in ('a', 'b')]
+        barrier = threading.Barrier(2, timeout=5)
+        shutdown_services.side_effect = lambda apps: apps
+
+        def restore_handler(packet, encryption_passphrase=None):
+            barrier.wait()
+            if packet.apps[0].name == 'b':
+                raise RuntimeError('b failed')
+
+        job = MagicMock()
+        with pytest.raises(RuntimeError):
+            api.restore_apps(restore_handler, create_subvolume=False,
+                             job=job)
+
+        assert len(restore_services.call_args_list) == 2
+        calls = job.set_app_state.call_args_list
+        assert calls[:2] == [call('a', 'waiting'), call('b', 'waiting')]
+        assert call('a', 'done') in calls
+        assert call('b', 'failed') in calls
+
     @staticmethod
     @patch('plinth.module_loader.loaded_modules.items')
     def test_get_all_apps_for_backup(modules):
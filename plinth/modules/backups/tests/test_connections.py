@@ -0,0 +1,133 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Tests for shared SSH connections to remote repositories.
+"""
+
+import json
+from unittest.mock import call, patch
+
+import pytest
+
+from plinth.modules.backups import (connections, get_ssh_command,
+                                    get_ssh_destination, get_ssh_url)
+from plinth.modules.backups.repository import SshBorgRepository
+
+
+@pytest.fixture(autouse=True)
+def fixture_connections():
+    """Start each test without any known connections."""
+    connections._last_used.clear()
+    yield
+    connections._last_used.clear()
+
+
+@pytest.mark.parametrize('path, url', [
+    ('user@host:', 'ssh://user@host/~/'),
+    ('user@host:~/backups', 'ssh://user@host/~/backups'),
+    ('user@host:backups', 'ssh://user@host/~/backups'),
+    ('user@host:/srv/backups', 'ssh://user@host/srv/backups'),
+    ('user@fe80::1:/backups', 'ssh://user@[fe80::1]/backups'),
+])
+def test_get_ssh_url(path, url):
+    """Test converting remote paths to URLs for borg."""
+    assert get_ssh_url(path) == url
+
+
+def test_get_ssh_destination():
+    """Test getting the remote host from URLs and archive paths."""
+    assert get_ssh_destination('ssh://user@host/~/backups::archive') == \
+        'user@host'
+    assert get_ssh_destination('ssh://user@[fe80::1]/backups') == \
+        'user@fe80::1'
+    assert get_ssh_destination('/var/lib/freedombox/borgbackup') is None
+    assert get_ssh_destination('/media/uuid::archive') is None
+
+
+def test_get_ssh_command():
+    """Test that connections to same host share the control socket."""
+    command = get_ssh_command('user@host')
+    assert 'BatchMode=yes' in command
+    assert command == get_ssh_command('user@host')
+    assert command != get_ssh_command('other@host')
+
+    command = get_ssh_command('user@host', '/known_hosts', '/key')
+    assert 'UserKnownHostsFile=/known_hosts' in command
+    assert 'StrictHostKeyChecking=yes' in command
+    assert 'IdentityFile=/key' in command
+
+
+@patch('plinth.modules.backups.connections.get_known_hosts_path')
+@patch('plinth.actions.superuser_run')
+def test_connect(run, known_hosts_path):
+    """Test that connection is checked only after a while."""
+    known_hosts_path.return_value = '/known_hosts'
+    run.return_value = 'true\n'
+    credentials = {'ssh_password': 'password'}
+
+    assert connections.connect('user@host:backups', credentials,
+                               check_borg=True)
+    run.assert_called_once_with('sshfs', [
+        'connect', '--path', 'user@host:backups', '--user-known-hosts-file',
+        '/known_hosts', '--idle-timeout',
+        str(connections.IDLE_TIMEOUT), '--check-borg'
+    ], input=b'password')
+
+    run.reset_mock()
+    assert connections.connect('user@host:other', credentials) is None
+    run.assert_not_called()
+
+    with patch('time.monotonic',
+               return_value=connections._last_used['user@host'] +
+               connections.IDLE_TIMEOUT):
+        connections.connect('user@host:backups', credentials)
+    assert run.call_count == 1
+
+    connections.forget('user@host:backups')
+    connections.connect('user@host:backups', {'ssh_keyfile': '/key'})
+    assert run.call_args == call('sshfs', [
+        'connect', '--path', 'user@host:backups', '--user-known-hosts-file',
+        '/known_hosts', '--idle-timeout',
+        str(connections.IDLE_TIMEOUT), '--ssh-keyfile', '/key'
+    ])
+
+    run.reset_mock()
+    connections.disconnect('user@host:backups')
+    run.assert_called_once_with('sshfs',
+                                ['disconnect', '--path', 'user@host:backups'])
+    assert 'user@host' not in connections._last_used
+
+
+@pytest.mark.usefixtures('load_cfg')
+@patch('plinth.actions.superuser_run')
+def test_repository_uses_ssh(run):
+    """Test that checking repositories needs no connection to the host."""
+    run.return_value = 'false'
+    repository = SshBorgRepository('user@host:backups', verified=True)
+    assert not repository.is_mounted
+    run.assert_called_once_with('sshfs', [
+        'is-mounted', '--mountpoint',
+        '/media/{}'.format(repository.uuid)
+    ])
+
+    run.reset_mock()
+    repository = SshBorgRepository('user@host:backups', verified=True,
+                                   remote_borg=True)
+    assert repository.is_mounted
+    assert repository.borg_path == 'ssh://user@host/~/backups'
+    run.assert_not_called()
+
+
+@pytest.mark.usefixtures('load_cfg')
+@patch('plinth.modules.backups.connections.connect')
+@patch('plinth.modules.backups.repository.get_known_hosts_path')
+@patch('plinth.actions.superuser_run')
+def test_repository_ssh_options(run, known_hosts_path, connect):
+    """Test that borg is given the known hosts file and the key file."""
+    known_hosts_path.return_value = '/known_hosts'
+    repository = SshBorgRepository('user@host:backups',
+                                   {'ssh_keyfile': '/key'}, remote_borg=True)
+    repository.run(['info', '--path', repository.borg_path])
+    assert json.loads(run.call_args[1]['input'].decode()) == {
+        'user_known_hosts_file': '/known_hosts',
+        'ssh_keyfile': '/key'
+    }
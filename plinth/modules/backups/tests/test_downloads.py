@@ -0,0 +1,168 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Tests for spooled downloads of exported archives.
+"""
+
+import io
+import os
+import threading
+from unittest.mock import Mock, patch
+
+import pytest
+from django.test.client import RequestFactory
+
+from plinth.modules.backups import downloads
+
+DATA = bytes(range(256)) * 64
+
+
+@pytest.fixture(autouse=True)
+def fixture_data_dir(tmp_path):
+    """Use a temporary directory for spool files."""
+    with patch('plinth.cfg.data_dir', str(tmp_path)), \
+            patch('plinth.modules.backups.downloads.CHUNK_SIZE', 1000):
+        yield
+
+
+class _Process:
+    """Fake export process whose output can be held back."""
+    def __init__(self, data, returncode=0):
+        self.stdout = io.BytesIO(data)
+        self.stderr = io.BytesIO(b'error')
+        self.returncode = returncode
+        self.can_finish = threading.Event()
+
+    def wait(self):
+        self.can_finish.wait()
+        return self.returncode
+
+
+def _get(spool, **headers):
+    """Return response and content of a request for the spool."""
+    request = RequestFactory().get('/', **headers)
+    response = downloads.get_response(request, spool, 'archive.tar.gz')
+    content = b''
+    if response.status_code in (200, 206):
+        content = b''.join(response.streaming_content)
+        response.file_to_stream.close()
+
+    return response, content
+
+
+def test_download_and_resume():
+    """Test streaming while exporting and then serving ranges."""
+    process = _Process(DATA)
+    start_export = Mock(return_value=process)
+    spool = downloads.get_spool('archive-id', start_export)
+    assert downloads.get_spool('archive-id', start_export) is spool
+
+    request = RequestFactory().get('/')
+    response = downloads.get_response(request, spool, 'archive.tar.gz')
+    assert 'Content-Length' not in response
+    content = iter(response.streaming_content)
+    assert next(content) == DATA[:1000]
+    process.can_finish.set()
+    assert DATA[:1000] + b''.join(content) == DATA
+    spool.wait()
+    start_export.assert_called_once_with()
+    assert response['ETag'] == '"archive-id"'
+    assert response['Accept-Ranges'] == 'bytes'
+
+    # Spool file is reused
+    spool = downloads.get_spool('archive-id', start_export)
+    assert spool.is_complete
+    start_export.assert_called_once_with()
+
+    response, content = _get(spool)
+    assert response.status_code == 200
+    assert int(response['Content-Length']) == len(DATA)
+    assert content == DATA
+
+    response, content = _get(spool, HTTP_RANGE='bytes=100-')
+    assert response.status_code == 206
+    assert response['Content-Range'] == \
+        'bytes 100-{}/{}'.format(len(DATA) - 1, len(DATA))
+    assert content == DATA[100:]
+
+    response, content = _get(spool, HTTP_RANGE='bytes=100-2099')
+    assert response['Content-Range'] == 'bytes 100-2099/{}'.format(len(DATA))
+    assert int(response['Content-Length']) == 2000
+    assert content == DATA[100:2100]
+
+    response, content = _get(spool, HTTP_RANGE='bytes=-10')
+    assert content == DATA[-10:]
+
+    response, content = _get(spool, HTTP_RANGE='bytes=100-',
+                             HTTP_IF_RANGE='"other-id"')
+    assert response.status_code == 200
+    assert content == DATA
+
+    response, _ = _get(spool, HTTP_RANGE='bytes={}-'.format(len(DATA)))
+    assert response.status_code == 416
+    assert response['Content-Range'] == 'bytes */{}'.format(len(DATA))
+
+    response, _ = _get(spool, HTTP_IF_NONE_MATCH='"archive-id"')
+    assert response.status_code == 304
+
+
+def test_export_failure():
+    """Test that a failed export is reported and not kept."""
+    process = _Process(DATA, returncode=2)
+    process.can_finish.set()
+    spool = downloads.get_spool('archive-id', Mock(return_value=process))
+    with pytest.raises(RuntimeError):
+        spool.wait()
+
+    assert not os.path.exists(spool.path)
+    assert not os.path.exists(spool.part_path)
+    assert not downloads._spools
+
+
+def test_range_while_exporting():
+    """Test that a range request during export gets the whole stream."""
+    process = _Process(DATA)
+    spool = downloads.get_spool('archive-id', Mock(return_value=process))
+    request = RequestFactory().get('/', HTTP_RANGE='bytes=100-')
+    response = downloads.get_response(request, spool, 'archive.tar.gz')
+    assert response.status_code == 200
+    assert 'Content-Range' not in response
+    process.can_finish.set()
+    assert b''.join(response.streaming_content) == DATA
+
+
+def test_single_spool():
+    """Test that spool files of other exports are removed."""
+    process = _Process(DATA)
+    process.can_finish.set()
+    spool = downloads.get_spool('archive-id', Mock(return_value=process))
+    spool.wait()
+
+    process = _Process(DATA)
+    process.can_finish.set()
+    other_spool = downloads.get_spool('other-id', Mock(return_value=process))
+    other_spool.wait()
+    assert not os.path.exists(spool.path)
+    assert os.path.exists(other_spool.path)
+
+
+@patch('os.statvfs')
+def test_not_enough_space(statvfs):
+    """Test that exports stop when the disk is nearly full."""
+    statvfs.return_value = Mock(f_bavail=1, f_frsize=4096)
+    start_export = Mock()
+    with pytest.raises(downloads.NotEnoughSpaceError):
+        downloads.get_spool('archive-id', start_export)
+
+    start_export.assert_not_called()
+    assert not downloads._spools
+
+    # Disk fills up after a few chunks are written
+    statvfs.side_effect = [Mock(f_bavail=1024 * 1024, f_frsize=4096)] * 3 + \
+        [Mock(f_bavail=1, f_frsize=4096)] * 100
+    process = _Process(DATA)
+    process.can_finish.set()
+    spool = downloads.get_spool('archive-id', Mock(return_value=process))
+    with pytest.raises(downloads.NotEnoughSpaceError):
+        spool.wait()
+
+    assert not os.path.exists(spool.part_path)
@@ -0,0 +1,112 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Tests for the local index of archives in repositories.
+"""
+
+import json
+from unittest.mock import patch
+
+import pytest
+
+from plinth.modules.backups.repository import BorgRepository
+
+_ARCHIVES = [
+    {'name': 'archive1', 'id': 'id1', 'start': '2020-01-01T00:00:00',
+     'time': '2020-01-01T00:00:00'},
+    {'name': 'archive2', 'id': 'id2', 'start': '2020-01-02T00:00:00',
+     'time': '2020-01-02T00:00:00'},
+]
+
+
+@pytest.fixture(name='repository')
+def fixture_repository(tmp_path):
+    """Return a repository whose action calls are recorded."""
+    with patch('plinth.cfg.data_dir', str(tmp_path)):
+        repository = BorgRepository('/tmp/repository')
+        repository.stamp = 'repo-1'
+        repository.archives = list(_ARCHIVES)
+        repository.calls = []
+
+        def run(arguments):
+            repository.calls.append(arguments[0])
+            if arguments[0] == 'get-stamp':
+                return repository.stamp + '\n'
+
+            if arguments[0] == 'list-repo':
+                return json.dumps({'archives': repository.archives})
+
+            if arguments[0] == 'get-archive-apps':
+                return 'app1\napp2\n'
+
+            if arguments[0] == 'delete-archive':
+                repository.stamp += '-deleted'
+
+            return ''
+
+        with patch.object(repository, 'run', run):
+            yield repository
+
+
+def test_list_archives(repository):
+    """Test that archives are listed from index until repository changes."""
+    assert repository.list_archives() == _ARCHIVES[::-1]
+    assert repository.list_archives() == _ARCHIVES[::-1]
+    assert repository.get_archive('archive1') == _ARCHIVES[0]
+    assert repository.calls.count('list-repo') == 1
+
+    repository.stamp = 'repo-2'
+    repository.archives = _ARCHIVES[:1]
+    assert repository.list_archives() == _ARCHIVES[:1]
+    assert repository.calls.count('list-repo') == 2
+
+
+def test_archive_apps(repository):
+    """Test that apps of archives are kept while the archive exists."""
+    repository.list_archives()
+    assert repository.get_archive_apps('archive1') == ['app1', 'app2']
+    assert repository.get_archive_apps('archive1') == ['app1', 'app2']
+    assert repository.calls.count('get-archive-apps') == 1
+
+    # Apps are kept across changes to other archives in the repository
+    repository.stamp = 'repo-2'
+    repository.list_archives()
+    assert repository.get_archive_apps('archive1') == ['app1', 'app2']
+    assert repository.calls.count('get-archive-apps') == 1
+
+    # A different archive with the same name needs to be read again
+    repository.stamp = 'repo-3'
+    repository.archives = [dict(_ARCHIVES[0], id='id3')]
+    repository.list_archives()
+    repository.get_archive_apps('archive1')
+    assert repository.calls.count('get-archive-apps') == 2
+
+
+def test_create_delete_archive(repository):
+    """Test that creating and deleting archives updates the index."""
+    repository.list_archives()
+    output = {
+        'archive': {
+            'name': 'archive3',
+            'id': 'id3',
+            'start': '2020-01-03T00:00:00',
+            'stats': {'original_size': 1000},
+        }
+    }
+
+    def backup_apps(*args, **kwargs):
+        repository.stamp = 'repo-2'
+        return json.dumps(output)
+
+    with patch('plinth.modules.backups.api.backup_apps', backup_apps):
+        repository.create_archive('archive3', ['app3'])
+
+    archive = repository.list_archives()[0]
+    assert archive['name'] == 'archive3'
+    assert archive['size'] == 1000
+    assert repository.get_archive_apps('archive3') == ['app3']
+
+    repository.delete_archive('archive1')
+    assert [archive['name'] for archive in repository.list_archives()] == \
+        ['archive3', 'archive2']
+    assert repository.calls.count('list-repo') == 1
+    assert 'get-archive-apps' not in repository.calls
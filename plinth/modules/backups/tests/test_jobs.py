@@ -0,0 +1,78 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Tests for backup and restore operations running in the background.
+"""
+
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from plinth.modules.backups import jobs
+
+
+@pytest.fixture(autouse=True)
+def fixture_jobs():
+    """Start with no jobs."""
+    with patch('plinth.modules.backups.jobs._jobs', {}):
+        yield
+
+
+def test_job():
+    """Test running a job and reporting its progress."""
+    can_finish = threading.Event()
+
+    def create_archive(name, apps, job=None):
+        assert (name, apps) == ('archive', ['app1'])
+        job.update_progress({
+            'type': 'archive_progress',
+            'original_size': 1000,
+            'deduplicated_size': 250,
+            'nfiles': 10,
+            'path': 'var/lib/app1/file',
+        })
+        can_finish.wait()
+
+    job = jobs.start('backup', create_archive, 'archive', ['app1'])
+    assert jobs.get(job.id) is job
+    assert jobs.get_running() is job
+    with pytest.raises(jobs.JobRunningError):
+        jobs.start('restore', create_archive)
+
+    can_finish.set()
+    assert job.wait(timeout=5)
+    state = job.to_dict()
+    assert state['state'] == 'done'
+    assert state['bytes'] == 1000
+    assert state['files'] == 10
+    assert state['dedup_ratio'] == 0.25
+    assert state['percentage'] == 100
+    assert not jobs.get_running()
+
+
+def test_job_failure():
+    """Test that errors of a job are recorded."""
+    def restore_archive(job=None):
+        job.set_app_state('app1', 'failed')
+        raise RuntimeError('borg failed')
+
+    job = jobs.start('restore', restore_archive)
+    assert job.wait(timeout=5)
+    state = job.to_dict()
+    assert state['state'] == 'failed'
+    assert state['error'] == 'borg failed'
+    assert state['app_states'] == {'app1': 'failed'}
+
+
+def test_extract_progress():
+    """Test that progress of concurrent extractions is added up."""
+    job = jobs.Job('restore')
+    message = {'type': 'progress_percent', 'msgid': 'extract'}
+    job.update_progress(dict(message, current=0, total=100), source=1)
+    job.update_progress(dict(message, current=100, total=300), source=2)
+    assert job.percentage == 25
+    assert job.bytes == 100
+    assert job.eta is not None
+
+    job.update_progress(dict(message, finished=True), source=2)
+    assert job.percentage == 75
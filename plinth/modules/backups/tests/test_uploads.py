@@ -0,0 +1,76 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Tests for writing uploaded backup archives directly to disk.
+"""
+
+import hashlib
+import io
+import os
+from unittest.mock import patch
+
+import pytest
+from django.http.multipartparser import MultiPartParser
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+
+from plinth.modules.backups import uploads
+
+DATA = os.urandom(100000)
+
+
+@pytest.fixture(autouse=True)
+def fixture_data_dir(tmp_path):
+    """Use a temporary directory for uploaded files."""
+    with patch('plinth.cfg.data_dir', str(tmp_path)):
+        yield
+
+
+def _parse(data, handler):
+    """Parse a multipart request uploading data with the handler."""
+    body = encode_multipart(
+        BOUNDARY, {'backups-file': io.BytesIO(data)}).replace(
+            b'filename="backups-file"', b'filename="backup.tar.gz"')
+    meta = {
+        'CONTENT_TYPE': MULTIPART_CONTENT,
+        'CONTENT_LENGTH': len(body),
+    }
+    parser = MultiPartParser(meta, io.BytesIO(body), [handler])
+    return parser.parse()
+
+
+def test_upload():
+    """Test that uploaded file is written once to the uploads folder."""
+    with patch('plinth.modules.backups.uploads.CHECK_INTERVAL', 1000):
+        _, files = _parse(DATA, uploads.BackupUploadHandler())
+
+    uploaded_file = files['backups-file']
+    path = uploaded_file.temporary_file_path()
+    uploaded_file.close()
+    assert os.path.dirname(path) == uploads.get_uploads_folder()
+    assert uploaded_file.name == 'backup.tar.gz'
+    assert uploaded_file.size == len(DATA)
+    assert uploaded_file.sha256 == hashlib.sha256(DATA).hexdigest()
+    with open(path, 'rb') as file_handle:
+        assert file_handle.read() == DATA
+
+
+def test_upload_too_large():
+    """Test that upload is refused if it can't be restored."""
+    with patch('plinth.modules.backups.uploads.get_max_upload_size',
+               return_value=len(DATA) // 2):
+        _, files = _parse(DATA, uploads.BackupUploadHandler())
+
+    assert not files
+    assert not os.path.exists(uploads.get_uploads_folder())
+
+
+def test_upload_out_of_space():
+    """Test that partially written file is removed when disk fills up."""
+    usage = type('usage', (), {'free': 100})
+    with patch('plinth.modules.backups.uploads.CHECK_INTERVAL', 1000), \
+            patch('plinth.modules.backups.uploads.get_max_upload_size',
+                  return_value=2 * len(DATA)), \
+            patch('shutil.disk_usage', return_value=usage):
+        _, files = _parse(DATA, uploads.BackupUploadHandler())
+
+    assert not files
+    assert not os.listdir(uploads.get_uploads_folder())
@@ -0,0 +1,152 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Upload handler writing uploaded backup archives directly to their final place.
+
+Django's default handlers spool large uploads to a temporary file which then
+has to be copied elsewhere. This handler writes each chunk of the request
+directly into a file that restore reads in place, computing its SHA-256 hash
+and making sure enough disk space remains to restore it.
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+from django.contrib import messages
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from django.utils.translation import ugettext as _
+
+from plinth import cfg
+
+logger = logging.getLogger(__name__)
+
+# Free disk space is checked after receiving this many bytes
+CHECK_INTERVAL = 16 * 1024 * 1024
+
+# Seconds after which uploaded files left behind are removed
+MAX_AGE = 24 * 60 * 60
+
+
+def get_uploads_folder():
+    """Return the directory where uploaded backup archives are stored."""
+    return os.path.join(cfg.data_dir, 'backups-uploads')
+
+
+def get_max_upload_size(folder=None):
+    """Return the largest archive that can be uploaded and restored.
+
+    Restoring needs at least as much free space as the size of the archive.
+
+    """
+    folder = folder or get_uploads_folder()
+    while not os.path.exists(folder):
+        folder = os.path.dirname(folder)
+
+    return shutil.disk_usage(folder).free // 2
+
+
+class UploadedBackupFile(UploadedFile):
+    """An uploaded backup archive stored at its final path."""
+    def __init__(self, file, name, content_type, size, charset, sha256):
+        """Initialize the object."""
+        super().__init__(file, name, content_type, size, charset)
+        self.sha256 = sha256
+
+    def temporary_file_path(self):
+        """Return the full path of the file."""
+        return self.file.name
+
+
+class BackupUploadHandler(FileUploadHandler):
+    """Write an uploaded backup archive directly to the uploads folder."""
+    def __init__(self, request=None):
+        """Initialize the handler."""
+        super().__init__(request)
+        self._file = None
+        self._path = None
+        self._hash = None
+        self._size = 0
+        self._check_size = 0
+        self._is_too_large = False
+
+    def handle_raw_input(self, input_data, META, content_length, boundary,
+                         encoding=None):
+        """Note whether upload is too large before reading it."""
+        self._is_too_large = content_length > get_max_upload_size()
+
+    def new_file(self, *args, **kwargs):
+        """Create the file for a new upload."""
+        super().new_file(*args, **kwargs)
+        if self._is_too_large:
+            self._abort()
+
+        folder = get_uploads_folder()
+        os.makedirs(folder, mode=0o700, exist_ok=True)
+        _remove_old_files(folder)
+        file_descriptor, self._path = tempfile.mkstemp(suffix='.tar.gz',
+                                                       dir=folder)
+        self._file = os.fdopen(file_descriptor, 'wb')
+        self._hash = hashlib.sha256()
+        self._size = 0
+        self._check_size = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        """Write a chunk of the upload to the file."""
+        self._file.write(raw_data)
+        self._hash.update(raw_data)
+        self._size += len(raw_data)
+        if self._size - self._check_size >= CHECK_INTERVAL:
+            self._check_size = self._size
+            self._file.flush()
+            if shutil.disk_usage(os.path.dirname(
+                    self._path)).free < self._size:
+                self._abort()
+
+    def file_complete(self, file_size):
+        """Return the uploaded file."""
+        self._file.close()
+        sha256 = self._hash.hexdigest()
+        logger.info('Received backup archive of %d bytes, SHA-256 %s',
+                    file_size, sha256)
+        uploaded_file = UploadedBackupFile(
+            open(self._path, 'rb'), self.file_name, self.content_type,
+            file_size, self.charset, sha256)
+        self._file = None
+        return uploaded_file
+
+    def upload_complete(self):
+        """Remove the file if upload did not finish."""
+        self._remove_file()
+
+    def _abort(self):
+        """Stop the upload as there isn't enough disk space."""
+        self._remove_file()
+        if self.request:
+            messages.error(
+                self.request,
+                _('Not enough free disk space to upload and restore the '
+                  'backup file.'))
+
+        raise StopUpload(connection_reset=True)
+
+    def _remove_file(self):
+        """Close and remove the file being written, if any."""
+        if self._file:
+            self._file.close()
+            os.remove(self._path)
+            self._file = None
+
+
+def _remove_old_files(folder):
+    """Remove uploaded files left behind by interrupted uploads."""
+    for file_name in os.listdir(folder):
+        path = os.path.join(folder, file_name)
+        try:
+            if os.path.getmtime(path) < time.time() - MAX_AGE:
+                os.remove(path)
+        except OSError:
+            pass
@@ -7,9 +7,10 @@ from django.conf.urls import url
 
 from .views import (AddRemoteRepositoryView, AddRepositoryView,
                     CreateArchiveView, DeleteArchiveView, DownloadArchiveView,
-                    IndexView, RemoveRepositoryView, RestoreArchiveView,
-                    RestoreFromUploadView, UploadArchiveView,
-                    VerifySshHostkeyView, mount_repository, umount_repository)
+                    IndexView, JobView, RemoveRepositoryView,
+                    RestoreArchiveView, RestoreFromUploadView,
+                    UploadArchiveView, VerifySshHostkeyView, job_status,
+                    mount_repository, umount_repository)
 
 urlpatterns = [
     url(r'^sys/backups/$', IndexView.as_view(), name='index'),
@@ -23,6 +24,10 @@ urlpatterns = [
         RestoreArchiveView.as_view(), name='restore-archive'),
     url(r'^sys/backups/restore-from-upload/$', RestoreFromUploadView.as_view(),
         name='restore-from-upload'),
+    url(r'^sys/backups/jobs/(?P<job_id>[0-9a-f]+)/$', JobView.as_view(),
+        name='job'),
+    url(r'^sys/backups/jobs/(?P<job_id>[0-9a-f]+)/status/$', job_status,
+        name='job-status'),
     url(r'^sys/backups/repositories/add/$', AddRepositoryView.as_view(),
         name='add-repository'),
     url(r'^sys/backups/repositories/add-remote/$',
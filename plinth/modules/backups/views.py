@@ -5,25 +5,26 @@ Views for the backups app.
 
 import logging
 import os
-import tempfile
 from datetime import datetime
 from urllib.parse import unquote
 
 import paramiko
 from django.contrib import messages
 from django.contrib.messages.views import SuccessMessageMixin
-from django.http import Http404, StreamingHttpResponse
+from django.http import Http404, JsonResponse
 from django.shortcuts import redirect
 from django.urls import reverse, reverse_lazy
 from django.utils.decorators import method_decorator
 from django.utils.translation import ugettext as _
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
 from django.views.generic import FormView, TemplateView, View
 
-from plinth.errors import PlinthError
+from plinth import cfg
 from plinth.modules import backups, storage
 
-from . import (SESSION_PATH_VARIABLE, api, forms, get_known_hosts_path,
-               is_ssh_hostkey_verified)
+from . import (EXPORT_FORMATS, SESSION_PATH_VARIABLE, api, downloads, errors,
+               forms, get_known_hosts_path, is_ssh_hostkey_verified, jobs,
+               uploads)
 from .decorators import delete_tmp_backup_file
 from .repository import (BorgRepository, SshBorgRepository, get_instance,
                          get_repositories)
@@ -43,16 +44,29 @@ class IndexView(TemplateView):
         context['repositories'] = [
             repository.get_view_content() for repository in get_repositories()
         ]
+        context['running_job'] = jobs.get_running()
         return context
 
 
-class CreateArchiveView(SuccessMessageMixin, FormView):
+def _start_job(request, operation, function, *args):
+    """Start a backup or restore job and redirect to its page."""
+    try:
+        job = jobs.start(operation, function, *args)
+    except jobs.JobRunningError:
+        messages.error(request,
+                       _('Another backup or restore operation is running.'))
+        job = jobs.get_running()
+        if not job:
+            return redirect('backups:index')
+
+    return redirect('backups:job', job_id=job.id)
+
+
+class CreateArchiveView(FormView):
     """View to create a new archive."""
     form_class = forms.CreateArchiveForm
     prefix = 'backups'
     template_name = 'backups_form.html'
-    success_url = reverse_lazy('backups:index')
-    success_message = _('Archive created.')
 
     def get_context_data(self, **kwargs):
         """Return additional context for rendering the template."""
@@ -68,8 +82,8 @@ class CreateArchiveView(SuccessMessageMixin, FormView):
 
         name = datetime.now().strftime('%Y-%m-%d:%H:%M')
         selected_apps = form.cleaned_data['selected_apps']
-        repository.create_archive(name, selected_apps)
-        return super().form_valid(form)
+        return _start_job(self.request, 'backup', repository.create_archive,
+                          name, selected_apps)
 
 
 class DeleteArchiveView(SuccessMessageMixin, TemplateView):
@@ -95,51 +109,53 @@ class DeleteArchiveView(SuccessMessageMixin, TemplateView):
         return redirect('backups:index')
 
 
+@method_decorator(csrf_exempt, name='dispatch')
 class UploadArchiveView(SuccessMessageMixin, FormView):
     form_class = forms.UploadForm
     prefix = 'backups'
     template_name = 'backups_upload.html'
     success_url = reverse_lazy('backups:restore-from-upload')
 
+    def dispatch(self, request, *args, **kwargs):
+        """Write the uploaded file directly to where it is restored from.
+
+        Upload handlers can't be changed after CSRF middleware reads the
+        request, so check CSRF token only after setting them.
+
+        """
+        request.upload_handlers = [uploads.BackupUploadHandler(request)]
+        return csrf_protect(super().dispatch)(request, *args, **kwargs)
+
     def get_context_data(self, **kwargs):
         """Return additional context for rendering the template."""
         context = super().get_context_data(**kwargs)
         context['title'] = _('Upload and restore a backup')
         try:
-            disk_info = storage.get_disk_info('/')
-        except PlinthError as exception:
-            logger.exception(
-                'Error getting information about root partition: %s',
-                exception)
+            max_filesize = uploads.get_max_upload_size()
+        except OSError as exception:
+            logger.exception('Error getting free disk space: %s', exception)
         else:
-            # The maximum file size that can be uploaded and restored is at
-            # most half of the available disk space:
-            # - Django stores uploaded files that do not fit into memory to
-            #   disk (/tmp/). These are only copied by form_valid() after
-            #   the upload is finished.
-            # - For restoring it's highly advisable to have at least as much
-            #   free disk space as the file size.
-            context['max_filesize'] = storage.format_bytes(
-                disk_info['free_bytes'] / 2)
+            # The uploaded file is written only once and restored in place.
+            # For restoring, it's highly advisable to have at least as much
+            # free disk space as the file size.
+            context['max_filesize'] = storage.format_bytes(max_filesize)
 
         return context
 
     def form_valid(self, form):
-        """store uploaded file."""
-        with tempfile.NamedTemporaryFile(delete=False) as tmp_file:
-            self.request.session[SESSION_PATH_VARIABLE] = tmp_file.name
-            for chunk in self.request.FILES['backups-file'].chunks():
-                tmp_file.write(chunk)
+        """Remember where the uploaded file is stored."""
+        uploaded_file = self.request.FILES['backups-file']
+        self.request.session[SESSION_PATH_VARIABLE] = \
+            uploaded_file.temporary_file_path()
+        uploaded_file.close()
         return super().form_valid(form)
 
 
-class BaseRestoreView(SuccessMessageMixin, FormView):
+class BaseRestoreView(FormView):
     """View to restore files from an archive."""
     form_class = forms.RestoreForm
     prefix = 'backups'
     template_name = 'backups_restore.html'
-    success_url = reverse_lazy('backups:index')
-    success_message = _('Restored files from backup.')
 
     def get_form_kwargs(self):
         """Pass additional keyword args for instantiating the form."""
@@ -186,8 +202,8 @@ class RestoreFromUploadView(BaseRestoreView):
         """Restore files from the archive on valid form submission."""
         path = self.request.session.get(SESSION_PATH_VARIABLE)
         selected_apps = form.cleaned_data['selected_apps']
-        backups.restore_from_upload(path, selected_apps)
-        return super().form_valid(form)
+        return _start_job(self.request, 'restore',
+                          backups.restore_from_upload, path, selected_apps)
 
 
 class RestoreArchiveView(BaseRestoreView):
@@ -203,21 +219,65 @@ class RestoreArchiveView(BaseRestoreView):
         """Restore files from the archive on valid form submission."""
         repository = get_instance(self.kwargs['uuid'])
         selected_apps = form.cleaned_data['selected_apps']
-        repository.restore_archive(self.kwargs['name'], selected_apps)
-        return super().form_valid(form)
+        return _start_job(self.request, 'restore', repository.restore_archive,
+                          self.kwargs['name'], selected_apps)
 
 
 class DownloadArchiveView(View):
-    """View to export and download an archive as stream."""
+    """View to export and download an archive, resumable once exported."""
     def get(self, request, uuid, name):
         repository = get_instance(uuid)
-        filename = f'{name}.tar.gz'
+        archive = repository.get_archive(name)
+        if archive is None:
+            raise Http404
+
+        extension, content_type = EXPORT_FORMATS[cfg.export_compression]
+        # Exports with other compression settings are different files
+        export_id = '{}-{}-{}'.format(archive['id'], cfg.export_compression,
+                                      cfg.export_compression_level or '')
+        try:
+            spool = downloads.get_spool(export_id,
+                                        lambda: repository.export_tar(name))
+        except errors.NotEnoughSpaceError:
+            messages.error(request,
+                           _('Not enough free disk space to export archive.'))
+            return redirect(reverse_lazy('backups:index'))
+
+        return downloads.get_response(request, spool, name + extension,
+                                      content_type)
+
+
+class JobView(TemplateView):
+    """View to show the progress of a backup or restore operation."""
+    template_name = 'backups_job.html'
+
+    def get_context_data(self, **kwargs):
+        """Return additional context for rendering the template."""
+        context = super().get_context_data(**kwargs)
+        job = jobs.get(self.kwargs['job_id'])
+        if job is None:
+            raise Http404
+
+        context['job'] = job.to_dict()
+        context['is_running'] = job.state == 'running'
+        if job.operation == 'backup':
+            context['title'] = _('Create a new backup')
+        else:
+            context['title'] = _('Restore')
+
+        if job.bytes is not None:
+            context['bytes'] = storage.format_bytes(job.bytes)
+
+        return context
+
+
+def job_status(request, job_id):
+    """Return the state of a backup or restore operation as JSON."""
+    job = jobs.get(job_id)
+    if job is None:
+        raise Http404
 
-        response = StreamingHttpResponse(repository.get_download_stream(name),
-                                         content_type='application/gzip')
-        response['Content-Disposition'] = 'attachment; filename="%s"' % \
-            filename
-        return response
+    return JsonResponse(job.to_dict())
 
 
 class AddRepositoryView(SuccessMessageMixin, FormView):
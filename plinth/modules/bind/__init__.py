@@ -3,7 +3,6 @@
 FreedomBox app to configure BIND server.
 """
 
-import augeas
 import re
 from collections import defaultdict
 from pathlib import Path
@@ -15,10 +14,12 @@ from plinth import app as app_module
 from plinth import cfg, menu
 from plinth.daemon import Daemon
 from plinth.modules.firewall.components import Firewall
-from plinth.utils import format_lazy
+from plinth.utils import format_lazy, lazy_import
 
 from .manifest import backup  # noqa, pylint: disable=unused-import
 
+augeas = lazy_import('augeas')
+
 version = 2
 
 managed_services = ['bind9']
@@ -5,7 +5,9 @@ Minor utility methods for Cockpit.
 
 import urllib.parse
 
-import augeas
+from plinth.utils import lazy_import
+
+augeas = lazy_import('augeas')
 
 CONFIG_FILE = '/etc/cockpit/cockpit.conf'
 
@@ -6,7 +6,6 @@ FreedomBox app for basic system configuration.
 import os
 import socket
 
-import augeas
 from django.utils.translation import ugettext_lazy as _
 
 from plinth import actions
@@ -14,6 +13,9 @@ from plinth import app as app_module
 from plinth import frontpage, menu
 from plinth.modules.names.components import DomainType
 from plinth.signals import domain_added
+from plinth.utils import lazy_import
+
+augeas = lazy_import('augeas')
 
 version = 2
 
@@ -4,9 +4,12 @@ FreedomBox app for running diagnostics.
 """
 
 import collections
+import concurrent.futures
 import importlib
 import logging
+import math
 import threading
+import time
 
 from django.http import Http404
 from django.template.response import TemplateResponse
@@ -18,6 +21,12 @@ from plinth.modules import diagnostics
 
 logger = logging.Logger(__name__)
 
+# Number of apps diagnosed at the same time
+MAX_WORKERS = 4
+
+# Maximum time in seconds for diagnosing a single app
+APP_TIMEOUT = 300
+
 current_results = {}
 
 _running_task = None
@@ -74,8 +83,18 @@ def _run_on_all_enabled_modules_wrapper():
     _running_task = None
 
 
-def run_on_all_enabled_modules():
-    """Run diagnostics on all the enabled modules and store the result."""
+def run_on_all_enabled_modules(max_workers=MAX_WORKERS,
+                               app_timeout=APP_TIMEOUT):
+    """Run diagnostics on all the enabled modules and store the result.
+
+    Apps are diagnosed concurrently using a pool of threads. Results of each
+    app are stored as soon as they are available. An app that takes longer
+    than app_timeout seconds is reported as an error and its results are
+    ignored. Apps that could not even start because all workers are busy
+    with apps that hang are reported the same way once all apps should have
+    finished.
+
+    """
     global current_results
     current_results = {
         'apps': [],
@@ -102,7 +121,71 @@ def run_on_all_enabled_modules():
         current_results['results'][app.app_id] = None
 
     current_results['apps'] = apps
-    for current_index, (app_id, app) in enumerate(apps):
-        current_results['results'][app_id] = app.diagnose()
-        current_results['progress_percentage'] = \
-            int((current_index + 1) * 100 / len(apps))
+    if not apps:
+        current_results['progress_percentage'] = 100
+        return
+
+    executor = concurrent.futures.ThreadPoolExecutor(
+        max_workers=max_workers, thread_name_prefix='diagnostics')
+    # Apps still queued by then are waiting behind apps that hang
+    deadline = time.monotonic() + \
+        app_timeout * math.ceil(len(apps) / max_workers)
+    start_times = {}
+    pending = {
+        executor.submit(_diagnose_app, app, start_times): app_id
+        for app_id, app in apps
+    }
+    completed = 0
+    try:
+        while pending:
+            done, _not_done = concurrent.futures.wait(
+                pending, timeout=1,
+                return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                app_id = pending.pop(future)
+                current_results['results'][app_id] = _get_app_results(
+                    app_id, future)
+                completed += 1
+
+            now = time.monotonic()
+            for future, app_id in list(pending.items()):
+                start_time = start_times.get(app_id)
+                if start_time is None:
+                    if now < deadline:
+                        continue
+                elif now - start_time < app_timeout:
+                    continue
+
+                logger.warning('Diagnostics for app %s timed out', app_id)
+                future.cancel()
+                del pending[future]
+                current_results['results'][app_id] = [[
+                    _('Diagnostics did not complete in time'), 'error'
+                ]]
+                completed += 1
+
+            current_results['progress_percentage'] = \
+                int(completed * 100 / len(apps))
+    finally:
+        # Don't wait for apps that timed out, their threads will finish
+        # eventually.
+        executor.shutdown(wait=False)
+
+
+def _diagnose_app(app, start_times):
+    """Run diagnostics of an app noting when it started."""
+    start_times[app.app_id] = time.monotonic()
+    return app.diagnose()
+
+
+def _get_app_results(app_id, future):
+    """Return the results of a finished app diagnostics."""
+    try:
+        return future.result()
+    except Exception as exception:
+        logger.exception('Error running %s diagnostics - %s', app_id,
+                         exception)
+        return [[
+            _('Error running diagnostics: {error}').format(error=exception),
+            'error'
+        ]]
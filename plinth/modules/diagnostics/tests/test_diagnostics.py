@@ -0,0 +1,116 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Test module for running diagnostics on all apps.
+"""
+
+import threading
+import time
+from unittest.mock import Mock, patch
+
+import pytest
+
+from plinth.app import App
+from plinth.modules.diagnostics import diagnostics
+
+setup_helper = Mock()
+setup_helper.get_state.return_value = 'up-to-date'
+
+
+class DiagnoseApp(App):
+    """Test app with configurable diagnostics."""
+
+    def __init__(self, app_id, diagnose):
+        """Initialize with an ID and a diagnose method."""
+        self.app_id = app_id
+        super().__init__()
+        self.diagnose = diagnose
+
+    def is_enabled(self):
+        return True
+
+    def has_diagnostics(self):
+        return True
+
+
+@pytest.fixture(name='apps', autouse=True)
+def fixture_apps():
+    """Use only apps created by the tests."""
+    with patch.dict(App._all_apps, clear=True):
+        yield
+
+
+def test_results_in_app_order():
+    """Test that results are stored for each app in the order of apps."""
+    DiagnoseApp('test-app-1', lambda: (time.sleep(0.2), [['t1', 'passed']])[1])
+    DiagnoseApp('test-app-2', lambda: [['t2', 'failed']])
+    diagnostics.run_on_all_enabled_modules()
+    results = diagnostics.current_results
+    assert list(results['results'].items()) == [
+        ('test-app-1', [['t1', 'passed']]),
+        ('test-app-2', [['t2', 'failed']]),
+    ]
+    assert results['progress_percentage'] == 100
+
+
+def test_apps_run_concurrently():
+    """Test that apps are diagnosed at the same time."""
+    barrier = threading.Barrier(3, timeout=5)
+
+    def diagnose():
+        barrier.wait()
+        return [['test', 'passed']]
+
+    for index in range(3):
+        DiagnoseApp(f'test-app-{index}', diagnose)
+
+    diagnostics.run_on_all_enabled_modules(max_workers=3)
+    assert all(result == [['test', 'passed']]
+               for result in diagnostics.current_results['results'].values())
+
+
+def test_app_error():
+    """Test that an exception in an app is reported as error."""
+    def diagnose():
+        raise RuntimeError('test-error')
+
+    DiagnoseApp('test-app', diagnose)
+    diagnostics.run_on_all_enabled_modules()
+    result = diagnostics.current_results['results']['test-app']
+    assert result[0][1] == 'error'
+    assert 'test-error' in result[0][0]
+
+
+def test_app_timeout():
+    """Test that a slow app does not hold up the results."""
+    event = threading.Event()
+    DiagnoseApp('test-app-slow', lambda: event.wait(10))
+    DiagnoseApp('test-app-fast', lambda: [['test', 'passed']])
+    try:
+        diagnostics.run_on_all_enabled_modules(app_timeout=0.5)
+    finally:
+        event.set()
+
+    results = diagnostics.current_results['results']
+    assert results['test-app-slow'][0][1] == 'error'
+    assert results['test-app-fast'] == [['test', 'passed']]
+    assert diagnostics.current_results['progress_percentage'] == 100
+
+
+def test_more_hanging_apps_than_workers():
+    """Test that apps queued behind hanging apps time out as well."""
+    event = threading.Event()
+    for index in range(3):
+        DiagnoseApp(f'test-app-{index}', lambda: event.wait(30))
+
+    start_time = time.monotonic()
+    try:
+        diagnostics.run_on_all_enabled_modules(max_workers=2,
+                                               app_timeout=0.3)
+    finally:
+        event.set()
+
+    assert time.monotonic() - start_time < 5
+
+    results = diagnostics.current_results['results']
+    assert all(result[0][1] == 'error' for result in results.values())
+    assert diagnostics.current_results['progress_percentage'] == 100
@@ -2,7 +2,6 @@
 
 import os
 
-import augeas
 from django.utils.translation import ugettext_lazy as _
 
 from plinth import actions
@@ -12,7 +11,9 @@ from plinth.daemon import Daemon
 from plinth.errors import DomainNotRegisteredError
 from plinth.modules.apache.components import Webserver, diagnose_url
 from plinth.modules.firewall.components import Firewall
-from plinth.utils import format_lazy
+from plinth.utils import format_lazy, lazy_import
+
+augeas = lazy_import('augeas')
 
 domain_name_file = "/etc/diaspora/domain_name"
 lazy_domain_name = None  # To avoid repeatedly reading from file
@@ -41,6 +42,8 @@ managed_services = ['diaspora']
 
 managed_packages = ['diaspora']
 
+install_before_setup = False
+
 _description = [
     _('diaspora* is a decentralized social network where you can store '
       'and control your own data.'),
@@ -30,6 +30,8 @@ managed_services = ['ejabberd']
 
 managed_packages = ['ejabberd']
 
+install_before_setup = False
+
 managed_paths = [pathlib.Path('/etc/ejabberd/')]
 
 _description = [
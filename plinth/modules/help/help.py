@@ -8,7 +8,6 @@ import os
 import pathlib
 import subprocess
 
-from apt.cache import Cache
 from django.core.files.base import File
 from django.http import Http404, HttpResponse, HttpResponseRedirect
 from django.template.response import TemplateResponse
@@ -16,7 +15,7 @@ from django.urls import reverse
 from django.utils.translation import get_language_from_request
 from django.utils.translation import ugettext as _
 
-from plinth import __version__, actions, cfg
+from plinth import __version__, actions, cfg, package
 
 
 def index(request):
@@ -45,12 +44,13 @@ def support(request):
 
 def about(request):
     """Serve the about page"""
-    cache = Cache()
-    freedombox = cache['freedombox']
+    with package.get_cache() as cache:
+        new_version = not cache['freedombox'].candidate.is_installed
+
     context = {
         'title': _('About {box_name}').format(box_name=_(cfg.box_name)),
         'version': __version__,
-        'new_version': not freedombox.candidate.is_installed,
+        'new_version': new_version,
         'os_release': get_os_release(),
         'backports_in_use': get_backports_in_use(),
     }
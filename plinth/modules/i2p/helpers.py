@@ -7,7 +7,9 @@ import os
 import re
 from collections import OrderedDict
 
-import augeas
+from plinth.utils import lazy_import
+
+augeas = lazy_import('augeas')
 
 I2P_CONF_DIR = '/var/lib/i2p/i2p-config'
 FILE_TUNNEL_CONF = os.path.join(I2P_CONF_DIR, 'i2ptunnel.config')
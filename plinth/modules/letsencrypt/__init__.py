@@ -11,7 +11,7 @@ from django.utils.translation import ugettext_lazy as _
 
 from plinth import actions
 from plinth import app as app_module
-from plinth import cfg, menu
+from plinth import cache, cfg, menu
 from plinth.errors import ActionError
 from plinth.modules import names
 from plinth.modules.apache.components import diagnose_url
@@ -107,6 +107,7 @@ def setup(helper, old_version=None):
 def certificate_obtain(domain):
     """Obtain a certificate for a domain and notify handlers."""
     actions.superuser_run('letsencrypt', ['obtain', '--domain', domain])
+    cache.invalidate('letsencrypt')
     components.on_certificate_event('obtained', [domain], None)
 
 
@@ -122,17 +123,20 @@ def certificate_reobtain(domain):
 
     """
     actions.superuser_run('letsencrypt', ['obtain', '--domain', domain])
+    cache.invalidate('letsencrypt')
 
 
 def certificate_revoke(domain):
     """Revoke a certificate for a domain and notify handlers."""
     actions.superuser_run('letsencrypt', ['revoke', '--domain', domain])
+    cache.invalidate('letsencrypt')
     components.on_certificate_event('revoked', [domain], None)
 
 
 def certificate_delete(domain):
     """Delete a certificate for a domain and notify handlers."""
     actions.superuser_run('letsencrypt', ['delete', '--domain', domain])
+    cache.invalidate('letsencrypt')
     components.on_certificate_event('deleted', [domain], None)
 
 
@@ -176,8 +180,7 @@ def on_domain_removed(sender, domain_type, name='', **kwargs):
 
 def get_status():
     """Get the current settings."""
-    status = actions.superuser_run('letsencrypt', ['get-status'])
-    status = json.loads(status)
+    status = _get_certificates_status()
 
     for domain in names.components.DomainName.list():
         if domain.domain_type.can_have_certificate:
@@ -186,6 +189,13 @@ def get_status():
     return status
 
 
+@cache.cached('letsencrypt-status', tags=['letsencrypt'])
+def _get_certificates_status():
+    """Return the status of certificates as reported by the action."""
+    status = actions.superuser_run('letsencrypt', ['get-status'])
+    return json.loads(status)
+
+
 def _certificate_handle_modified(**kwargs):
     """Generate events for certificates that got modified during downtime.
 
@@ -62,6 +62,8 @@ class LetsEncrypt:
         logger.info('LE certificate renewed (deployed): %s, %s.',
                     renewed_domains, renewed_lineage)
 
+        from plinth import cache
         from plinth.modules.letsencrypt import components
+        cache.invalidate('letsencrypt')
         components.on_certificate_event('renewed', renewed_domains,
                                         renewed_lineage)
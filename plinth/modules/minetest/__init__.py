@@ -3,7 +3,6 @@
 FreedomBox app for Minetest server.
 """
 
-import augeas
 from django.urls import reverse_lazy
 from django.utils.translation import ugettext_lazy as _
 
@@ -11,10 +10,12 @@ from plinth import app as app_module
 from plinth import cfg, frontpage, menu
 from plinth.daemon import Daemon
 from plinth.modules.firewall.components import Firewall
-from plinth.utils import format_lazy
+from plinth.utils import format_lazy, lazy_import
 
 from .manifest import backup, clients  # noqa, pylint: disable=unused-import
 
+augeas = lazy_import('augeas')
+
 version = 2
 
 managed_services = ['minetest-server']
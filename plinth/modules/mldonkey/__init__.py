@@ -22,6 +22,8 @@ managed_services = ['mldonkey-server']
 
 managed_packages = ['mldonkey-server']
 
+install_before_setup = False
+
 _description = [
     _('MLDonkey is a peer-to-peer file sharing application used to exchange '
       'large files. It can participate in multiple peer-to-peer networks '
@@ -6,7 +6,7 @@ import os
 
 from django.utils.translation import ugettext_lazy as _
 
-from plinth import action_utils, actions
+from plinth import action_utils, actions, cache
 from plinth.signals import domain_added, domain_removed
 
 LOGGER = logging.getLogger(__name__)
@@ -76,12 +76,14 @@ PREDEFINED_SERVICES = {
 }
 
 
+@cache.cached('pagekite-kite', tags=['pagekite'])
 def get_kite_details():
     output = run(['get-kite'])
     kite_details = output.split()
     return {'kite_name': kite_details[0], 'kite_secret': kite_details[1]}
 
 
+@cache.cached('pagekite-config', tags=['pagekite'])
 def get_pagekite_config():
     """
     Return the current PageKite configuration by executing various actions.
@@ -118,6 +120,7 @@ def get_pagekite_config():
     return status
 
 
+@cache.cached('pagekite-services', tags=['pagekite'])
 def get_pagekite_services():
     """Get enabled services. Returns two values:
 
@@ -157,13 +160,26 @@ def prepare_service_for_display(service):
 
 
 def run(arguments, superuser=True, input=None):
-    """Run a given command and raise exception if there was an error"""
+    """Run a given command and raise exception if there was an error.
+
+    Cached configuration is discarded after any command that changes it.
+
+    """
     command = 'pagekite'
 
-    if superuser:
-        return actions.superuser_run(command, arguments, input=input)
-    else:
-        return actions.run(command, arguments, input=input)
+    try:
+        if superuser:
+            return actions.superuser_run(command, arguments, input=input)
+        else:
+            return actions.run(command, arguments, input=input)
+    finally:
+        if not _is_query(arguments):
+            cache.invalidate('pagekite')
+
+
+def _is_query(arguments):
+    """Return whether a command only reads the configuration."""
+    return arguments[0].startswith('get-') or arguments[0] == 'is-disabled'
 
 
 def convert_service_to_string(service):
@@ -25,6 +25,8 @@ managed_services = ['privoxy']
 
 managed_packages = ['privoxy']
 
+install_before_setup = False
+
 _description = [
     _('Privoxy is a non-caching web proxy with advanced filtering '
       'capabilities for enhancing privacy, modifying web page data and '
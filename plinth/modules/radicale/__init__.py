@@ -7,26 +7,28 @@ import logging
 import subprocess
 from distutils.version import LooseVersion as LV
 
-import augeas
-from apt.cache import Cache
 from django.utils.translation import ugettext_lazy as _
 
 from plinth import actions
 from plinth import app as app_module
-from plinth import cfg, frontpage, menu
+from plinth import cfg, frontpage, menu, package
 from plinth.daemon import Daemon
 from plinth.modules.apache.components import Uwsgi, Webserver
 from plinth.modules.firewall.components import Firewall
-from plinth.utils import format_lazy
+from plinth.utils import format_lazy, lazy_import
 
 from .manifest import backup, clients  # noqa, pylint: disable=unused-import
 
+augeas = lazy_import('augeas')
+
 version = 2
 
 managed_services = ['radicale']
 
 managed_packages = ['radicale', 'uwsgi', 'uwsgi-plugin-python3']
 
+install_before_setup = False
+
 _description = [
     format_lazy(
         _('Radicale is a CalDAV and CardDAV server. It allows synchronization '
@@ -181,10 +183,10 @@ def setup(helper, old_version=None):
     """Install and configure the module."""
     if old_version == 1:
         # Check that radicale 2.x is available for install.
-        cache = Cache()
-        candidate = cache['radicale'].candidate
-        if candidate < '2':
-            logger.error('Radicale 2.x is not available to install.')
+        with package.get_cache() as cache:
+            candidate = cache['radicale'].candidate
+            if candidate < '2':
+                logger.error('Radicale 2.x is not available to install.')
 
         # Try to upgrade radicale 1.x to 2.x.
         helper.call('pre', actions.superuser_run, 'radicale', ['migrate'])
@@ -17,6 +17,8 @@ version = 1
 
 managed_packages = ['sqlite3', 'roundcube', 'roundcube-sqlite3']
 
+install_before_setup = False
+
 _description = [
     _('Roundcube webmail is a browser-based multilingual IMAP '
       'client with an application-like user interface. It provides '
@@ -5,16 +5,18 @@ FreedomBox app to manage filesystem snapshots.
 
 import json
 
-import augeas
 from django.utils.translation import ugettext_lazy as _
 
 from plinth import actions
 from plinth import app as app_module
 from plinth import menu
 from plinth.modules import storage
+from plinth.utils import lazy_import
 
 from .manifest import backup  # noqa, pylint: disable=unused-import
 
+augeas = lazy_import('augeas')
+
 version = 4
 
 managed_packages = ['snapper']
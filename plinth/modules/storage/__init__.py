@@ -12,7 +12,7 @@ from django.utils.translation import ugettext_noop
 
 from plinth import actions
 from plinth import app as app_module
-from plinth import cfg, glib, menu, utils
+from plinth import cache, cfg, glib, menu, utils
 from plinth.daemon import Daemon
 from plinth.errors import ActionError, PlinthError
 from plinth.utils import format_lazy, import_from_gi
@@ -25,6 +25,8 @@ managed_services = ['freedombox-udiskie']
 
 managed_packages = ['parted', 'udiskie', 'gir1.2-udisks-2.0']
 
+install_before_setup = False
+
 _description = [
     format_lazy(
         _('This module allows you to manage storage media attached to your '
@@ -73,6 +75,7 @@ def init():
     app.set_enabled(True)
 
 
+@cache.cached('storage-disks', timeout=10, tags=['storage'])
 def get_disks():
     """Returns list of disks by combining information from df and udisks."""
     disks = _get_disks_from_df()
@@ -200,6 +203,7 @@ def is_expandable(device):
 def expand_partition(device):
     """Expand a partition."""
     actions.superuser_run('storage', ['expand-partition', device])
+    cache.invalidate('storage')
 
 
 def format_bytes(size):
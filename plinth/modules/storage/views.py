@@ -14,7 +14,7 @@ from django.urls import reverse
 from django.utils.translation import ugettext as _
 from django.views.decorators.http import require_POST
 
-from plinth import actions, views
+from plinth import actions, cache, views
 from plinth.modules import storage
 
 from . import get_error_message
@@ -85,6 +85,7 @@ def eject(request, device_path):
     try:
         drive = json.loads(
             actions.superuser_run('storage', ['eject', device_path]))
+        cache.invalidate('storage')
         if drive:
             messages.success(
                 request,
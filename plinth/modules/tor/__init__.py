@@ -3,11 +3,9 @@
 FreedomBox app to configure Tor.
 """
 
-import json
-
 from django.utils.translation import ugettext_lazy as _
 
-from plinth import action_utils, actions
+from plinth import action_utils, actions, cache
 from plinth import app as app_module
 from plinth import menu
 from plinth.daemon import Daemon, diagnose_netcat, diagnose_port_listening
@@ -88,8 +86,7 @@ class TorApp(app_module.App):
 
         results.extend(_diagnose_control_port())
 
-        output = actions.superuser_run('tor', ['get-status'])
-        ports = json.loads(output)['ports']
+        ports = utils.get_raw_status()['ports']
 
         results.append([
             _('Tor relay port available'),
@@ -164,6 +161,8 @@ def setup(helper, old_version=None):
         helper.call('post', actions.superuser_run, 'tor',
                     ['configure', '--apt-transport-tor', 'enable'])
 
+    cache.invalidate('tor')
+
     helper.call('post', update_hidden_service_domain)
     helper.call('post', app.enable)
 
@@ -7,22 +7,29 @@ import glob
 import itertools
 import json
 
-import augeas
-
-from plinth import actions
+from plinth import actions, cache
 from plinth.daemon import app_is_running
 from plinth.modules import tor
 from plinth.modules.names.components import DomainName
+from plinth.utils import lazy_import
+
+augeas = lazy_import('augeas')
 
 APT_SOURCES_URI_PATHS = ('/files/etc/apt/sources.list/*/uri',
                          '/files/etc/apt/sources.list.d/*/*/uri')
 APT_TOR_PREFIX = 'tor+'
 
 
+@cache.cached('tor-status', tags=['tor'])
+def get_raw_status():
+    """Return Tor status as reported by the action."""
+    output = actions.superuser_run('tor', ['get-status'])
+    return json.loads(output)
+
+
 def get_status():
     """Return current Tor status."""
-    output = actions.superuser_run('tor', ['get-status'])
-    status = json.loads(output)
+    status = get_raw_status()
 
     hs_info = status['hidden_service']
     hs_services = []
@@ -6,7 +6,7 @@ from django.contrib import messages
 from django.template.response import TemplateResponse
 from django.utils.translation import ugettext as _
 
-from plinth import actions
+from plinth import actions, cache
 from plinth.errors import ActionError
 from plinth.modules import tor
 from plinth.modules.firewall.components import Firewall
@@ -126,6 +126,7 @@ def __apply_changes(request, old_status, new_status):
 
     if arguments:
         actions.superuser_run('tor', ['configure'] + arguments)
+        cache.invalidate('tor')
         if not needs_restart:
             messages.success(request, _('Configuration updated.'))
 
@@ -149,6 +150,7 @@ def _collect_config_result(request):
     if return_code is None:
         return
 
+    cache.invalidate('tor')
     status = tor_utils.get_status()
 
     tor.update_hidden_service_domain(status)
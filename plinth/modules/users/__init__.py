@@ -10,7 +10,7 @@ from django.utils.translation import ugettext_lazy as _
 
 from plinth import actions
 from plinth import app as app_module
-from plinth import cfg, menu
+from plinth import cache, cfg, menu
 from plinth.daemon import Daemon
 from plinth.utils import format_lazy
 
@@ -131,6 +131,25 @@ def register_group(group):
     groups[group[0]] = group[1]
 
 
+@cache.cached('users-user-groups', timeout=300, tags=['users-groups'])
+def get_user_groups(username):
+    """Return the names of the groups a user belongs to.
+
+    Group membership is read from the authentication database which is kept
+    in sync with LDAP groups by the users forms. Call
+    :func:`invalidate_user_groups` after changing membership.
+    """
+    from django.contrib.auth.models import Group
+    return sorted(
+        Group.objects.filter(user__username=username).values_list('name',
+                                                                  flat=True))
+
+
+def invalidate_user_groups():
+    """Discard cached group membership of all users."""
+    cache.invalidate('users-groups')
+
+
 def get_last_admin_user():
     """If there is only one admin user return its name else return None."""
     output = actions.superuser_run('users', ['get-group-users', 'admin'])
@@ -147,6 +147,8 @@ class CreateUserForm(ValidNewUsernameCheckMixin,
                 group_object, created = Group.objects.get_or_create(name=group)
                 group_object.user_set.add(user)
 
+            users.invalidate_user_groups()
+
         return user
 
 
@@ -227,6 +229,7 @@ class UserUpdateForm(ValidNewUsernameCheckMixin,
         if commit:
             user.save()
             self.save_m2m()
+            users.invalidate_user_groups()
 
             output = actions.superuser_run('users',
                                            ['get-user-groups', self.username])
@@ -371,6 +374,7 @@ class FirstBootForm(ValidNewUsernameCheckMixin, auth.forms.UserCreationForm):
 
             admin_group = auth.models.Group.objects.get(name='admin')
             admin_group.user_set.add(user)
+            users.invalidate_user_groups()
 
             self.login_user(self.cleaned_data['username'],
                             self.cleaned_data['password1'])
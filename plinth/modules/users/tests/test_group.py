@@ -5,6 +5,10 @@ Test module to exercise group registration.
 It is recommended to run this module with root privileges in a virtual machine.
 """
 
+import pytest
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache as django_cache
+
 from plinth.modules import users
 
 
@@ -16,3 +20,20 @@ def test_register_group():
     users.register_group(group)
     assert len(users.groups) == 1
     return users.groups
+
+
+@pytest.mark.django_db
+def test_get_user_groups():
+    """Test that group membership is read once and invalidated."""
+    django_cache.clear()
+    user = User.objects.create(username='tester')
+    user.groups.add(Group.objects.create(name='group2'),
+                    Group.objects.create(name='group1'))
+    assert users.get_user_groups('tester') == ['group1', 'group2']
+    assert users.get_user_groups('other') == []
+
+    user.groups.remove(Group.objects.get(name='group1'))
+    assert users.get_user_groups('tester') == ['group1', 'group2']
+
+    users.invalidate_user_groups()
+    assert users.get_user_groups('tester') == ['group2']
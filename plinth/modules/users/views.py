@@ -18,7 +18,7 @@ from plinth.modules import first_boot
 from plinth.utils import is_user_admin
 from plinth.views import AppView
 
-from . import get_last_admin_user
+from . import get_last_admin_user, invalidate_user_groups
 from .forms import (CreateUserForm, FirstBootForm, UserChangePasswordForm,
                     UserUpdateForm)
 
@@ -127,6 +127,7 @@ class UserDelete(ContextMixin, DeleteView):
         so set the success message manually here.
         """
         output = super(UserDelete, self).delete(*args, **kwargs)
+        invalidate_user_groups()
 
         message = _('User {user} deleted.').format(user=self.kwargs['slug'])
         messages.success(self.request, message)
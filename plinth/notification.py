@@ -4,13 +4,16 @@ Module to provide API for showing notifications.
 """
 
 import copy
+import itertools
 import logging
 
+from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.template.exceptions import TemplateDoesNotExist
 from django.template.response import SimpleTemplateResponse
-from django.utils.translation import ugettext
+from django.utils.translation import get_language, ugettext
 
 from plinth import cfg
 
@@ -19,6 +22,13 @@ from . import models
 severities = {'exception': 5, 'error': 4, 'warning': 3, 'info': 2, 'debug': 1}
 logger = logging.getLogger(__name__)
 
+# Incremented whenever notifications or group membership of users change
+_version_counter = itertools.count(1)
+_version = 0
+
+# Display context for each user and language along with its version
+_display_cache = {}
+
 
 class Notification(models.StoredNotification):
     """API to create persistent global notifications to users.
@@ -327,7 +337,25 @@ class Notification(models.StoredNotification):
 
     @staticmethod
     def get_display_context(user):
-        """Return a list of notifications meant for display to a user."""
+        """Return a list of notifications meant for display to a user.
+
+        The context is computed once for each user and language and reused
+        until notifications change. The returned value must not be modified.
+
+        """
+        key = (user.username, get_language())
+        version = _version
+        cached = _display_cache.get(key)
+        if cached and cached[0] == version:
+            return cached[1]
+
+        context = Notification._get_display_context(user)
+        _display_cache[key] = (version, context)
+        return context
+
+    @staticmethod
+    def _get_display_context(user):
+        """Compute the list of notifications meant for display to a user."""
         notifications = Notification.list(user=user)
         max_severity = max(notifications, default=None,
                            key=lambda note: note.severity_value)
@@ -359,3 +387,19 @@ class Notification(models.StoredNotification):
             })
 
         return {'notifications': notes, 'max_severity': max_severity}
+
+
+def _bump_version(**kwargs):
+    """Invalidate display contexts of all users."""
+    global _version
+    _version = next(_version_counter)
+    _display_cache.clear()
+
+
+# Saving covers update_or_create() and dismiss(). Deleting a queryset also
+# sends signals for each deleted object.
+for _sender in (models.StoredNotification, Notification):
+    post_save.connect(_bump_version, sender=_sender)
+    post_delete.connect(_bump_version, sender=_sender)
+
+m2m_changed.connect(_bump_version, sender=User.groups.through)
@@ -3,17 +3,27 @@
 Framework for installing and updating distribution packages
 """
 
+import collections
+import contextlib
 import json
 import logging
+import os
 import subprocess
 import threading
 
 from django.utils.translation import ugettext as _
 
 from plinth import actions
+from plinth.utils import lazy_import
+
+apt = lazy_import('apt')
 
 logger = logging.getLogger(__name__)
 
+APT_LISTS_DIR = '/var/lib/apt/lists/'
+
+DPKG_STATUS_FILE = '/var/lib/dpkg/status'
+
 
 class PackageException(Exception):
     """A package operation has failed."""
@@ -75,19 +85,20 @@ class Transaction(object):
         If force_configuration is None, no special options are passed to
         apt/dpkg for configuration file behavior.
 
+        Installs requested by other apps at the same time are merged with this
+        one into a single apt-get run.
+
         """
-        try:
-            self._run_apt_command(['update'])
-            extra_arguments = []
-            if skip_recommends:
-                extra_arguments.append('--skip-recommends')
+        extra_arguments = []
+        if skip_recommends:
+            extra_arguments.append('--skip-recommends')
 
-            if force_configuration is not None:
-                extra_arguments.append(
-                    '--force-configuration={}'.format(force_configuration))
+        if force_configuration is not None:
+            extra_arguments.append(
+                '--force-configuration={}'.format(force_configuration))
 
-            self._run_apt_command(['install'] + extra_arguments +
-                                  [self.module_name] + self.package_names)
+        try:
+            _install_queue.install(self, extra_arguments)
         except subprocess.CalledProcessError as exception:
             logger.exception('Error installing package: %s', exception)
             raise
@@ -100,6 +111,13 @@ class Transaction(object):
             logger.exception('Error updating package lists: %s', exception)
             raise
 
+        _install_queue.lists_refreshed()
+
+    def _run_install(self, extra_arguments):
+        """Run apt-get install for the packages of this transaction."""
+        self._run_apt_command(['install'] + extra_arguments +
+                              [self.module_name] + self.package_names)
+
     def _run_apt_command(self, arguments):
         """Run apt-get and update progress."""
         self._reset_status()
@@ -153,6 +171,305 @@ class Transaction(object):
         self.percentage = int(float(parts[2]))
 
 
+class _MergedTransaction(Transaction):
+    """A transaction installing packages of several transactions at once.
+
+    Progress is reported on each of the merged transactions.
+    """
+    def __init__(self, transactions):
+        """Initialize transaction object."""
+        self.transactions = transactions
+        module_names = []
+        package_names = []
+        for transaction in transactions:
+            if transaction.module_name not in module_names:
+                module_names.append(transaction.module_name)
+
+            package_names += [
+                package_name for package_name in transaction.package_names
+                if package_name not in package_names
+            ]
+
+        super().__init__(','.join(module_names), package_names)
+
+    def _reset_status(self):
+        """Reset the current status progress."""
+        super()._reset_status()
+        for transaction in self.transactions:
+            transaction._reset_status()
+
+    def _read_stderr(self, process):
+        """Read the stderr of the process and store in buffer."""
+        super()._read_stderr(process)
+        for transaction in self.transactions:
+            transaction.stderr = self.stderr
+
+    def _parse_progress(self, line):
+        """Parse the apt-get process output line."""
+        super()._parse_progress(line)
+        for transaction in self.transactions:
+            transaction.status_string = self.status_string
+            transaction.percentage = self.percentage
+
+
+class _InstallRequest:
+    """A transaction waiting in the install queue."""
+    def __init__(self, transaction, extra_arguments):
+        """Initialize the request."""
+        self.transaction = transaction
+        self.extra_arguments = extra_arguments
+        self.is_done = False
+        self.exception = None
+
+
+class _InstallQueue:
+    """Merge installs requested by several apps into fewer apt-get runs.
+
+    Only one apt-get runs at a time. Installs requested while it runs, or
+    requested together, are merged into the next run: one update of package
+    lists followed by one install for all the requests with the same options.
+    Within a batch, such as setup of several apps, package lists are updated
+    only once.
+
+    When a merged install fails, each of the transactions is installed
+    separately so that only the apps causing the failure get the error.
+    """
+    def __init__(self):
+        """Initialize the queue."""
+        self._condition = threading.Condition()
+        self._pending = []
+        self._running = False
+        self._batches = 0
+        self._lists_refreshed = False
+
+    def install(self, transaction, extra_arguments):
+        """Install packages of a transaction, return when done."""
+        request, = self.install_all([transaction], extra_arguments)
+        if request.exception:
+            raise request.exception
+
+    def install_all(self, transactions, extra_arguments):
+        """Install packages of transactions together, return the requests.
+
+        Errors are stored in the exception attribute of each request.
+
+        """
+        requests = [
+            _InstallRequest(transaction, extra_arguments)
+            for transaction in transactions
+        ]
+        with self._condition:
+            self._pending += requests
+
+        while True:
+            with self._condition:
+                while self._running and \
+                      not all(request.is_done for request in requests):
+                    self._condition.wait()
+
+                if all(request.is_done for request in requests):
+                    break
+
+                # Take over running apt-get for all waiting requests
+                self._running = True
+                waiting, self._pending = self._pending, []
+
+            try:
+                self._run(waiting)
+            finally:
+                with self._condition:
+                    self._running = False
+                    self._condition.notify_all()
+
+        return requests
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Update package lists only once for installs within the block."""
+        with self._condition:
+            self._batches += 1
+
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._batches -= 1
+                if not self._batches:
+                    self._lists_refreshed = False
+
+    def lists_refreshed(self):
+        """Note that package lists have just been updated."""
+        with self._condition:
+            self._lists_refreshed = bool(self._batches)
+
+    def _run(self, requests):
+        """Run update and install for a list of requests."""
+        try:
+            self._refresh_package_lists(requests)
+            groups = collections.OrderedDict()
+            for request in requests:
+                key = tuple(request.extra_arguments)
+                groups.setdefault(key, []).append(request)
+
+            for group in groups.values():
+                self._install(group)
+        except Exception as exception:
+            for request in requests:
+                if not request.is_done:
+                    request.exception = exception
+        finally:
+            for request in requests:
+                request.is_done = True
+
+    def _refresh_package_lists(self, requests):
+        """Update package lists unless already updated in this batch."""
+        transaction = _MergedTransaction(
+            [request.transaction for request in requests])
+        if self._lists_refreshed:
+            logger.info('Not updating package lists again for modules - %s',
+                        transaction.module_name)
+            return
+
+        transaction._run_apt_command(['update'])
+        self.lists_refreshed()
+
+    @staticmethod
+    def _install(requests):
+        """Install packages of requests with same options in one run."""
+        if len(requests) > 1:
+            transaction = _MergedTransaction(
+                [request.transaction for request in requests])
+            logger.info('Installing packages for modules - %s',
+                        transaction.module_name)
+            try:
+                transaction._run_install(requests[0].extra_arguments)
+                return
+            except PackageException as exception:
+                logger.warning(
+                    'Installing packages together failed, installing '
+                    'for each module separately: %s', exception)
+
+        for request in requests:
+            try:
+                request.transaction._run_install(request.extra_arguments)
+            except Exception as exception:
+                request.exception = exception
+            finally:
+                request.is_done = True
+
+
+_install_queue = _InstallQueue()
+
+
+def install_together(transactions):
+    """Install packages of several transactions in a single apt-get run.
+
+    Return the transactions whose packages could not be installed. Errors are
+    logged.
+
+    """
+    failed = []
+    for request in _install_queue.install_all(transactions, []):
+        if request.exception:
+            logger.warning('Installing packages for module %s failed: %s',
+                           request.transaction.module_name,
+                           request.exception)
+            failed.append(request.transaction)
+
+    return failed
+
+
+def batch():
+    """Return context manager updating package lists once for its installs.
+
+    Use it around installs for several apps, such as their setup, so that
+    package lists are updated only once.
+
+    """
+    return _install_queue.batch()
+
+
+class _PackageCache:
+    """An apt cache shared by all users, opened only once.
+
+    Opening the cache parses all the package lists. It is reopened only when
+    package lists or the list of installed packages have changed or when
+    notified that the apt cache has been updated. python-apt objects are not
+    thread safe, so the cache is only used while holding a lock.
+    """
+    def __init__(self):
+        """Initialize the cache."""
+        self._cache = None
+        self._stamp = None
+        self._lock = threading.RLock()
+
+    @contextlib.contextmanager
+    def get(self):
+        """Return the apt cache, opening or reopening it if needed."""
+        with self._lock:
+            stamp = self._get_stamp()
+            if self._cache is None:
+                self._cache = apt.Cache()
+            elif stamp != self._stamp:
+                logger.info('Reloading apt cache')
+                self._cache.open()
+
+            self._stamp = stamp
+            yield self._cache
+
+    def invalidate(self):
+        """Reopen the cache the next time it is used."""
+        with self._lock:
+            self._stamp = None
+
+    @staticmethod
+    def _get_stamp():
+        """Return modification times that change when cache is stale."""
+        stamp = []
+        for path in (APT_LISTS_DIR, DPKG_STATUS_FILE):
+            try:
+                stamp.append(os.stat(path).st_mtime_ns)
+            except OSError:
+                stamp.append(None)
+
+        return tuple(stamp)
+
+
+_package_cache = _PackageCache()
+
+
+def get_cache():
+    """Return a context manager giving the shared apt cache.
+
+    Don't keep references to the cache or its packages outside the context.
+    """
+    return _package_cache.get()
+
+
+def invalidate_cache():
+    """Reopen the shared apt cache the next time it is used."""
+    _package_cache.invalidate()
+
+
+def get_unavailable_packages(package_names):
+    """Return packages from the list that are not available to install."""
+    with get_cache() as cache:
+        return [
+            package_name for package_name in package_names
+            if package_name not in cache
+        ]
+
+
+def get_uninstalled_packages(package_names):
+    """Return packages from the list that are not installed."""
+    with get_cache() as cache:
+        return [
+            package_name for package_name in package_names
+            if package_name not in cache
+            or not cache[package_name].is_installed
+        ]
+
+
 def is_package_manager_busy():
     """Return whether a package manager is running."""
     try:
@@ -0,0 +1,116 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Record time and memory taken by each phase of startup and by each module.
+
+Profiling is disabled unless enabled with the --profile-startup option. When
+disabled, measuring is a no-op.
+
+Modules are imported and initialized in threads. For them, CPU time is that of
+the thread doing the work. RSS growth is that of the whole process and may
+include memory allocated by other modules at the same time.
+"""
+
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+_profiler = None
+
+
+class Profiler:
+    """Collect measurements of startup phases and modules."""
+
+    def __init__(self):
+        """Initialize the profiler."""
+        self.entries = []
+        self.started = time.monotonic()
+        self._process = psutil.Process()
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def measure(self, kind, name):
+        """Measure the time and memory taken by the enclosed block."""
+        # Phases include work done in threads, modules don't
+        cpu_time = time.process_time if kind == 'phase' else time.thread_time
+        start_rss = self._process.memory_info().rss
+        start_cpu = cpu_time()
+        start_wall = time.monotonic()
+        try:
+            yield
+        finally:
+            entry = {
+                'kind': kind,
+                'name': name,
+                'start': start_wall - self.started,
+                'wall': time.monotonic() - start_wall,
+                'cpu': cpu_time() - start_cpu,
+                'rss': self._process.memory_info().rss - start_rss,
+            }
+            with self._lock:
+                self.entries.append(entry)
+
+    def get_report(self):
+        """Return the collected data in a form suitable for JSON."""
+        return {
+            'total_wall': time.monotonic() - self.started,
+            'rss': self._process.memory_info().rss,
+            'entries': list(self.entries),
+        }
+
+    def format_table(self):
+        """Return the entries as text table, slowest first."""
+        lines = [
+            '{:<8} {:<32} {:>9} {:>9} {:>10}'.format(
+                'Kind', 'Name', 'Wall (s)', 'CPU (s)', 'RSS (KiB)')
+        ]
+        for entry in sorted(self.entries, key=lambda entry: -entry['wall']):
+            lines.append('{:<8} {:<32} {:>9.3f} {:>9.3f} {:>10}'.format(
+                entry['kind'], entry['name'], entry['wall'], entry['cpu'],
+                entry['rss'] // 1024))
+
+        return '\n'.join(lines)
+
+
+def enable():
+    """Start collecting measurements."""
+    global _profiler
+    _profiler = Profiler()
+
+
+def is_enabled():
+    """Return whether measurements are being collected."""
+    return _profiler is not None
+
+
+def measure(kind, name):
+    """Return a context manager measuring a phase or a module, if enabled."""
+    if _profiler is None:
+        return contextlib.nullcontext()
+
+    return _profiler.measure(kind, name)
+
+
+def write_report(file_path):
+    """Write the measurements as JSON to a file and as a table to console."""
+    if _profiler is None:
+        return
+
+    print(_profiler.format_table())
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(file_path)),
+                    exist_ok=True)
+        with open(file_path, 'w') as file_handle:
+            json.dump(_profiler.get_report(), file_handle, indent=4)
+    except OSError as exception:
+        logger.error('Unable to write startup profile to %s: %s', file_path,
+                     exception)
+        return
+
+    logger.info('Startup profile written to %s', file_path)
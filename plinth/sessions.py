@@ -0,0 +1,309 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Django session engine keeping sessions in memory backed by a single file.
+
+All sessions are kept in an in-memory index. Changes are appended to a journal
+file shortly after they happen (write-behind) so that many changes are written
+with a single write and fsync. When the journal grows much larger than the
+number of live sessions, it is compacted by rewriting only the live sessions.
+
+Expiry times are kept in a heap so that removing expired sessions only costs
+time proportional to the number of expired sessions.
+
+Sessions stored by Django's file session backend are imported on first use and
+the old session files are then removed.
+
+The store file is owned by a single process, the running FreedomBox service.
+"""
+
+import atexit
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.sessions.backends.base import CreateError, SessionBase
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait after a change before writing it to disk
+FLUSH_DELAY = 2
+
+# Journal is compacted when it has more entries than this many times the
+# number of live sessions
+COMPACT_RATIO = 2
+
+# Journal is never compacted when it has fewer entries than this
+COMPACT_MIN_ENTRIES = 1000
+
+_index = None
+_index_lock = threading.Lock()
+
+
+class SessionIndex:
+    """In-memory index of sessions with write-behind to a journal file."""
+
+    def __init__(self, path, flush_delay=FLUSH_DELAY):
+        """Load sessions from the journal at the given path."""
+        self.path = path
+        self.flush_delay = flush_delay
+        self._sessions = {}
+        self._expiries = []
+        self._pending = []
+        self._journal_entries = 0
+        self._timer = None
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self._load()
+
+    def __len__(self):
+        """Return the number of sessions in the index."""
+        return len(self._sessions)
+
+    def get(self, key):
+        """Return the encoded data of an unexpired session or None."""
+        with self._lock:
+            entry = self._sessions.get(key)
+
+        if entry is None or entry[1] <= time.time():
+            return None
+
+        return entry[0]
+
+    def set(self, key, data, expiry, must_create=False):
+        """Store encoded data of a session with its expiry timestamp.
+
+        Return False without storing if 'must_create' is set and an unexpired
+        session with the same key exists.
+
+        """
+        with self._lock:
+            if must_create and self.get(key) is not None:
+                return False
+
+            self._sessions[key] = (data, expiry)
+            heapq.heappush(self._expiries, (expiry, key))
+            self._add_pending([key, data, expiry])
+
+        return True
+
+    def delete(self, key):
+        """Remove a session."""
+        with self._lock:
+            if self._sessions.pop(key, None) is not None:
+                self._add_pending([key])
+
+    def clear_expired(self, now=None):
+        """Remove expired sessions looking at only the expired entries."""
+        now = time.time() if now is None else now
+        with self._lock:
+            while self._expiries and self._expiries[0][0] <= now:
+                expiry, key = heapq.heappop(self._expiries)
+                entry = self._sessions.get(key)
+                # Heap has stale entries for sessions saved again later
+                if entry and entry[1] == expiry:
+                    del self._sessions[key]
+                    self._add_pending([key])
+
+    def flush(self):
+        """Write pending changes to disk and compact journal if needed."""
+        with self._write_lock:
+            with self._lock:
+                self._timer = None
+                pending, self._pending = self._pending, []
+                compact = self._journal_entries + len(pending) > max(
+                    COMPACT_MIN_ENTRIES,
+                    COMPACT_RATIO * len(self._sessions))
+                if compact:
+                    entries = self._get_entries()
+                    self._expiries = [(expiry, key)
+                                      for key, _, expiry in entries]
+                    heapq.heapify(self._expiries)
+
+            if compact:
+                self._write(entries, replace=True)
+                self._journal_entries = len(entries)
+            elif pending:
+                self._write(pending, replace=False)
+                self._journal_entries += len(pending)
+
+    def import_session_files(self, directory, prefix):
+        """Import sessions stored by Django's file backend and remove them."""
+        try:
+            file_names = [
+                name for name in os.listdir(directory)
+                if name.startswith(prefix)
+            ]
+        except FileNotFoundError:
+            return
+
+        imported = []
+        for file_name in file_names:
+            file_path = os.path.join(directory, file_name)
+            try:
+                with open(file_path, 'r', encoding='ascii') as file_handle:
+                    data = file_handle.read()
+
+                # Data is encoded the same way by both the engines. Custom
+                # expiry is not used, so sessions expire a fixed time after
+                # they were last saved.
+                expiry = os.path.getmtime(file_path) + \
+                    settings.SESSION_COOKIE_AGE
+            except (OSError, ValueError) as exception:
+                logger.warning('Unable to import session file %s: %s',
+                               file_path, exception)
+                continue
+
+            if expiry > time.time():
+                self.set(file_name[len(prefix):], data, expiry)
+
+            imported.append(file_path)
+
+        if not imported:
+            return
+
+        # Remove old files only after the sessions are safely on disk
+        self.flush()
+        for file_path in imported:
+            os.remove(file_path)
+
+        logger.info('Imported %d session files', len(imported))
+
+    def _get_entries(self):
+        """Return journal entries for all the live sessions."""
+        return [[key, data, expiry]
+                for key, (data, expiry) in self._sessions.items()]
+
+    def _add_pending(self, entry):
+        """Queue a journal entry and schedule writing it."""
+        self._pending.append(entry)
+        if self._timer is None:
+            self._timer = threading.Timer(self.flush_delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _load(self):
+        """Read sessions from the journal file."""
+        try:
+            with open(self.path, 'r') as file_handle:
+                lines = file_handle.readlines()
+        except FileNotFoundError:
+            return
+
+        now = time.time()
+        invalid = False
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # Incomplete last line after a crash
+                logger.warning('Ignoring invalid entry in session store')
+                invalid = True
+                continue
+
+            if len(entry) == 1:
+                self._sessions.pop(entry[0], None)
+            elif entry[2] > now:
+                self._sessions[entry[0]] = (entry[1], entry[2])
+            else:
+                self._sessions.pop(entry[0], None)
+
+        self._journal_entries = len(lines)
+        self._expiries = [(expiry, key)
+                          for key, (_, expiry) in self._sessions.items()]
+        heapq.heapify(self._expiries)
+        if invalid:
+            # Don't append to a partially written line
+            entries = self._get_entries()
+            self._write(entries, replace=True)
+            self._journal_entries = len(entries)
+
+    def _write(self, entries, replace):
+        """Append entries to journal or replace it with the entries."""
+        lines = ''.join(json.dumps(entry) + '\n' for entry in entries)
+        path = self.path + '.new' if replace else self.path
+        flags = os.O_WRONLY | os.O_CREAT
+        flags |= os.O_TRUNC if replace else os.O_APPEND
+        # Create with restricted mode without changing umask of the process
+        with os.fdopen(os.open(path, flags, 0o600), 'w') as file_handle:
+            file_handle.write(lines)
+            file_handle.flush()
+            os.fsync(file_handle.fileno())
+
+        if replace:
+            os.replace(path, self.path)
+
+
+def get_index():
+    """Return the session index, loading it on first use."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = SessionIndex(settings.SESSION_STORE_FILE)
+            _index.import_session_files(settings.SESSION_FILE_PATH,
+                                        settings.SESSION_COOKIE_NAME)
+            atexit.register(_index.flush)
+
+    return _index
+
+
+class SessionStore(SessionBase):
+    """Session store using the in-memory session index."""
+
+    def __init__(self, session_key=None):
+        """Initialize the session store."""
+        self._index = get_index()
+        super().__init__(session_key)
+
+    def load(self):
+        """Return the data of the session."""
+        data = self._index.get(self.session_key) if self.session_key else None
+        if data is None:
+            self._session_key = None
+            return {}
+
+        return self.decode(data)
+
+    def exists(self, session_key):
+        """Return whether a session with given key exists."""
+        return self._index.get(session_key) is not None
+
+    def create(self):
+        """Create a new session with a unique key."""
+        while True:
+            self._session_key = self._get_new_session_key()
+            try:
+                self.save(must_create=True)
+            except CreateError:
+                continue
+
+            self.modified = True
+            return
+
+    def save(self, must_create=False):
+        """Save the session data."""
+        if self.session_key is None:
+            return self.create()
+
+        data = self.encode(self._get_session(no_load=must_create))
+        expiry = time.time() + self.get_expiry_age()
+        if not self._index.set(self.session_key, data, expiry, must_create):
+            raise CreateError
+
+    def delete(self, session_key=None):
+        """Remove the session."""
+        if session_key is None:
+            if self.session_key is None:
+                return
+
+            session_key = self.session_key
+
+        self._index.delete(session_key)
+
+    @classmethod
+    def clear_expired(cls):
+        """Remove expired sessions."""
+        get_index().clear_expired()
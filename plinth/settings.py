@@ -54,7 +54,12 @@ AXES_RESET_ON_SUCCESS = True  # Only used with axes >= 4.4.3
 
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'plinth',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+        }
     }
 }
 
@@ -139,10 +144,13 @@ SECURE_CONTENT_TYPE_NOSNIFF = True
 # Overridden based configuration key secure_proxy_ssl_header
 SECURE_PROXY_SSL_HEADER = None
 
-SESSION_ENGINE = 'django.contrib.sessions.backends.file'
+SESSION_ENGINE = 'plinth.sessions'
 
+# Sessions stored here by the old file backend are imported on startup
 SESSION_FILE_PATH = '/var/lib/plinth/sessions'
 
+SESSION_STORE_FILE = '/var/lib/plinth/sessions.json'
+
 # Overridden based on configuration key server_dir
 STATIC_URL = '/plinth/static/'
 
@@ -7,9 +7,8 @@ import logging
 import os
 import threading
 import time
-from collections import defaultdict
-
-import apt
+from collections import OrderedDict, defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 import plinth
 from plinth.signals import post_setup
@@ -25,6 +24,13 @@ _is_shutting_down = False
 
 _force_upgrader = None
 
+# Maximum number of modules setup at the same time
+MAX_WORKERS = 8
+
+# Setup versions of all modules, loaded from database on first use
+_setup_versions = None
+_setup_versions_lock = threading.Lock()
+
 
 class Helper(object):
     """Helper routines for modules to show progress."""
@@ -36,6 +42,7 @@ class Helper(object):
         self.is_finished = None
         self.exception = None
         self.allow_install = True
+        self.installed_packages = set()
 
     def run_in_thread(self):
         """Execute the setup process in a thread."""
@@ -87,17 +94,25 @@ class Helper(object):
         finally:
             self.is_finished = True
             self.current_operation = None
+            self.installed_packages = set()
 
     def install(self, package_names, skip_recommends=False,
                 force_configuration=None):
         """Install a set of packages marking progress."""
         if self.allow_install is False:
             # Raise error if packages are not already installed.
-            cache = apt.Cache()
-            for package_name in package_names:
-                if not cache[package_name].is_installed:
-                    raise PackageNotInstalledError(package_name)
+            for package_name in package.get_uninstalled_packages(
+                    package_names):
+                raise PackageNotInstalledError(package_name)
+
+            return
 
+        # Packages just installed along with other modules need no install
+        package_names = [
+            package_name for package_name in package_names
+            if package_name not in self.installed_packages
+        ]
+        if not package_names:
             return
 
         logger.info('Running install for module - %s, packages - %s',
@@ -138,21 +153,17 @@ class Helper(object):
 
     def get_setup_version(self):
         """Return the setup version of a module."""
-        # XXX: Optimize version gets
-        from . import models
-
-        try:
-            module_entry = models.Module.objects.get(pk=self.module_name)
-            return module_entry.setup_version
-        except models.Module.DoesNotExist:
-            return 0
+        return _get_setup_versions().get(self.module_name, 0)
 
     def set_setup_version(self, version):
         """Set a module's setup version."""
         from . import models
 
-        models.Module.objects.update_or_create(
-            pk=self.module_name, defaults={'setup_version': version})
+        with _setup_versions_lock:
+            models.Module.objects.update_or_create(
+                pk=self.module_name, defaults={'setup_version': version})
+            if _setup_versions is not None:
+                _setup_versions[self.module_name] = version
 
     def has_unavailable_packages(self):
         """Find if any of the packages managed by the module are not available.
@@ -161,18 +172,26 @@ class Helper(object):
         Returns None if it cannot be reliably determined whether the
         packages are available or not.
         """
-        APT_LISTS_DIR = '/var/lib/apt/lists/'
         num_files = len([
-            name for name in os.listdir(APT_LISTS_DIR)
-            if os.path.isfile(os.path.join(APT_LISTS_DIR, name))
+            name for name in os.listdir(package.APT_LISTS_DIR)
+            if os.path.isfile(os.path.join(package.APT_LISTS_DIR, name))
         ])
         if num_files < 2:  # not counting the lock file
             return None
-        cache = apt.Cache()
         managed_pkgs = _get_module_managed_packages(self.module)
-        unavailable_pkgs = (pkg_name for pkg_name in managed_pkgs
-                            if pkg_name not in cache)
-        return any(unavailable_pkgs)
+        return bool(package.get_unavailable_packages(managed_pkgs))
+
+
+def _get_setup_versions():
+    """Return setup versions of all modules reading them in one query."""
+    global _setup_versions
+    with _setup_versions_lock:
+        if _setup_versions is None:
+            from . import models
+            _setup_versions = dict(
+                models.Module.objects.values_list('name', 'setup_version'))
+
+        return _setup_versions
 
 
 def init(module_name, module):
@@ -195,6 +214,7 @@ def setup_modules(module_list=None, essential=False, allow_install=True):
     logger.info(
         'Running setup for modules, essential - %s, '
         'selected modules - %s', essential, module_list)
+    modules = OrderedDict()
     for module_name, module in plinth.module_loader.loaded_modules.items():
         if essential and not _is_module_essential(module):
             continue
@@ -202,7 +222,109 @@ def setup_modules(module_list=None, essential=False, allow_install=True):
         if module_list and module_name not in module_list:
             continue
 
-        module.setup_helper.run(allow_install=allow_install)
+        modules[module_name] = module
+
+    start_time = time.monotonic()
+    with package.batch():
+        if allow_install:
+            _install_packages_together(modules)
+
+        _run_in_dependency_order(
+            modules, lambda module: module.setup_helper.run(
+                allow_install=allow_install))
+    logger.info('Setup of %d modules took %.1f seconds', len(modules),
+                time.monotonic() - start_time)
+
+
+def _install_packages_together(modules):
+    """Install packages of all modules needing setup in one apt-get run.
+
+    Setup of each module later installs only the packages that could not be
+    installed here. Modules that must run steps before installing, such as
+    preseeding debconf, or that install with options other than the defaults
+    set install_before_setup = False and install during their own setup.
+
+    """
+    helpers = []
+    transactions = []
+    for module_name, module in modules.items():
+        helper = module.setup_helper
+        if helper.current_operation or helper.get_state() == 'up-to-date' \
+           or not getattr(module, 'install_before_setup', True):
+            continue
+
+        package_names = package.get_uninstalled_packages(
+            _get_module_managed_packages(module))
+        if not package_names:
+            continue
+
+        helpers.append(helper)
+        transactions.append(package.Transaction(module_name, package_names))
+
+    if len(transactions) < 2:
+        return
+
+    for helper, transaction in zip(helpers, transactions):
+        helper.current_operation = {
+            'step': 'install',
+            'transaction': transaction,
+        }
+
+    try:
+        failed = package.install_together(transactions)
+    finally:
+        for helper in helpers:
+            helper.current_operation = None
+
+    for helper, transaction in zip(helpers, transactions):
+        if transaction not in failed:
+            helper.installed_packages = set(transaction.package_names)
+
+
+def _run_in_dependency_order(modules, function):
+    """Call a function on modules in threads, each after its dependencies.
+
+    Modules are started in the given order as soon as all the modules they
+    depend on, among the given modules, are done. Package installs and other
+    package manager operations are still run one at a time. If a module
+    fails, no more modules are started and the first error is raised after
+    the running ones are done.
+
+    """
+    pending = OrderedDict(modules)
+    done = set()
+    running = {}
+    error = None
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        while pending or running:
+            for module_name, module in list(pending.items()):
+                dependencies = [
+                    dependency for dependency in getattr(module, 'depends', [])
+                    if dependency in modules
+                ]
+                if all(dependency in done for dependency in dependencies):
+                    del pending[module_name]
+                    future = executor.submit(function, module)
+                    running[future] = module_name
+
+            if not running:
+                logger.error('Unable to setup modules due to dependencies - '
+                             '%s', list(pending))
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                module_name = running.pop(future)
+                try:
+                    future.result()
+                except Exception as exception:
+                    error = error or exception
+                    pending.clear()
+                else:
+                    done.add(module_name)
+
+    if error:
+        raise error
 
 
 def list_dependencies(module_list=None, essential=False):
@@ -252,8 +374,11 @@ def _run_first_setup():
     """Run setup on essential modules on first setup."""
     global is_first_setup_running
     is_first_setup_running = True
+    start_time = time.monotonic()
     # TODO When it errors out, show error in the UI
     run_setup_on_modules(None, allow_install=False)
+    logger.info('First setup took %.1f seconds',
+                time.monotonic() - start_time)
     is_first_setup_running = False
 
 
@@ -509,12 +634,10 @@ class ForceUpgrader():
         if not packages:  # No packages to upgrade
             return {}
 
-        package_names = [package.name for package in packages]
-        logger.info('Packages available for upgrade: %s',
-                    ', '.join(package_names))
+        logger.info('Packages available for upgrade: %s', ', '.join(packages))
 
         managed_packages, package_apps_map = self._filter_managed_packages(
-            package_names)
+            packages)
         if not managed_packages:
             return {}
 
@@ -532,9 +655,12 @@ class ForceUpgrader():
 
     @staticmethod
     def _get_list_of_upgradable_packages():
-        """Return list of packages that can be upgraded."""
-        cache = apt.cache.Cache()
-        return [package for package in cache if package.is_upgradable]
+        """Return names of packages that can be upgraded."""
+        with package.get_cache() as cache:
+            return [
+                cache_package.name for cache_package in cache
+                if cache_package.is_upgradable
+            ]
 
     @staticmethod
     def _filter_managed_packages(packages):
@@ -11,7 +11,7 @@ AXES_ENABLED = False
 
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.dummy.DummyCache'
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'
     }
 }
 
@@ -0,0 +1,136 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Test module for privileged action daemon.
+"""
+
+import os
+import pathlib
+import shutil
+import socket
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from plinth import action_daemon, cfg
+from plinth.actions import superuser_run
+from plinth.errors import ActionError
+
+PYTHON_ACTION = '''#!/usr/bin/python3
+import sys
+if sys.argv[1] == 'fail':
+    print('failure output', file=sys.stderr)
+    sys.exit(3)
+
+print('args:', ' '.join(sys.argv[1:]))
+print('input:', sys.stdin.read())
+'''
+
+
+@pytest.fixture(name='actions_dir')
+def fixture_actions_dir(tmp_path):
+    """Setup a temporary actions directory with a few actions."""
+    old_actions_dir = cfg.actions_dir
+    cfg.actions_dir = str(tmp_path)
+    shutil.copy('/bin/echo', str(tmp_path))
+    action = pathlib.Path(tmp_path) / 'python-action'
+    action.write_text(PYTHON_ACTION)
+    action.chmod(0o755)
+    yield tmp_path
+    cfg.actions_dir = old_actions_dir
+
+
+@pytest.fixture(name='server')
+def fixture_server(actions_dir, tmp_path_factory):
+    """Run the daemon on a temporary socket in a thread."""
+    socket_path = str(tmp_path_factory.mktemp('socket') / 'socket')
+    server = action_daemon.Server(socket_path, [os.getuid()])
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    with patch('plinth.action_daemon.SOCKET_PATH', socket_path):
+        yield server
+
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+@pytest.mark.usefixtures('server')
+def test_python_action_in_process():
+    """Test that python actions get options and input, return output."""
+    output = superuser_run('python-action', ['a', 'b c', ';'], input=b'hi')
+    assert output == 'args: a b c ;\ninput: hi\n'
+
+
+@pytest.mark.usefixtures('server')
+def test_python_action_error():
+    """Test that failing actions raise ActionError with output and error."""
+    with pytest.raises(ActionError) as exception:
+        superuser_run('python-action', ['fail'])
+
+    assert exception.value.args == ('python-action', '', 'failure output\n')
+
+
+@pytest.mark.usefixtures('server')
+def test_non_python_action():
+    """Test that actions which are not python scripts are executed."""
+    assert superuser_run('echo', ['hello', 'world']) == 'hello world\n'
+
+
+@pytest.mark.usefixtures('server')
+def test_daemon_validates_action():
+    """Test that the daemon does not run actions outside actions directory."""
+    returncode, output, error = action_daemon.run('../echo', ['hi'])
+    assert returncode == 1
+    assert output == b''
+    assert b'Action cannot contain' in error
+
+
+@pytest.mark.usefixtures('actions_dir')
+def test_fallback_when_daemon_unavailable(tmp_path):
+    """Test that sudo is used when the daemon is not running."""
+    socket_path = str(tmp_path / 'missing-socket')
+    with patch('plinth.action_daemon.SOCKET_PATH', socket_path), \
+            patch('plinth.actions.subprocess.Popen') as popen:
+        popen.return_value.communicate.return_value = (b'output', b'')
+        popen.return_value.returncode = 0
+        assert superuser_run('echo', ['hi']) == 'output'
+
+    assert popen.call_args[0][0][:2] == ['sudo', '-n']
+
+
+def test_peer_rejected(actions_dir, tmp_path_factory):
+    """Test that connections from other users are not served."""
+    socket_path = str(tmp_path_factory.mktemp('socket') / 'socket')
+    server = action_daemon.Server(socket_path, [os.getuid() + 1])
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        with pytest.raises(action_daemon.DaemonUnavailable):
+            action_daemon.run('echo', ['hi'], socket_path=socket_path)
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+def test_daemon_fails_after_request(tmp_path):
+    """Test that failure of daemon after receiving request is an error."""
+    socket_path = str(tmp_path / 'socket')
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    listener.listen(1)
+
+    def serve():
+        connection, _ = listener.accept()
+        action_daemon._receive_message(connection)
+        connection.close()
+
+    thread = threading.Thread(target=serve)
+    thread.start()
+    try:
+        with pytest.raises(ActionError):
+            action_daemon.run('echo', ['hi'], socket_path=socket_path)
+    finally:
+        thread.join()
+        listener.close()
@@ -0,0 +1,74 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Test module for utilities used by actions.
+"""
+
+import fcntl
+from unittest.mock import patch
+
+import pytest
+
+from plinth import action_utils
+
+
+@pytest.fixture(name='lock_files')
+def fixture_lock_files(tmp_path):
+    """Keep lock files in a temporary directory."""
+    paths = {
+        name: str(tmp_path / name)
+        for name in ['WEBSERVER_LOCK_FILE', 'UWSGI_LOCK_FILE']
+    }
+    with patch.multiple(action_utils, **paths):
+        yield paths
+
+
+def _is_locked(path):
+    """Return whether another holder has the lock file."""
+    with open(path, 'w') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return False
+
+
+@patch('subprocess.check_output')
+@patch('plinth.action_utils.webserver_is_enabled')
+def test_webserver_lock(is_enabled, check_output, lock_files):
+    """Test that Apache changes of several actions don't overlap."""
+    path = lock_files['WEBSERVER_LOCK_FILE']
+    is_enabled.return_value = False
+    locked = []
+    with patch('plinth.action_utils.service_reload',
+               lambda _: locked.append(_is_locked(path))):
+        assert action_utils.webserver_enable('test') == 'reload'
+        with action_utils.WebserverChange() as webserver_change:
+            webserver_change.enable('test')
+            assert not _is_locked(path)
+
+    check_output.assert_called_with(['a2enconf', 'test'])
+    assert locked == [True, True]
+    assert not _is_locked(path)
+
+
+@patch('plinth.action_utils.service_enable')
+@patch('plinth.action_utils.service_stop')
+def test_uwsgi_lock(service_stop, service_enable, lock_files, tmp_path):
+    """Test that uwsgi configuration changes don't overlap."""
+    path = lock_files['UWSGI_LOCK_FILE']
+    (tmp_path / 'test.ini').touch()
+    locked = []
+    with patch('plinth.action_utils.UWSGI_ENABLED_PATH',
+               str(tmp_path / '{config_name}.enabled')), \
+            patch('plinth.action_utils.UWSGI_AVAILABLE_PATH',
+                  str(tmp_path / '{config_name}.ini')), \
+            patch('plinth.action_utils.service_start',
+                  lambda _: locked.append(_is_locked(path))):
+        action_utils.uwsgi_enable('test')
+        assert action_utils.uwsgi_is_enabled('test')
+        action_utils.uwsgi_disable('test')
+        assert not action_utils.uwsgi_is_enabled('test')
+
+    assert locked == [True, True]
@@ -0,0 +1,101 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Test module for caching values computed by apps.
+"""
+
+from unittest.mock import Mock
+
+import pytest
+from django.core.cache import cache as django_cache
+
+from plinth import cache
+
+
+@pytest.fixture(autouse=True)
+def fixture_clear_cache():
+    """Start each test with an empty cache."""
+    django_cache.clear()
+    yield
+    django_cache.clear()
+
+
+@pytest.fixture(name='getter')
+def fixture_getter():
+    """Return a mock and a cached function calling it."""
+    mock = Mock(side_effect=lambda *args: {'value': len(mock.mock_calls)})
+
+    @cache.cached('test-key', tags=['test-tag'])
+    def getter(*args):
+        return mock(*args)
+
+    getter.mock = mock
+    return getter
+
+
+def test_cached(getter):
+    """Test that values are computed only once."""
+    assert getter() == {'value': 1}
+    assert getter() == {'value': 1}
+    assert getter.mock.call_count == 1
+
+
+def test_cached_arguments(getter):
+    """Test that arguments are part of the key."""
+    assert getter('a') == {'value': 1}
+    assert getter('b') == {'value': 2}
+    assert getter('a') == {'value': 1}
+
+
+def test_cached_exception_not_stored():
+    """Test that exceptions are not cached."""
+    mock = Mock(side_effect=[ValueError, 'value'])
+
+    @cache.cached('test-exception')
+    def getter():
+        return mock()
+
+    with pytest.raises(ValueError):
+        getter()
+
+    assert getter() == 'value'
+
+
+def test_invalidate(getter):
+    """Test that invalidating a tag discards cached values."""
+    getter()
+    cache.invalidate('test-other-tag')
+    assert getter() == {'value': 1}
+
+    cache.invalidate('test-tag')
+    assert getter() == {'value': 2}
+
+
+def test_default_tag():
+    """Test that key is used as tag when no tags are given."""
+    mock = Mock(side_effect=[1, 2])
+
+    @cache.cached('test-default-tag')
+    def getter():
+        return mock()
+
+    assert getter() == 1
+    cache.invalidate('test-default-tag')
+    assert getter() == 2
+
+
+def test_request_memo(getter):
+    """Test that values are memoized within a request."""
+    cache._on_request_started()
+    try:
+        value = getter()
+        value['value'] = 'modified'
+        django_cache.clear()
+        assert getter() == {'value': 1}
+
+        cache.invalidate('test-tag')
+        assert getter() == {'value': 2}
+    finally:
+        cache._on_request_finished()
+
+    django_cache.clear()
+    assert getter() == {'value': 3}
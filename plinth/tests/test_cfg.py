@@ -102,6 +102,62 @@ def test_read_config_file_with_missing_options(test_config_dir):
         cfg.read(CONFIG_FILE_WITH_MISSING_OPTIONS, test_config_dir)
 
 
+def test_read_optional_options(test_config_dir, test_config_file, tmp_path):
+    """Verify that optional options are read and keep defaults if missing."""
+    cfg.read(test_config_file, test_config_dir)
+    assert cfg.export_compression == 'pigz'
+    assert cfg.export_compression_level is None
+
+    parser = configparser.ConfigParser(interpolation=None)
+    parser.read(test_config_file)
+    if not parser.has_section('Backups'):
+        parser.add_section('Backups')
+
+    parser.set('Backups', 'export_compression', 'zstd')
+    parser.set('Backups', 'export_compression_level', '9')
+    config_path = tmp_path / 'plinth.config'
+    with config_path.open('w') as config_file:
+        parser.write(config_file)
+
+    try:
+        cfg.read(str(config_path), test_config_dir)
+        assert cfg.export_compression == 'zstd'
+        assert cfg.export_compression_level == 9
+    finally:
+        cfg.export_compression = 'pigz'
+        cfg.export_compression_level = None
+
+
+@pytest.mark.parametrize('compression, level, expected', [
+    ('xz', '6', ('pigz', 6)),
+    ('gzip', '10', ('gzip', None)),
+    ('zstd', '0', ('zstd', None)),
+    ('zstd', 'high', ('zstd', None)),
+])
+def test_read_invalid_export_compression(test_config_dir, test_config_file,
+                                         tmp_path, compression, level,
+                                         expected):
+    """Verify that invalid compression options are replaced by defaults."""
+    parser = configparser.ConfigParser(interpolation=None)
+    parser.read(test_config_file)
+    if not parser.has_section('Backups'):
+        parser.add_section('Backups')
+
+    parser.set('Backups', 'export_compression', compression)
+    parser.set('Backups', 'export_compression_level', level)
+    config_path = tmp_path / 'plinth.config'
+    with config_path.open('w') as config_file:
+        parser.write(config_file)
+
+    try:
+        cfg.read(str(config_path), test_config_dir)
+        assert (cfg.export_compression,
+                cfg.export_compression_level) == expected
+    finally:
+        cfg.export_compression = 'pigz'
+        cfg.export_compression_level = None
+
+
 def compare_configurations(parser):
     """Compare two sets of configuration values."""
     # Note that the count of items within each section includes the number
@@ -3,14 +3,17 @@
 Test module for component managing system daemons and other systemd units.
 """
 
+import collections
 import socket
 from unittest.mock import Mock, call, patch
 
+import psutil
 import pytest
 
 from plinth.app import App, FollowerComponent
-from plinth.daemon import (Daemon, app_is_running, diagnose_netcat,
-                           diagnose_port_listening)
+from plinth.daemon import (Daemon, SocketSnapshot, app_is_running,
+                           diagnose_netcat, diagnose_port_listening,
+                           get_socket_snapshot)
 
 
 @pytest.fixture(name='daemon')
@@ -133,21 +136,37 @@ def test_app_is_running(service_is_running):
     assert app_is_running(app)
 
 
+Connection = collections.namedtuple(
+    'Connection', ['fd', 'family', 'type', 'laddr', 'raddr', 'status', 'pid'])
+
+
+def _connection(type_, family, laddr, raddr=(), status=psutil.CONN_NONE):
+    """Return an entry like the ones returned by psutil.net_connections()."""
+    return Connection(-1, family, type_, laddr, raddr, status, None)
+
+
+CONNECTIONS = [
+    _connection(socket.SOCK_STREAM, socket.AF_INET, ('0.0.0.0', 1234),
+                status=psutil.CONN_LISTEN),
+    _connection(socket.SOCK_STREAM, socket.AF_INET, ('0.0.0.0', 2345),
+                ('1.1.1.1', 80), status=psutil.CONN_ESTABLISHED),
+    _connection(socket.SOCK_DGRAM, socket.AF_INET, ('0.0.0.0', 3456)),
+    _connection(socket.SOCK_DGRAM, socket.AF_INET, ('0.0.0.0', 4567),
+                ('1.1.1.1', 53)),
+    _connection(socket.SOCK_STREAM, socket.AF_INET6, ('::1', 5678),
+                status=psutil.CONN_LISTEN),
+    _connection(socket.SOCK_STREAM, socket.AF_INET6, ('::', 6789),
+                status=psutil.CONN_LISTEN),
+    _connection(socket.SOCK_DGRAM, socket.AF_INET6, ('::1', 5678)),
+    _connection(socket.SOCK_DGRAM, socket.AF_INET6, ('::', 6789)),
+]
+
+
+@patch('plinth.daemon._snapshot', None)
 @patch('psutil.net_connections')
 def test_diagnose_port_listening(connections):
     """Test running port listening diagnostics test."""
-    connections.return_value = [
-        Mock(status='LISTEN', laddr=('0.0.0.0', 1234), family=socket.AF_INET),
-        Mock(status='ESTABLISHED', laddr=('0.0.0.0', 2345),
-             family=socket.AF_INET),
-        Mock(raddr=(), laddr=('0.0.0.0', 3456), family=socket.AF_INET),
-        Mock(raddr=('1.1.1.1', 53), laddr=('0.0.0.0', 4567),
-             family=socket.AF_INET),
-        Mock(status='LISTEN', laddr=('::1', 5678), familiy=socket.AF_INET6),
-        Mock(status='LISTEN', laddr=('::', 6789), familiy=socket.AF_INET6),
-        Mock(raddr=(), laddr=('::1', 5678), familiy=socket.AF_INET6),
-        Mock(raddr=(), laddr=('::', 6789), familiy=socket.AF_INET6),
-    ]
+    connections.return_value = CONNECTIONS
 
     # Check that message is correct
     results = diagnose_port_listening(1234)
@@ -161,27 +180,14 @@ def test_diagnose_port_listening(connections):
     results = diagnose_port_listening(4321, 'tcp', '0.0.0.0')
     assert results == ['Listening on tcp port 0.0.0.0:4321', 'failed']
 
-    # Check if psutil call is being made with right argument
-    results = diagnose_port_listening(1234, 'tcp')
-    connections.assert_called_with('tcp')
-    results = diagnose_port_listening(1234, 'tcp4')
-    connections.assert_called_with('tcp')
-    results = diagnose_port_listening(1234, 'tcp6')
-    connections.assert_called_with('tcp6')
-    results = diagnose_port_listening(3456, 'udp')
-    connections.assert_called_with('udp')
-    results = diagnose_port_listening(3456, 'udp4')
-    connections.assert_called_with('udp')
-    results = diagnose_port_listening(3456, 'udp6')
-    connections.assert_called_with('udp6')
-
     # TCP
     assert diagnose_port_listening(1234)[1] == 'passed'
     assert diagnose_port_listening(1000)[1] == 'failed'
     assert diagnose_port_listening(2345)[1] == 'failed'
     assert diagnose_port_listening(1234, 'tcp', '0.0.0.0')[1] == 'passed'
     assert diagnose_port_listening(1234, 'tcp', '1.1.1.1')[1] == 'failed'
-    assert diagnose_port_listening(1234, 'tcp6')[1] == 'passed'
+    assert diagnose_port_listening(1234, 'tcp6')[1] == 'failed'
+    assert diagnose_port_listening(5678, 'tcp6')[1] == 'passed'
     assert diagnose_port_listening(1234, 'tcp4')[1] == 'passed'
     assert diagnose_port_listening(6789, 'tcp4')[1] == 'passed'
     assert diagnose_port_listening(5678, 'tcp4')[1] == 'failed'
@@ -192,11 +198,37 @@ def test_diagnose_port_listening(connections):
     assert diagnose_port_listening(4567, 'udp')[1] == 'failed'
     assert diagnose_port_listening(3456, 'udp', '0.0.0.0')[1] == 'passed'
     assert diagnose_port_listening(3456, 'udp', '1.1.1.1')[1] == 'failed'
-    assert diagnose_port_listening(3456, 'udp6')[1] == 'passed'
+    assert diagnose_port_listening(3456, 'udp6')[1] == 'failed'
+    assert diagnose_port_listening(6789, 'udp6')[1] == 'passed'
     assert diagnose_port_listening(3456, 'udp4')[1] == 'passed'
     assert diagnose_port_listening(6789, 'udp4')[1] == 'passed'
     assert diagnose_port_listening(5678, 'udp4')[1] == 'failed'
 
+    # Socket table is read only once for all the checks
+    connections.assert_called_once_with('inet')
+
+
+@patch('plinth.daemon._snapshot', None)
+@patch('psutil.net_connections')
+def test_socket_snapshot_expiry(connections):
+    """Test that socket table is read again when snapshot is old."""
+    connections.return_value = CONNECTIONS
+    snapshot = get_socket_snapshot()
+    assert get_socket_snapshot() is snapshot
+    assert connections.call_count == 1
+
+    with patch('time.monotonic', return_value=snapshot.time + 10):
+        assert get_socket_snapshot() is not snapshot
+
+    assert connections.call_count == 2
+
+
+def test_socket_snapshot_invalid_kind():
+    """Test that unknown kinds of ports are rejected."""
+    snapshot = SocketSnapshot(CONNECTIONS)
+    with pytest.raises(ValueError):
+        snapshot.is_listening(1234, 'unix')
+
 
 @patch('subprocess.Popen')
 def test_diagnose_netcat(popen):
@@ -205,7 +237,8 @@ def test_diagnose_netcat(popen):
     result = diagnose_netcat('test-host', 3300, input='test-input')
     assert result == ['Connect to test-host:3300', 'passed']
     assert popen.mock_calls[1][1] == (['nc', 'test-host', '3300'], )
-    assert popen.mock_calls[2] == call().communicate(input=b'test-input')
+    assert popen.mock_calls[2] == call().communicate(input=b'test-input',
+                                                     timeout=30)
 
     result = diagnose_netcat('test-host', 3300, input='test-input',
                              negate=True)
@@ -218,3 +251,30 @@ def test_diagnose_netcat(popen):
     result = diagnose_netcat('test-host', 3300, input='test-input',
                              negate=True)
     assert result == ['Cannot connect to test-host:3300', 'passed']
+
+
+@patch('plinth.unit_state.get_state')
+def test_is_enabled_from_unit_state(get_state, daemon):
+    """Test that enabled check uses unit state snapshot when available."""
+    get_state.return_value = ('active', 'enabled')
+    assert daemon.is_enabled()
+    get_state.assert_has_calls([call('test-unit')])
+
+    get_state.return_value = ('active', 'enabled-runtime')
+    assert daemon.is_enabled()
+    daemon.strict_check = True
+    assert not daemon.is_enabled()
+
+    get_state.return_value = ('inactive', None)
+    daemon.strict_check = False
+    assert not daemon.is_enabled()
+
+
+@patch('plinth.unit_state.get_state')
+def test_is_running_from_unit_state(get_state, daemon):
+    """Test that running check uses unit state snapshot when available."""
+    get_state.return_value = ('active', 'enabled')
+    assert daemon.is_running()
+
+    get_state.return_value = ('failed', 'enabled')
+    assert not daemon.is_running()
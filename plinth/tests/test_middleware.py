@@ -51,36 +51,34 @@ class TestSetupMiddleware:
 
     @staticmethod
     @patch('plinth.module_loader.loaded_modules')
-    @patch('django.urls.resolve')
     @patch('django.urls.reverse', return_value='users:login')
-    def test_module_is_up_to_date(reverse, resolve, loaded_modules, middleware,
+    def test_module_is_up_to_date(reverse, loaded_modules, middleware,
                                   kwargs):
         """Test that none is returned when module is up-to-date."""
-        resolve.return_value.namespaces = ['mockapp']
         module = Mock()
         module.setup_helper.is_finished = None
         module.setup_helper.get_state.return_value = 'up-to-date'
         loaded_modules.__getitem__.return_value = module
 
         request = RequestFactory().get('/plinth/mockapp')
+        request.resolver_match = Mock(namespaces=['mockapp'])
         response = middleware.process_view(request, **kwargs)
         assert response is None
 
     @staticmethod
     @patch('plinth.views.SetupView')
     @patch('plinth.module_loader.loaded_modules')
-    @patch('django.urls.resolve')
     @patch('django.urls.reverse', return_value='users:login')
-    def test_module_view(reverse, resolve, loaded_modules, setup_view,
-                         middleware, kwargs):
+    def test_module_view(reverse, loaded_modules, setup_view, middleware,
+                         kwargs):
         """Test that only registered users can access the setup view."""
-        resolve.return_value.namespaces = ['mockapp']
         module = Mock()
         module.setup_helper.is_finished = None
         loaded_modules.__getitem__.return_value = module
         view = Mock()
         setup_view.as_view.return_value = view
         request = RequestFactory().get('/plinth/mockapp')
+        request.resolver_match = Mock(namespaces=['mockapp'])
 
         # Verify that anonymous users cannot access the setup page
         request.user = AnonymousUser()
@@ -96,12 +94,10 @@ class TestSetupMiddleware:
     @staticmethod
     @patch('django.contrib.messages.success')
     @patch('plinth.module_loader.loaded_modules')
-    @patch('django.urls.resolve')
     @patch('django.urls.reverse', return_value='users:login')
-    def test_install_result_collection(reverse, resolve, loaded_modules,
+    def test_install_result_collection(reverse, loaded_modules,
                                        messages_success, middleware, kwargs):
         """Test that module installation result is collected properly."""
-        resolve.return_value.namespaces = ['mockapp']
         module = Mock()
         module.is_essential = False
         module.setup_helper.is_finished = True
@@ -110,6 +106,7 @@ class TestSetupMiddleware:
         loaded_modules.__getitem__.return_value = module
 
         request = RequestFactory().get('/plinth/mockapp')
+        request.resolver_match = Mock(namespaces=['mockapp'])
         response = middleware.process_view(request, **kwargs)
 
         assert response is None
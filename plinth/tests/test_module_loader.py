@@ -0,0 +1,167 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Test module for loading modules and finding the module that handles a URL.
+"""
+
+import collections
+import functools
+import sys
+import time
+import types
+from unittest.mock import Mock, patch
+
+import pytest
+from django.conf.urls import include, url
+from django.http import HttpResponse
+
+from plinth import module_loader
+from plinth.app import App
+from plinth.signals import domain_added
+
+
+def _view(request):
+    return HttpResponse()
+
+
+URLPATTERNS = [
+    url(r'^$', _view, name='index'),
+    url(r'^apps/$', _view, name='apps'),
+    url(r'locked/$', _view, name='locked_out'),
+    url(r'', include(([
+        url(r'^apps/app1/$', _view, name='index'),
+        url(r'^apps/app1/(?P<name>\w+)/$', _view, name='edit'),
+    ], 'app1'))),
+    url(r'', include(([
+        url(r'^apps/app2/$', _view, name='index'),
+        url(r'^(?P<version>[0-9]+)/app2/$', _view, name='version'),
+    ], 'app2'))),
+    url(r'', include(([
+        url(r'^apps/app1/other/$', _view, name='other'),
+        url(r'^sys/app3/', include(([
+            url(r'^$', _view, name='index'),
+        ], 'app3-nested'))),
+    ], 'app3'))),
+]
+
+
+def test_get_module_name_for_path():
+    """Test that paths are mapped to modules the same way Django does."""
+    module_loader._build_url_prefix_map(URLPATTERNS)
+    assert module_loader.get_module_name_for_path('/') is None
+    assert module_loader.get_module_name_for_path('/apps/') is None
+    assert module_loader.get_module_name_for_path('/x/locked/') is None
+    assert module_loader.get_module_name_for_path('/apps/app1/') == 'app1'
+    assert module_loader.get_module_name_for_path('/apps/app1/x/') == 'app1'
+    assert module_loader.get_module_name_for_path('/apps/app1/other/') == \
+        'app1'
+    assert module_loader.get_module_name_for_path('/apps/app2/') == 'app2'
+    assert module_loader.get_module_name_for_path('/12/app2/') == 'app2'
+    assert module_loader.get_module_name_for_path('/sys/app3/') == 'app3'
+    assert module_loader.get_module_name_for_path('/sys/app3/x') is None
+    assert module_loader.get_module_name_for_path('/apps/app4/') is None
+
+
+def test_get_url_prefix():
+    """Test finding the literal prefix of URL patterns."""
+    def prefix(regex):
+        return module_loader._get_url_prefix(url(regex, _view))
+
+    assert prefix(r'') == ''
+    assert prefix(r'^$') == ''
+    assert prefix(r'apps/tor/$') == ''
+    assert prefix(r'^apps/tor/$') == 'apps/tor/'
+    assert prefix(r'^apps/tor') == 'apps/'
+    assert prefix(r'^apps/tor/(?P<name>\w+)/$') == 'apps/tor/'
+    assert prefix(r'^apps/t.r/$') == 'apps/'
+
+
+def _patch_modules(modules):
+    """Load the given fake modules instead of the enabled ones."""
+    return patch.multiple(
+        'plinth.module_loader',
+        loaded_modules=collections.OrderedDict(),
+        get_modules_to_load=Mock(return_value=list(modules)))
+
+
+@pytest.fixture(name='fake_modules')
+def fixture_fake_modules():
+    """Create fake modules with dependencies whose init takes time."""
+    initialized = []
+    names = ['mod1', 'mod2', 'mod3', 'mod4', 'mod5']
+    depends = {'mod2': ['mod4'], 'mod3': ['mod2', 'mod5']}
+    modules = {}
+    for delay, name in zip([0.1, 0.05, 0, 0.02, 0], names):
+        module = types.ModuleType('plinth.modules.' + name)
+        module.depends = depends.get(name, [])
+
+        def init(name=name, delay=delay):
+            for dependency in depends.get(name, []):
+                assert dependency in initialized
+
+            time.sleep(delay)
+            app = type(name + 'App', (App, ), {'app_id': name + '-app'})
+            app.__module__ = 'plinth.modules.' + name
+            app()
+            initialized.append(name)
+
+        module.init = init
+        modules['plinth.modules.' + name] = module
+
+    with patch.dict(sys.modules, modules), \
+            patch.dict(App._all_apps, clear=True), \
+            _patch_modules(modules), patch('plinth.setup.init'):
+        yield initialized
+
+
+def test_load_modules(fake_modules):
+    """Test that modules are initialized in load order."""
+    module_loader.load_modules()
+    order = ['mod1', 'mod4', 'mod2', 'mod5', 'mod3']
+    assert list(module_loader.loaded_modules) == order
+    assert [app.app_id for app in App.list()] == [
+        name + '-app' for name in order
+    ]
+    assert fake_modules == order
+
+
+def test_domain_added_during_init():
+    """Test that domains added during init reach modules loaded earlier."""
+    received = []
+
+    def receiver_init(receiver, delay):
+        def on_domain_added(sender, name='', **kwargs):
+            received.append((receiver, name))
+
+        time.sleep(delay)
+        domain_added.connect(on_domain_added, weak=False,
+                             dispatch_uid='test-' + receiver)
+
+    def sender_init(name):
+        domain_added.send_robust(sender=name, domain_type='test',
+                                 name=name + '.example.com')
+
+    modules = collections.OrderedDict()
+    for name, depends, init in [
+            ('names', [], functools.partial(receiver_init, 'names', 0)),
+            ('letsencrypt', ['names'],
+             functools.partial(receiver_init, 'letsencrypt', 0.05)),
+            ('tor', ['names'], functools.partial(sender_init, 'tor')),
+            ('pagekite', ['names'], functools.partial(sender_init,
+                                                      'pagekite')),
+    ]:
+        module = types.ModuleType('plinth.modules.' + name)
+        module.depends = depends
+        module.init = init
+        modules['plinth.modules.' + name] = module
+
+    try:
+        with patch.dict(sys.modules, modules), _patch_modules(modules), \
+                patch('plinth.setup.init'):
+            module_loader.load_modules()
+    finally:
+        for name in ['names', 'letsencrypt']:
+            domain_added.disconnect(dispatch_uid='test-' + name)
+
+    for receiver in ['names', 'letsencrypt']:
+        for sender in ['tor', 'pagekite']:
+            assert (receiver, sender + '.example.com') in received
@@ -408,3 +408,39 @@ def test_display_context_body_template(note, user, load_cfg):
     context = Notification.get_display_context(user)
     context_note = context['notifications'][0]
     assert context_note['body'].content == b'Test notification body\n'
+
+
+def test_display_context_cached(note, user):
+    """Test that display context is reused until notifications change."""
+    context = Notification.get_display_context(user)
+    with patch('plinth.notification.Notification.list') as list_:
+        assert Notification.get_display_context(user) is context
+        list_.assert_not_called()
+
+    Notification.update_or_create(id='test-notification', title='New Title')
+    context = Notification.get_display_context(user)
+    assert context['notifications'][0]['title'] == 'New Title'
+
+    note = Notification.get('test-notification')
+    note.dismiss()
+    assert Notification.get_display_context(user)['notifications'] == []
+
+    note.dismiss(should_dismiss=False)
+    note.group = 'test-group-2'
+    note.save()
+    assert Notification.get_display_context(user)['notifications'] == []
+
+    user.groups.add(Group.objects.create(name='test-group-2'))
+    assert len(Notification.get_display_context(user)['notifications']) == 1
+
+    note.delete()
+    assert Notification.get_display_context(user)['notifications'] == []
+
+
+def test_display_context_cached_language(note, user):
+    """Test that display context is computed for each language."""
+    with patch('plinth.notification.get_language', return_value='en'):
+        context = Notification.get_display_context(user)
+
+    with patch('plinth.notification.get_language', return_value='fr'):
+        assert Notification.get_display_context(user) is not context
@@ -0,0 +1,200 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Test module for package installation transactions.
+"""
+
+import threading
+import time
+from unittest.mock import MagicMock, Mock, patch
+
+import pytest
+
+from plinth import package
+
+
+@pytest.fixture(name='apt_calls')
+def fixture_apt_calls():
+    """Record apt-get runs instead of running them."""
+    calls = []
+
+    def run_apt_command(transaction, arguments):
+        calls.append(arguments)
+        if 'install' in arguments and 'bad-package' in arguments:
+            raise package.PackageException('error', 'details')
+
+        transaction._parse_progress('pmstatus:{}:50:installing'.format(
+            arguments[-1]))
+
+    with patch('plinth.package._install_queue', package._InstallQueue()), \
+            patch('plinth.package.Transaction._run_apt_command',
+                  run_apt_command):
+        yield calls
+
+
+def test_install(apt_calls):
+    """Test that package lists are updated before each install."""
+    package.Transaction('module1', ['package1']).install()
+    package.Transaction('module2', ['package2']).install(skip_recommends=True)
+    assert apt_calls == [
+        ['update'],
+        ['install', 'module1', 'package1'],
+        ['update'],
+        ['install', '--skip-recommends', 'module2', 'package2'],
+    ]
+
+
+def test_install_batch(apt_calls):
+    """Test that package lists are updated once within a batch."""
+    with package.batch():
+        package.Transaction('module1', ['package1']).install()
+        with package.batch():
+            package.Transaction('module2', ['package2']).install()
+
+        package.Transaction('module3', ['package3']).install()
+
+    package.Transaction('module4', ['package4']).install()
+    assert apt_calls == [
+        ['update'],
+        ['install', 'module1', 'package1'],
+        ['install', 'module2', 'package2'],
+        ['install', 'module3', 'package3'],
+        ['update'],
+        ['install', 'module4', 'package4'],
+    ]
+
+
+def test_install_together(apt_calls):
+    """Test that installs of several modules run in one apt-get run."""
+    transactions = [
+        package.Transaction('module1', ['package1']),
+        package.Transaction('module2', ['bad-package']),
+        package.Transaction('module3', ['package3']),
+    ]
+    assert package.install_together(transactions) == [transactions[1]]
+    assert apt_calls == [
+        ['update'],
+        ['install', 'module1,module2,module3', 'package1', 'bad-package',
+         'package3'],
+        ['install', 'module1', 'package1'],
+        ['install', 'module2', 'bad-package'],
+        ['install', 'module3', 'package3'],
+    ]
+
+
+def test_install_merged(apt_calls):
+    """Test that installs requested together are run together."""
+    transactions = [
+        package.Transaction('module{}'.format(index),
+                            ['package{}'.format(index)])
+        for index in range(4)
+    ]
+    transactions[3].package_names = ['bad-package']
+    queued = threading.Event()
+    errors = {}
+
+    def install(transaction):
+        try:
+            transaction.install()
+        except package.PackageException as exception:
+            errors[transaction.module_name] = exception
+
+    original_run = package._InstallQueue._run
+
+    def run(queue, requests):
+        # Let other installs queue up while the first one is running
+        if not queued.is_set():
+            queued.wait()
+
+        original_run(queue, requests)
+
+    with patch('plinth.package._InstallQueue._run', run):
+        threads = [
+            threading.Thread(target=install, args=(transaction, ))
+            for transaction in transactions
+        ]
+        threads[0].start()
+        for thread in threads[1:3]:
+            thread.start()
+
+        while len(package._install_queue._pending) < 2:
+            time.sleep(0.01)
+
+        queued.set()
+        threads[0].join()
+        threads[1].join()
+        threads[2].join()
+        assert apt_calls == [
+            ['update'],
+            ['install', 'module0', 'package0'],
+            ['update'],
+            ['install', 'module1,module2', 'package1', 'package2'],
+        ]
+        assert transactions[1].percentage == 50
+        assert transactions[2].percentage == 50
+        assert not errors
+
+        apt_calls.clear()
+        threads[3].start()
+        threads[3].join()
+        assert list(errors) == ['module3']
+
+
+def test_install_merged_failure(apt_calls):
+    """Test that failure of merged install is attributed to the module."""
+    requests = [
+        package._InstallRequest(package.Transaction(module_name, packages),
+                                [])
+        for module_name, packages in (('module1', ['bad-package']),
+                                      ('module2', ['package2']))
+    ]
+    package._install_queue._run(requests)
+    assert apt_calls == [
+        ['update'],
+        ['install', 'module1,module2', 'bad-package', 'package2'],
+        ['install', 'module1', 'bad-package'],
+        ['install', 'module2', 'package2'],
+    ]
+    assert isinstance(requests[0].exception, package.PackageException)
+    assert not requests[1].exception
+    assert all(request.is_done for request in requests)
+
+
+@pytest.fixture(name='apt_cache')
+def fixture_apt_cache():
+    """Use a fake apt cache as shared package cache."""
+    packages = {
+        'package1': Mock(is_installed=True),
+        'package2': Mock(is_installed=False),
+    }
+    cache = MagicMock()
+    cache.__contains__.side_effect = packages.__contains__
+    cache.__getitem__.side_effect = packages.__getitem__
+    with patch('plinth.package._package_cache', package._PackageCache()), \
+            patch('plinth.package.apt') as apt, \
+            patch('plinth.package._PackageCache._get_stamp') as get_stamp:
+        apt.Cache.return_value = cache
+        get_stamp.return_value = (1, 1)
+        yield apt, cache, get_stamp
+
+
+def test_package_cache(apt_cache):
+    """Test that apt cache is opened once and reopened when stale."""
+    apt, cache, get_stamp = apt_cache
+    assert package.get_unavailable_packages(['package1', 'package3']) == \
+        ['package3']
+    assert package.get_uninstalled_packages(
+        ['package1', 'package2', 'package3']) == ['package2', 'package3']
+    apt.Cache.assert_called_once_with()
+    cache.open.assert_not_called()
+
+    get_stamp.return_value = (1, 2)
+    with package.get_cache() as shared_cache:
+        assert shared_cache == cache
+
+    cache.open.assert_called_once_with()
+
+    package.invalidate_cache()
+    package.get_unavailable_packages(['package1'])
+    package.get_unavailable_packages(['package1'])
+    assert cache.open.call_count == 2
+    apt.Cache.assert_called_once_with()
@@ -0,0 +1,154 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Test module for the conffile index of the packages action.
+"""
+
+import imp
+import os
+import pathlib
+from unittest.mock import Mock, patch
+
+import pytest
+
+
+def _action_file():
+    """Return the path to the 'packages' actions file."""
+    current_directory = pathlib.Path(__file__).parent
+    return str(current_directory / '..' / '..' / 'actions' / 'packages')
+
+
+packages_actions = imp.load_source('packages', _action_file())
+
+STATUS = '''Package: {package}
+Status: install ok installed
+Version: 1.0
+Conffiles:
+ /etc/{package}.conf {md5sum}
+
+'''
+
+
+@pytest.fixture(name='index_file')
+def fixture_index_file(tmp_path):
+    """Keep the conffile index in a temporary directory."""
+    index_file = tmp_path / 'conffile-hashes.json'
+    with patch.object(packages_actions, 'CONFFILE_INDEX_FILE',
+                      str(index_file)):
+        yield index_file
+
+
+@pytest.fixture(name='status_file')
+def fixture_status_file(tmp_path):
+    """Use a dpkg status file in a temporary directory."""
+    status_file = tmp_path / 'status'
+    status_file.write_text(STATUS.format(package='package1', md5sum='1234'))
+    config = Mock()
+    config.find.return_value = str(status_file)
+    with patch.object(packages_actions.apt_pkg, 'config', config):
+        yield status_file
+
+
+def test_save_conffile_index(index_file):
+    """Test that the index is replaced atomically."""
+    index = packages_actions._load_conffile_index()
+    assert index == {'status': None, 'files': {}, 'packages': {}}
+
+    index['status'] = {'stamp': [1], 'packages': {'p': ['1', {'/a': 'x'}]}}
+    index['files'] = {'/a': [[1], 'x'], '/b': [[2], 'y']}
+    packages_actions._save_conffile_index(index)
+    assert packages_actions._load_conffile_index()['files'] == {
+        '/a': [[1], 'x']
+    }
+    assert os.listdir(index_file.parent) == [index_file.name]
+
+    index['files'] = {}
+    with patch('os.replace', side_effect=OSError):
+        packages_actions._save_conffile_index(index)
+
+    assert packages_actions._load_conffile_index()['files'] == {
+        '/a': [[1], 'x']
+    }
+    assert os.listdir(index_file.parent) == [index_file.name]
+
+
+def test_status_file_stamp(status_file):
+    """Test that the status file is parsed again only after it changes."""
+    index = {'status': None, 'files': {}, 'packages': {}}
+    hashes, versions = \
+        packages_actions._get_conffile_hashes_from_status_file(
+            {'package1'}, index)
+    assert hashes['package1'] == {'/etc/package1.conf': '1234'}
+    assert versions['package1'] == '1.0'
+
+    with patch.object(packages_actions.apt_pkg, 'TagFile') as tag_file:
+        packages_actions._get_conffile_hashes_from_status_file({'package1'},
+                                                               index)
+        tag_file.assert_not_called()
+
+    status_file.write_text(STATUS.format(package='package1', md5sum='5678'))
+    hashes, _ = packages_actions._get_conffile_hashes_from_status_file(
+        {'package1'}, index)
+    assert hashes['package1'] == {'/etc/package1.conf': '5678'}
+
+
+def test_conffile_hash_stamp(tmp_path):
+    """Test that conffiles are hashed again only after they change."""
+    conffile = tmp_path / 'package1.conf'
+    conffile.write_text('contents')
+    index = {'files': {}}
+    md5sum = packages_actions._get_indexed_conffile_hash(str(conffile), index)
+    assert md5sum == packages_actions._get_conffile_hash(str(conffile))
+
+    with patch.object(packages_actions, '_get_conffile_hash') as get_hash:
+        assert packages_actions._get_indexed_conffile_hash(
+            str(conffile), index) == md5sum
+        get_hash.assert_not_called()
+
+    conffile.write_text('changed contents')
+    assert packages_actions._get_indexed_conffile_hash(str(conffile),
+                                                       index) != md5sum
+
+    conffile.unlink()
+    assert packages_actions._get_indexed_conffile_hash(str(conffile),
+                                                       index) is None
+
+
+@patch.object(packages_actions, '_download_packages')
+@patch.object(packages_actions, '_index_downloaded_files')
+@patch.object(packages_actions.apt.cache, 'Cache')
+def test_upgrade_hashes_reused(cache, index_downloaded_files,
+                               download_packages):
+    """Test that packages are downloaded only for versions not seen."""
+    candidate = Mock(version='2.0')
+    cache.return_value = {
+        'package1': Mock(is_upgradable=True, candidate=candidate),
+        'package2': Mock(is_upgradable=False),
+    }
+
+    def index_files(packages, downloaded_files, index):
+        for package in packages:
+            key = package + '=' + candidate.version
+            index['packages'][key] = {'/etc/package1.conf': candidate.version}
+
+    index_downloaded_files.side_effect = index_files
+    index = {'packages': {}}
+    packages = {'package1', 'package2'}
+    hashes, versions = packages_actions._get_conffile_hashes_of_upgrades(
+        packages, index)
+    download_packages.assert_called_once_with({'package1'})
+    assert hashes['package1'] == {'/etc/package1.conf': '2.0'}
+    assert versions['package1'] == '2.0'
+    assert 'package2' not in hashes
+
+    download_packages.reset_mock()
+    hashes, _ = packages_actions._get_conffile_hashes_of_upgrades(
+        packages, index)
+    download_packages.assert_not_called()
+    assert hashes['package1'] == {'/etc/package1.conf': '2.0'}
+
+    candidate.version = '3.0'
+    hashes, _ = packages_actions._get_conffile_hashes_of_upgrades(
+        packages, index)
+    download_packages.assert_called_once_with({'package1'})
+    assert hashes['package1'] == {'/etc/package1.conf': '3.0'}
+    assert list(index['packages']) == ['package1=3.0']
@@ -0,0 +1,47 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Test module for startup profiling.
+"""
+
+import json
+import time
+from unittest.mock import patch
+
+from plinth import profiling
+
+
+def test_disabled():
+    """Test that measuring does nothing when profiling is disabled."""
+    with patch('plinth.profiling._profiler', None):
+        assert not profiling.is_enabled()
+        with profiling.measure('phase', 'test-phase'):
+            pass
+
+        profiling.write_report('/nonexistent/file.json')
+
+
+def test_report(tmp_path, capsys):
+    """Test measuring phases and modules and writing the report."""
+    with patch('plinth.profiling._profiler', None):
+        profiling.enable()
+        with profiling.measure('phase', 'test-phase'):
+            time.sleep(0.02)
+            with profiling.measure('init', 'test-module'):
+                data = bytearray(10 * 1024 * 1024)
+                data[-1] = 1
+
+        file_path = tmp_path / 'profile' / 'report.json'
+        profiling.write_report(str(file_path))
+
+    report = json.loads(file_path.read_text())
+    entries = {entry['name']: entry for entry in report['entries']}
+    assert entries['test-phase']['kind'] == 'phase'
+    assert entries['test-phase']['wall'] >= 0.02
+    assert entries['test-module']['kind'] == 'init'
+    assert entries['test-module']['wall'] <= entries['test-phase']['wall']
+    assert report['total_wall'] >= entries['test-phase']['wall']
+
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].split()[:2] == ['Kind', 'Name']
+    assert lines[1].split()[:2] == ['phase', 'test-phase']
+    assert lines[2].split()[:2] == ['init', 'test-module']
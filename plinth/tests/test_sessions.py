@@ -0,0 +1,126 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Test module for session engine with in-memory index.
+"""
+
+import os
+import time
+from unittest.mock import patch
+
+import pytest
+from django.contrib.sessions.backends.file import \
+    SessionStore as FileSessionStore
+
+from plinth import sessions
+
+
+@pytest.fixture(name='store_file')
+def fixture_store_file(tmp_path):
+    """Return path of a session store file."""
+    return str(tmp_path / 'sessions.json')
+
+
+@pytest.fixture(name='index')
+def fixture_index(store_file):
+    """Use a new session index for the tests."""
+    index = sessions.SessionIndex(store_file, flush_delay=3600)
+    with patch('plinth.sessions._index', index):
+        yield index
+
+
+def test_session_store(index):
+    """Test creating, loading and deleting sessions."""
+    session = sessions.SessionStore()
+    session['test-key'] = 'test-value'
+    session.save()
+    key = session.session_key
+    assert key
+    assert session.exists(key)
+
+    session = sessions.SessionStore(key)
+    assert session['test-key'] == 'test-value'
+
+    session.delete()
+    assert not session.exists(key)
+    assert sessions.SessionStore(key).load() == {}
+
+
+def test_create_collision(index):
+    """Test that an existing session is not overwritten on create."""
+    assert index.set('test-key', 'data', time.time() + 100)
+    assert not index.set('test-key', 'new', time.time() + 100,
+                         must_create=True)
+    assert index.get('test-key') == 'data'
+
+
+def test_expiry(index):
+    """Test that only expired sessions are removed."""
+    now = time.time()
+    index.set('key1', 'data1', now - 1)
+    index.set('key2', 'data2', now + 100)
+    index.set('key3', 'data3', now - 1)
+    index.set('key3', 'data3', now + 100)
+    assert index.get('key1') is None
+    assert len(index) == 3
+
+    index.clear_expired()
+    assert len(index) == 2
+    assert index.get('key2') == 'data2'
+    assert index.get('key3') == 'data3'
+
+
+def test_write_behind(index, store_file):
+    """Test that changes are written to disk only when flushed."""
+    index.set('key1', 'data1', time.time() + 100)
+    index.set('key2', 'data2', time.time() + 100)
+    index.delete('key1')
+    assert not os.path.exists(store_file)
+
+    index.flush()
+    assert os.stat(store_file).st_mode & 0o077 == 0
+    loaded = sessions.SessionIndex(store_file)
+    assert len(loaded) == 1
+    assert loaded.get('key2') == 'data2'
+
+
+def test_compaction(index, store_file):
+    """Test that journal is rewritten when it grows too large."""
+    with patch('plinth.sessions.COMPACT_MIN_ENTRIES', 10):
+        for _ in range(20):
+            index.set('key1', 'data1', time.time() + 100)
+
+        index.flush()
+
+    with open(store_file) as file_handle:
+        assert len(file_handle.readlines()) == 1
+
+
+def test_incomplete_journal(store_file):
+    """Test that a partially written entry is discarded."""
+    with open(store_file, 'w') as file_handle:
+        file_handle.write('["key1", "data1", {}]\n["key2", "da'.format(
+            time.time() + 100))
+
+    index = sessions.SessionIndex(store_file)
+    assert len(index) == 1
+    with open(store_file) as file_handle:
+        assert file_handle.read().endswith('\n')
+
+
+def test_import_session_files(index, tmp_path, settings):
+    """Test that sessions of file backend are imported and removed."""
+    settings.SESSION_FILE_PATH = str(tmp_path)
+    session = FileSessionStore()
+    session['test-key'] = 'test-value'
+    session.save()
+    key = session.session_key
+    expired_session = FileSessionStore()
+    expired_session.save()
+    expired_file = expired_session._key_to_file()
+    os.utime(expired_file, (0, 0))
+
+    index.import_session_files(str(tmp_path), settings.SESSION_COOKIE_NAME)
+    assert not os.path.exists(session._key_to_file())
+    assert not os.path.exists(expired_file)
+    assert sessions.SessionStore(key)['test-key'] == 'test-value'
+    assert not index.get(expired_session.session_key)
@@ -0,0 +1,176 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Test module for setup helper of modules.
+"""
+
+import collections
+import threading
+import time
+import types
+from unittest.mock import Mock, patch
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from plinth import models, package, setup
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(name='helper')
+def fixture_helper():
+    """Return a setup helper for a test module."""
+    module = Mock(version=3)
+    with patch('plinth.setup._setup_versions', None):
+        yield setup.Helper('test-module', module)
+
+
+def test_setup_version(helper):
+    """Test that setup versions are read once and written through."""
+    models.Module.objects.create(name='test-module', setup_version=2)
+    models.Module.objects.create(name='test-other', setup_version=1)
+    with CaptureQueriesContext(connection) as queries:
+        assert helper.get_setup_version() == 2
+        assert helper.get_state() == 'needs-update'
+        assert setup.Helper('test-other', Mock()).get_setup_version() == 1
+        assert setup.Helper('test-new', Mock()).get_setup_version() == 0
+
+    assert len(queries) == 1
+
+    helper.set_setup_version(3)
+    assert models.Module.objects.get(pk='test-module').setup_version == 3
+    with CaptureQueriesContext(connection) as queries:
+        assert helper.get_setup_version() == 3
+        assert helper.get_state() == 'up-to-date'
+
+    assert not queries
+
+
+def test_run_in_dependency_order():
+    """Test that modules run in parallel only after their dependencies."""
+    depends = {'mod2': ['mod1'], 'mod4': ['mod2', 'mod3', 'other']}
+    modules = collections.OrderedDict(
+        (name,
+         types.SimpleNamespace(depends=depends.get(name, []), name=name))
+        for name in ['mod1', 'mod2', 'mod3', 'mod4'])
+    events = []
+    lock = threading.Lock()
+
+    def function(module):
+        with lock:
+            events.append(('start', module.name))
+
+        time.sleep(0.05)
+        with lock:
+            events.append(('end', module.name))
+
+    setup._run_in_dependency_order(modules, function)
+    for name, dependencies in depends.items():
+        for dependency in dependencies:
+            if dependency in modules:
+                assert events.index(('end', dependency)) < \
+                    events.index(('start', name))
+
+    # Independent modules run at the same time
+    assert events.index(('start', 'mod3')) < events.index(('end', 'mod1'))
+
+
+def test_run_in_dependency_order_error():
+    """Test that no more modules are started after an error."""
+    modules = collections.OrderedDict(
+        (name, types.SimpleNamespace(depends=depends, name=name))
+        for name, depends in [('mod1', []), ('mod2', ['mod1'])])
+    function = Mock(side_effect=[RuntimeError, None])
+    with pytest.raises(RuntimeError):
+        setup._run_in_dependency_order(modules, function)
+
+    function.assert_called_once_with(modules['mod1'])
+
+
+@patch('plinth.package.get_uninstalled_packages')
+@patch('plinth.package.install_together')
+def test_install_packages_together(install_together, get_uninstalled):
+    """Test that packages of modules needing setup are installed at once."""
+    get_uninstalled.side_effect = lambda package_names: package_names
+    install_together.side_effect = lambda transactions: transactions[1:]
+    modules = collections.OrderedDict()
+    for name, state in [('mod1', 'needs-setup'), ('mod2', 'needs-update'),
+                        ('mod3', 'up-to-date')]:
+        module = Mock(managed_packages=['package-' + name])
+        module.setup_helper = setup.Helper(name, module)
+        module.setup_helper.get_state = Mock(return_value=state)
+        modules[name] = module
+
+    setup._install_packages_together(modules)
+    transactions = install_together.call_args[0][0]
+    assert [(transaction.module_name, transaction.package_names)
+            for transaction in transactions] == [('mod1', ['package-mod1']),
+                                                 ('mod2', ['package-mod2'])]
+    assert modules['mod1'].setup_helper.installed_packages == {'package-mod1'}
+    assert not modules['mod2'].setup_helper.installed_packages
+    assert not modules['mod1'].setup_helper.current_operation
+
+    with patch('plinth.package.Transaction') as transaction:
+        modules['mod1'].setup_helper.install(['package-mod1'])
+        transaction.assert_not_called()
+        modules['mod1'].setup_helper.install(['package-mod1', 'other'])
+        transaction.assert_called_once_with('mod1', ['other'])
+
+
+def test_install_packages_together_options():
+    """Test that storage's packages are not installed with recommends."""
+    apt_calls = []
+
+    def run_apt_command(transaction, arguments):
+        apt_calls.append(arguments)
+
+    def module_setup(helper, old_version):
+        helper.install(helper.module.managed_packages,
+                       skip_recommends=helper.module_name == 'storage')
+
+    modules = collections.OrderedDict()
+    for name in ['mod1', 'storage', 'mod2']:
+        module = types.SimpleNamespace(
+            version=1, depends=[], setup=module_setup,
+            managed_packages=['package-' + name])
+        module.setup_helper = setup.Helper(name, module)
+        module.setup_helper.get_setup_version = Mock(return_value=0)
+        module.setup_helper.set_setup_version = Mock()
+        modules[name] = module
+
+    modules['storage'].install_before_setup = False
+    with patch('plinth.module_loader.loaded_modules', modules), \
+            patch('plinth.package.get_uninstalled_packages',
+                  lambda package_names: package_names), \
+            patch('plinth.package._install_queue', package._InstallQueue()), \
+            patch('plinth.package.Transaction._run_apt_command',
+                  run_apt_command):
+        setup.setup_modules()
+
+    installs = [arguments for arguments in apt_calls if 'install' in arguments]
+    assert ['install', 'mod1,mod2', 'package-mod1', 'package-mod2'] in installs
+    assert ['install', '--skip-recommends', 'storage',
+            'package-storage'] in installs
+    assert len(installs) == 2
+
+
+def test_setup_concurrent():
+    """Test that setup of independent modules runs at the same time."""
+    both_running = threading.Barrier(2, timeout=5)
+
+    def module_setup(helper, old_version):
+        both_running.wait()
+
+    modules = collections.OrderedDict()
+    for name in ['mod1', 'mod2']:
+        module = Mock(version=1, depends=[], setup=module_setup)
+        module.setup_helper = setup.Helper(name, module)
+        module.setup_helper.get_setup_version = Mock(return_value=0)
+        module.setup_helper.set_setup_version = Mock()
+        modules[name] = module
+
+    setup._run_in_dependency_order(
+        modules, lambda module: module.setup_helper.run(allow_install=False))
+    for module in modules.values():
+        module.setup_helper.set_setup_version.assert_called_once_with(1)
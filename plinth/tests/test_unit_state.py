@@ -0,0 +1,102 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Test module for tracking systemd unit states over D-Bus.
+"""
+
+from unittest.mock import Mock, patch
+
+import pytest
+
+from plinth import unit_state
+
+
+def _reply(value):
+    """Return a mock D-Bus reply that unpacks to given value."""
+    return Mock(unpack=Mock(return_value=(value, )))
+
+
+@pytest.fixture(name='service')
+def fixture_service():
+    """Return a unit state service with a mocked D-Bus connection."""
+    connection = Mock()
+    units = [
+        ('apache2.service', '', 'loaded', 'active', 'running', '',
+         '/org/freedesktop/systemd1/unit/apache2_2eservice', 0, '', '/'),
+        ('tor@plinth.service', '', 'loaded', 'inactive', 'dead', '',
+         '/org/freedesktop/systemd1/unit/tor_40plinth_2eservice', 0, '', '/'),
+    ]
+    files = [('/lib/systemd/system/apache2.service', 'enabled'),
+             ('/lib/systemd/system/tor@plinth.service', 'disabled')]
+
+    def call_sync(_bus, _path, _interface, method, *_args):
+        return _reply({
+            'ListUnitsByNames': units,
+            'ListUnitFilesByPatterns': files
+        }[method])
+
+    connection.call_sync.side_effect = call_sync
+    service = unit_state.UnitStateService(connection)
+    service.units.update(['apache2.service', 'tor@plinth.service'])
+    return service
+
+
+def test_normalize_unit_name():
+    """Test that unit names are completed like systemctl does."""
+    assert unit_state.normalize_unit_name('apache2') == 'apache2.service'
+    assert unit_state.normalize_unit_name('tor@plinth') == \
+        'tor@plinth.service'
+    assert unit_state.normalize_unit_name('ssh.socket') == 'ssh.socket'
+
+
+def test_snapshot_single_call(service):
+    """Test that all units are fetched with one call for each property."""
+    assert service.get_state('apache2') == ('active', 'enabled')
+    assert service.get_state('tor@plinth') == ('inactive', 'disabled')
+    assert service.connection.call_sync.call_count == 2
+
+
+def test_unknown_unit_refreshes(service):
+    """Test that querying a new unit adds it and refreshes the snapshot."""
+    service.get_state('apache2')
+    assert service.get_state('missing') == ('inactive', None)
+    assert 'missing.service' in service.units
+    assert service.connection.call_sync.call_count == 4
+
+
+def test_snapshot_expires(service):
+    """Test that a stale snapshot is refreshed."""
+    service.get_state('apache2')
+    with patch('time.monotonic',
+               return_value=service.snapshot_time +
+               unit_state.SNAPSHOT_LIFETIME + 1):
+        service.get_state('apache2')
+
+    assert service.connection.call_sync.call_count == 4
+
+
+def test_properties_changed(service):
+    """Test that signals update the snapshot without D-Bus calls."""
+    service.get_state('apache2')
+    parameters = Mock()
+    parameters.unpack.return_value = (unit_state.UNIT_INTERFACE, {
+        'ActiveState': 'deactivating'
+    }, [])
+    service.on_properties_changed(
+        None, None, '/org/freedesktop/systemd1/unit/apache2_2eservice', None,
+        None, parameters, None)
+    assert service.get_state('apache2') == ('deactivating', 'enabled')
+    assert service.connection.call_sync.call_count == 2
+
+
+def test_units_changed_invalidates(service):
+    """Test that unit file changes invalidate the snapshot."""
+    service.get_state('apache2')
+    service.on_units_changed()
+    service.get_state('apache2')
+    assert service.connection.call_sync.call_count == 4
+
+
+def test_get_state_without_service():
+    """Test that None is returned when D-Bus is not available."""
+    with patch('plinth.unit_state._service', None):
+        assert unit_state.get_state('apache2') is None
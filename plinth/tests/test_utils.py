@@ -3,14 +3,15 @@
 Test module for utilities.
 """
 
+import sys
 import tempfile
-from unittest.mock import MagicMock, Mock
+from unittest.mock import MagicMock, Mock, patch
 
 import pytest
 import ruamel.yaml
 from django.test.client import RequestFactory
 
-from plinth.utils import YAMLFile, is_user_admin
+from plinth.utils import YAMLFile, is_user_admin, lazy_import
 
 
 class TestIsAdminUser:
@@ -119,3 +120,19 @@ class TestYAMLFileUtil:
                 raise ValueError('Test')
 
         assert open(test_file.name, 'r').read() == ''
+
+
+def test_lazy_import():
+    """Test that modules are imported only when used."""
+    with patch.dict(sys.modules):
+        sys.modules.pop('colorsys', None)
+        colorsys = lazy_import('colorsys')
+        assert 'colorsys' not in sys.modules
+        assert colorsys.rgb_to_hsv(0, 0, 0) == (0, 0, 0)
+        assert 'colorsys' in sys.modules
+
+    with pytest.raises(ModuleNotFoundError):
+        lazy_import('plinth_nonexistent_module')
+
+    with pytest.raises(ValueError):
+        lazy_import('os.path')
@@ -0,0 +1,204 @@
+# SPDX-License-Identifier: AGPL-3.0-or-later
+"""
+Track the state of systemd units using D-Bus instead of running systemctl.
+
+ActiveState and UnitFileState of all the units managed by FreedomBox are
+fetched from systemd in a single D-Bus call each and kept in a short-lived
+snapshot. The snapshot is updated by PropertiesChanged signals from systemd
+and is invalidated when unit files change. Queries are answered from the
+snapshot.
+
+When D-Bus is not available (such as when running setup or diagnostics from
+command line), get_state() returns None and callers are expected to fall back
+to querying systemctl.
+"""
+
+import logging
+import threading
+import time
+
+from plinth.utils import import_from_gi
+
+glib = import_from_gi('GLib', '2.0')
+gio = import_from_gi('Gio', '2.0')
+
+logger = logging.getLogger(__name__)
+
+SYSTEMD_BUS_NAME = 'org.freedesktop.systemd1'
+SYSTEMD_PATH = '/org/freedesktop/systemd1'
+MANAGER_INTERFACE = 'org.freedesktop.systemd1.Manager'
+UNIT_INTERFACE = 'org.freedesktop.systemd1.Unit'
+
+# Snapshot is refreshed with a new D-Bus call after this many seconds even if
+# no signals have been received.
+SNAPSHOT_LIFETIME = 5
+
+# Unit file states for which 'systemctl is-enabled' returns success.
+ENABLED_STATES = ('enabled', 'enabled-runtime', 'static', 'alias', 'indirect',
+                  'generated')
+
+RUNNING_STATES = ('active', 'reloading')
+
+_UNIT_SUFFIXES = ('.service', '.socket', '.target', '.timer', '.path',
+                  '.mount', '.automount', '.swap', '.slice', '.scope',
+                  '.device')
+
+_service = None
+
+
+class UnitStateService:
+    """Keep a snapshot of state of units from systemd over D-Bus."""
+
+    def __init__(self, connection):
+        """Initialize the service with a D-Bus connection."""
+        self.connection = connection
+        self.units = set()
+        self.active_states = {}
+        self.file_states = {}
+        self.paths = {}
+        self.snapshot_time = None
+        self.lock = threading.RLock()
+
+    def subscribe(self):
+        """Ask systemd for signals and listen to them."""
+        self._call_manager('Subscribe', None, None)
+        self.connection.signal_subscribe(
+            SYSTEMD_BUS_NAME, 'org.freedesktop.DBus.Properties',
+            'PropertiesChanged', None, UNIT_INTERFACE,
+            gio.DBusSignalFlags.NONE, self.on_properties_changed, None)
+        for signal_name in ('UnitFilesChanged', 'Reloading'):
+            self.connection.signal_subscribe(SYSTEMD_BUS_NAME,
+                                             MANAGER_INTERFACE, signal_name,
+                                             SYSTEMD_PATH, None,
+                                             gio.DBusSignalFlags.NONE,
+                                             self.on_units_changed, None)
+
+    def _call_manager(self, method, parameters, reply_type):
+        """Call a method on systemd manager object synchronously."""
+        return self.connection.call_sync(SYSTEMD_BUS_NAME, SYSTEMD_PATH,
+                                         MANAGER_INTERFACE, method, parameters,
+                                         reply_type, gio.DBusCallFlags.NONE,
+                                         -1, None)
+
+    def refresh(self):
+        """Fetch state of all known units with one call for each property."""
+        with self.lock:
+            units = sorted(self.units)
+            active_states = {}
+            file_states = {}
+            paths = {}
+            if units:
+                reply = self._call_manager(
+                    'ListUnitsByNames', glib.Variant('(as)', (units, )),
+                    glib.VariantType.new('(a(ssssssouso))'))
+                for unit_info in reply.unpack()[0]:
+                    name, active_state, path = (unit_info[0], unit_info[3],
+                                                unit_info[6])
+                    active_states[name] = active_state
+                    paths[path] = name
+
+                reply = self._call_manager(
+                    'ListUnitFilesByPatterns',
+                    glib.Variant('(asas)', ([], units)),
+                    glib.VariantType.new('(a(ss))'))
+                for file_path, state in reply.unpack()[0]:
+                    file_states[file_path.rsplit('/', 1)[-1]] = state
+
+            self.active_states = active_states
+            self.file_states = file_states
+            self.paths = paths
+            self.snapshot_time = time.monotonic()
+
+    def invalidate(self):
+        """Force a refresh of the snapshot on next query."""
+        with self.lock:
+            self.snapshot_time = None
+
+    def get_state(self, unit):
+        """Return a tuple of (ActiveState, UnitFileState) for a unit."""
+        unit = normalize_unit_name(unit)
+        with self.lock:
+            is_stale = self.snapshot_time is None or \
+                time.monotonic() - self.snapshot_time > SNAPSHOT_LIFETIME
+            if unit not in self.units:
+                self.units.add(unit)
+                is_stale = True
+
+            if is_stale:
+                self.refresh()
+
+            return (self.active_states.get(unit, 'inactive'),
+                    self.file_states.get(unit))
+
+    def on_properties_changed(self, _connection, _sender, object_path,
+                              _interface, _signal, parameters, _user_data):
+        """Update active state of a unit from a signal."""
+        _, changed, invalidated = parameters.unpack()
+        with self.lock:
+            unit = self.paths.get(object_path)
+            if not unit:
+                return
+
+            if 'ActiveState' in changed:
+                self.active_states[unit] = changed['ActiveState']
+            elif 'ActiveState' in invalidated:
+                self.snapshot_time = None
+
+    def on_units_changed(self, *_args):
+        """Invalidate the snapshot when unit files or systemd reload."""
+        self.invalidate()
+
+
+def normalize_unit_name(unit):
+    """Return the full name of a unit as systemctl would interpret it."""
+    if unit.endswith(_UNIT_SUFFIXES):
+        return unit
+
+    return unit + '.service'
+
+
+def init():
+    """Connect to systemd over D-Bus. Must be run from glib thread."""
+    global _service
+    try:
+        connection = gio.bus_get_sync(gio.BusType.SYSTEM, None)
+        service = UnitStateService(connection)
+        service.subscribe()
+    except glib.Error as exception:
+        logger.warning('Unable to track systemd unit states: %s', exception)
+        return
+
+    _preload_managed_units(service)
+    _service = service
+    logger.info('Tracking systemd unit states over D-Bus')
+
+
+def _preload_managed_units(service):
+    """Add units of all daemon components to the service and refresh."""
+    from plinth import app, daemon
+    for app_ in app.App.list():
+        for component in app_.get_components_of_type(daemon.Daemon):
+            service.units.add(normalize_unit_name(component.unit))
+
+    try:
+        service.refresh()
+    except glib.Error as exception:
+        logger.warning('Unable to get systemd unit states: %s', exception)
+
+
+def get_state(unit):
+    """Return (ActiveState, UnitFileState) for a unit or None if unknown."""
+    if not _service:
+        return None
+
+    try:
+        return _service.get_state(unit)
+    except glib.Error as exception:
+        logger.warning('Unable to get state of unit %s: %s', unit, exception)
+        return None
+
+
+def invalidate():
+    """Discard the snapshot after a unit has been changed."""
+    if _service:
+        _service.invalidate()
@@ -5,10 +5,12 @@ Miscellaneous utility methods.
 
 import gzip
 import importlib
+import importlib.util
 import os
 import random
 import re
 import string
+import types
 from distutils.version import LooseVersion
 
 import markupsafe
@@ -32,6 +34,32 @@ def import_from_gi(library, version):
     return importlib.import_module(package_name + '.repository.' + library)
 
 
+class _LazyModule(types.ModuleType):
+    """Module that is imported when one of its attributes is accessed."""
+
+    def __getattr__(self, name):
+        """Import the module and return the attribute."""
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(module.__dict__)
+        return getattr(module, name)
+
+
+def lazy_import(name):
+    """Return a top-level module that is imported on first use.
+
+    Use for heavy modules needed only by some operations so that they don't
+    slow down startup. Failure to find the module is still reported
+    immediately.
+    """
+    if '.' in name:
+        raise ValueError('Only top-level modules can be imported lazily')
+
+    if importlib.util.find_spec(name) is None:
+        raise ModuleNotFoundError(f'No module named {name!r}', name=name)
+
+    return _LazyModule(name)
+
+
 def _format_lazy(string, *args, **kwargs):
     """Lazily format a lazy string."""
     allow_markup = kwargs.pop('allow_markup', False)
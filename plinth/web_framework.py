@@ -15,7 +15,7 @@ import django.core.wsgi
 from django.conf import global_settings
 from django.contrib.messages import constants as message_constants
 
-from . import cfg, glib, log, module_loader, settings
+from . import cfg, glib, log, module_loader, profiling, settings
 
 logger = logging.getLogger(__name__)
 
@@ -38,6 +38,7 @@ def init():
     settings.MESSAGE_TAGS = {message_constants.ERROR: 'danger'}
     settings.SECRET_KEY = _get_secret_key()
     settings.SESSION_FILE_PATH = os.path.join(cfg.data_dir, 'sessions')
+    settings.SESSION_STORE_FILE = os.path.join(cfg.data_dir, 'sessions.json')
     settings.STATIC_URL = '/'.join([cfg.server_dir,
                                     'static/']).replace('//', '/')
     settings.USE_X_FORWARDED_HOST = cfg.use_x_forwarded_host
@@ -48,19 +49,23 @@ def init():
             kwargs[setting] = getattr(settings, setting)
 
     django.conf.settings.configure(**kwargs)
-    django.setup(set_prefix=True)
+    with profiling.measure('phase', 'django.setup'):
+        django.setup(set_prefix=True)
 
     logger.debug('Configured Django with applications - %s',
                  settings.INSTALLED_APPS)
 
     logger.debug('Creating or adding new tables to data file')
     verbosity = 1 if cfg.develop else 0
-    django.core.management.call_command('migrate', '--fake-initial',
-                                        interactive=False, verbosity=verbosity)
+    with profiling.measure('phase', 'migrate'):
+        django.core.management.call_command('migrate', '--fake-initial',
+                                            interactive=False,
+                                            verbosity=verbosity)
+
     os.chmod(cfg.store_file, stat.S_IRUSR | stat.S_IWUSR | stat.S_IRGRP)
 
-    # Cleanup expired sessions every day
-    glib.schedule(24 * 3600, _cleanup_expired_sessions, in_thread=True)
+    # Cleanup expired sessions every hour, only expired ones are looked at
+    glib.schedule(3600, _cleanup_expired_sessions, in_thread=True)
 
 
 def _get_secret_key():
@@ -227,7 +227,7 @@ setuptools.setup(
     url='https://freedombox.org',
     packages=find_packages(include=['plinth', 'plinth.*'],
                            exclude=['*.templates']),
-    scripts=['bin/plinth'],
+    scripts=['bin/plinth', 'bin/plinth-actions'],
     license='COPYING.md',
     classifiers=[
         'Development Status :: 5 - Production/Stable',